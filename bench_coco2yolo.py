@@ -0,0 +1,88 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from coco2yolo import ImageRecord, collect_annotation_columns, map_class_ids, build_label_texts, write_label_files
+
+# coco2yolo 라벨 변환 마이크로 벤치마크 (기존 어노테이션 단위 루프 vs 컬럼 단위 일괄 변환)
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-images', type=int, default=20000)
+    parser.add_argument('--boxes-per-image', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--work-dir', type=str, default=None, help='라벨 파일을 기록할 폴더 (기본: 임시 폴더)')
+    return parser.parse_args()
+
+def make_synthetic_coco(num_images, boxes_per_image, seed=0):
+    rng = random.Random(seed)
+    images = {i: ImageRecord(i, f"img_{i:06d}.jpg", 1920, 1080) for i in range(num_images)}
+    categories = [(1, 'helmet'), (2, 'head')]
+    annotations = []
+    for i in range(num_images * boxes_per_image):
+        w, h = rng.uniform(5, 200), rng.uniform(5, 200)
+        annotations.append({
+            'image_id': rng.randrange(num_images),
+            'category_id': rng.choice((1, 2)),
+            'bbox': [rng.uniform(0, 1920 - w), rng.uniform(0, 1080 - h), w, h],
+        })
+    return images, categories, annotations
+
+def legacy_loop(images, categories, annotations, labels_dir):
+    """기존 coco2yolo.main()의 어노테이션 단위 변환 (어노테이션마다 append 모드로 open)"""
+    category_names = dict(categories)
+    class_name_to_id = {name: i for i, (_, name) in enumerate(categories)}
+    for ann in annotations:
+        img = images[ann['image_id']]
+        img_w, img_h = img.width, img.height
+        class_id = class_name_to_id[category_names[ann['category_id']]]
+        x, y, w, h = ann['bbox']
+        x_center = (x + w / 2) / img_w
+        y_center = (y + h / 2) / img_h
+        label_line = f"{class_id} {x_center:.6f} {y_center:.6f} {w / img_w:.6f} {h / img_h:.6f}\n"
+        img_name = os.path.splitext(img.file_name)[0]
+        with open(os.path.join(labels_dir, f"{img_name}.txt"), 'a') as f:
+            f.write(label_line)
+
+def bulk_convert(images, categories, annotations, labels_dir):
+    """컬럼 단위 벡터 변환 후 이미지별 한 번 기록"""
+    class_name_to_id = {name: i for i, (_, name) in enumerate(categories)}
+    class_index = {cat_id: class_name_to_id[name] for cat_id, name in categories}
+    image_ids, category_ids, bboxes = collect_annotation_columns(annotations)
+    class_ids = map_class_ids(category_ids, class_index)
+    write_label_files(build_label_texts(image_ids, class_ids, bboxes, images), images, labels_dir)
+
+def time_run(fn, data, work_dir, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        labels_dir = os.path.join(work_dir, fn.__name__)
+        shutil.rmtree(labels_dir, ignore_errors=True)
+        os.makedirs(labels_dir)
+        start = time.perf_counter()
+        fn(*data, labels_dir)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    args = parse_args()
+    data = make_synthetic_coco(args.num_images, args.boxes_per_image)
+    n_ann = len(data[2])
+    print(f"[INFO] 이미지 {args.num_images}개, 어노테이션 {n_ann}개, 반복 {args.repeat}회 (최소 시간 기준)")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_coco2yolo_')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        legacy = time_run(legacy_loop, data, work_dir, args.repeat)
+        bulk = time_run(bulk_convert, data, work_dir, args.repeat)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"  legacy loop : {legacy:.3f}s ({n_ann / legacy:,.0f} ann/s)")
+    print(f"  bulk numpy  : {bulk:.3f}s ({n_ann / bulk:,.0f} ann/s)")
+    print(f"  speedup     : {legacy / bulk:.1f}x")
+
+if __name__ == "__main__":
+    main()
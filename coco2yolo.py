@@ -1,17 +1,71 @@
 import argparse
+import hashlib
 import json
 import os
+import pickle
 import shutil
+import subprocess
+import sys
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import numpy as np
 from tqdm import tqdm
 import glob
 
+from file_utils import LABEL_LINE_FORMAT, LINK_MODES, materialize_files
+from profiler import PROFILE_NAME, Profiler
+from step_cache import StepCache, default_cache_dir, file_digest, step_fingerprint, tree_digest
+
+JSON_READ_SIZE = 1024 * 1024  # 스트리밍 JSON 읽기 단위 (문자 수)
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+MERGE_POLL_INTERVAL = 5  # 초, 병합 단계에서 다른 샤드 매니페스트 확인 주기
+INDEX_DIR = '.coco_index'  # 분산 변환 시 샤드끼리 json 인덱스 조각을 주고받는 폴더 (병합 후 삭제)
+MAX_MERGE_ERRORS = 20  # 병합 검증 실패 시 출력할 최대 항목 수
+# YOLO class id 순서 (train.py data.yaml의 names와 같아야 함, 샤드 json의 카테고리 순서와 무관하게 고정)
+CLASS_NAMES = ['helmet', 'head']
+
 # argparse로 입력값 받기
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--coco-json-folder', type=str, required=True, help='COCO annotation json 파일 경로')
     parser.add_argument('--image-folder', type=str, required=True, help='이미지 파일들이 들어있는 폴더')
     parser.add_argument('--output-folder', type=str, required=True, help='YOLO 포맷 데이터셋이 저장될 폴더')
-    return parser.parse_args()
+    parser.add_argument('--link-mode', type=str, default='auto', choices=LINK_MODES,
+                        help='이미지 생성 방식 (auto: 같은 파일시스템이면 hardlink→reflink→symlink, 아니면 청크 복사)')
+    parser.add_argument('--num-workers', type=int, default=min(32, (os.cpu_count() or 1) * 4),
+                        help='이미지 생성 스레드 수')
+    parser.add_argument('--stream-json', action='store_true',
+                        help='COCO json을 전체 로드하지 않고 스트리밍으로 읽기 (대용량 json용)')
+    parser.add_argument('--latest-only', action='store_true',
+                        help='폴더 내 가장 최근 json 하나만 사용 (기본: 모든 샤드 json 병합)')
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count() or 1,
+                        help='샤드 json 파싱 프로세스 수')
+    parser.add_argument('--class-names', type=str, nargs='+', default=CLASS_NAMES,
+                        help='YOLO class id 순서대로 나열한 카테고리 이름 (목록에 없는 카테고리는 이름순으로 뒤에 추가)')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'이전 실행의 {MANIFEST_NAME}와 비교해서 추가/변경/삭제된 이미지만 처리')
+    parser.add_argument('--cache-dir', type=str, default=default_cache_dir(),
+                        help='입력 지문(COCO json 내용, 이미지 목록)이 같으면 이전 변환 결과를 재사용하는 캐시 폴더')
+    parser.add_argument('--no-step-cache', action='store_true', help='단계 캐시를 사용하지 않고 항상 변환')
+    # 분산 변환: Azure ML 다중 노드 작업(pytorch distribution)은 WORLD_SIZE/RANK를 설정함
+    parser.add_argument('--num-shards', type=int, default=int(os.environ.get('WORLD_SIZE', 1)),
+                        help='이미지를 파일명 해시로 나눌 샤드 수')
+    parser.add_argument('--shard-index', type=int, default=int(os.environ.get('RANK', 0)),
+                        help='이 프로세스가 변환할 샤드 번호 (0부터)')
+    parser.add_argument('--run-id', type=str, default=os.environ.get('AZUREML_RUN_ID', ''),
+                        help='같은 실행의 샤드 매니페스트만 병합하기 위한 실행 ID')
+    parser.add_argument('--no-merge', action='store_true', help='샤드 0도 변환만 하고 병합하지 않음')
+    parser.add_argument('--merge-only', action='store_true', help='변환 없이 샤드 매니페스트 검증/병합만 수행')
+    parser.add_argument('--merge-timeout', type=float, default=3600,
+                        help='샤드 0이 다른 샤드의 매니페스트를, 각 샤드가 다른 샤드의 json 인덱스 조각을 기다리는 최대 시간 (초)')
+    parser.add_argument('--local-shards', type=int, default=0,
+                        help='로컬에서 N개 프로세스로 샤드 변환 후 병합 (다중 노드 동작 테스트용)')
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < args.num_shards:
+        parser.error(f"--shard-index는 0 이상 --num-shards({args.num_shards}) 미만이어야 합니다: {args.shard_index}")
+    return args
 
 def find_latest_json(folder):
     json_files = glob.glob(os.path.join(folder, '**', '*.json'), recursive=True)
@@ -20,52 +74,753 @@ def find_latest_json(folder):
     latest_json = max(json_files, key=os.path.getmtime)
     return latest_json
 
-def main():
-    args = parse_args()
+def find_coco_jsons(folder):
+    """폴더 내 모든 샤드 json을 최신 순으로 반환"""
+    json_files = glob.glob(os.path.join(folder, '**', '*.json'), recursive=True)
+    if not json_files:
+        raise FileNotFoundError("No json file found in coco_json_folder")
+    return sorted(json_files, key=lambda p: (os.path.getmtime(p), p), reverse=True)
+
+class ImageRecord:
+    """변환에 필요한 이미지 정보만 담는 경량 레코드"""
+    __slots__ = ('id', 'file_name', 'width', 'height')
+
+    def __init__(self, id, file_name, width, height):
+        self.id = id
+        self.file_name = file_name
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_coco(cls, img):
+        return cls(img['id'], os.path.basename(img['file_name']), img['width'], img['height'])
+
+class _JsonStream:
+    """큰 JSON 파일을 청크 단위로 읽으면서 값 하나씩 디코딩"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(JSON_READ_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, ch):
+        got = self.peek()
+        if got != ch:
+            raise ValueError(f"잘못된 JSON 구조: '{ch}' 위치에 '{got}'")
+        self.pos += 1
+
+    def value(self):
+        while True:
+            self.peek()
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # 숫자 등은 버퍼 끝에서 잘렸을 수 있으므로 뒤가 더 있으면 다시 읽어서 확인
+            if end >= len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def items(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            sep = self.peek()
+            self.pos += 1
+            if sep == ']':
+                return
+            if sep != ',':
+                raise ValueError(f"잘못된 JSON 배열 구분자: '{sep}'")
+
+def iter_coco_sections(path, keys):
+    """최상위 배열(keys)의 원소를 (key, 원소) 형태로 하나씩 반환, 나머지 값은 건너뜀"""
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if stream.peek() == '[':
+                # 관심 없는 배열도 원소 단위로 버려서 메모리 사용량을 일정하게 유지
+                for item in stream.items():
+                    if key in keys:
+                        yield key, item
+            else:
+                stream.value()
+            sep = stream.peek()
+            stream.pos += 1
+            if sep == '}':
+                return
+            if sep != ',':
+                raise ValueError(f"잘못된 JSON 객체 구분자: '{sep}'")
+
+def load_coco_index(coco_json_path, stream=False):
+    """이미지 레코드, 카테고리 목록, 어노테이션 iterable 반환"""
+    if not stream:
+        with open(coco_json_path, 'r') as f:
+            coco = json.load(f)
+        images = {img['id']: ImageRecord.from_coco(img) for img in coco['images']}
+        categories = [(cat['id'], cat['name']) for cat in coco['categories']]
+        return images, categories, coco['annotations']
+
+    # 1차: images/categories만 경량 레코드로 수집 (어노테이션은 읽으면서 버림)
+    images = {}
+    categories = []
+    for key, item in iter_coco_sections(coco_json_path, ('images', 'categories')):
+        if key == 'images':
+            images[item['id']] = ImageRecord.from_coco(item)
+        else:
+            categories.append((item['id'], item['name']))
+    print(f"[INFO] 스트리밍 인덱스 완료: 이미지 {len(images)}개, 카테고리 {len(categories)}개")
+
+    # 2차: 어노테이션은 변환 시점에 하나씩 읽음
+    annotations = (ann for _, ann in iter_coco_sections(coco_json_path, ('annotations',)))
+    return images, categories, annotations
+
+def collect_annotation_columns(annotations):
+    """어노테이션을 image_id / category_id / bbox 컬럼 배열로 수집"""
+    image_ids = array('q')
+    category_ids = array('q')
+    bboxes = array('d')
+    for ann in tqdm(annotations, desc='Collecting annotations'):
+        image_ids.append(ann['image_id'])
+        category_ids.append(ann['category_id'])
+        bboxes.extend(ann['bbox'])
+    return image_ids, category_ids, bboxes
+
+def map_class_ids(category_ids, class_index):
+    """category_id 컬럼을 YOLO class id 컬럼으로 변환"""
+    category_ids = np.asarray(category_ids, dtype=np.int64)
+    unique_ids, inverse = np.unique(category_ids, return_inverse=True)
+    lookup = np.array([class_index[c] for c in unique_ids.tolist()], dtype=np.int64)
+    return lookup[inverse]
+
+def load_coco_shard(coco_json_path, stream=False):
+    """샤드 json 하나를 (이미지 레코드 목록, 카테고리 목록, 어노테이션 컬럼)으로 로드 (프로세스 풀 작업 단위)"""
+    images, categories, annotations = load_coco_index(coco_json_path, stream=stream)
+    return list(images.values()), categories, collect_annotation_columns(annotations)
+
+def _remap_ids(old_ids, id_map):
+    """id_map(dict)에 따라 id 컬럼을 벡터 변환, 매핑이 없으면 -1"""
+    old_ids = np.asarray(old_ids, dtype=np.int64)
+    if not id_map:
+        return np.full(len(old_ids), -1, dtype=np.int64)
+    keys = np.fromiter(id_map.keys(), dtype=np.int64, count=len(id_map))
+    values = np.fromiter(id_map.values(), dtype=np.int64, count=len(id_map))
+    order = np.argsort(keys)
+    keys, values = keys[order], values[order]
+    pos = np.minimum(np.searchsorted(keys, old_ids), len(keys) - 1)
+    return np.where(keys[pos] == old_ids, values[pos], -1)
+
+def merge_coco_shards(shards):
+    """샤드들을 id 재매핑 인덱스로 병합 (카테고리는 이름, 이미지는 file_name 기준, 앞쪽 샤드 우선)"""
+    images = {}
+    name_to_image_id = {}
+    category_list = []
+    name_to_category_id = {}
+    merged_columns = ([], [], [])
+    duplicates = 0
+
+    for shard_images, shard_categories, (image_ids, category_ids, bboxes) in shards:
+        category_map = {}
+        for cat_id, name in shard_categories:
+            if name not in name_to_category_id:
+                name_to_category_id[name] = len(category_list) + 1
+                category_list.append((name_to_category_id[name], name))
+            category_map[cat_id] = name_to_category_id[name]
+
+        # 이미 다른 샤드에 있는 file_name은 중복으로 보고 이 샤드의 이미지/어노테이션은 버림
+        image_map = {}
+        for img in shard_images:
+            if img.file_name in name_to_image_id:
+                duplicates += 1
+                continue
+            new_id = len(images)
+            name_to_image_id[img.file_name] = new_id
+            images[new_id] = ImageRecord(new_id, img.file_name, img.width, img.height)
+            image_map[img.id] = new_id
+
+        new_image_ids = _remap_ids(image_ids, image_map)
+        keep = new_image_ids >= 0
+        merged_columns[0].append(new_image_ids[keep])
+        merged_columns[1].append(_remap_ids(category_ids, category_map)[keep])
+        merged_columns[2].append(np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)[keep])
+
+    if duplicates:
+        print(f"[INFO] 중복 file_name 이미지 {duplicates}개 제외 (최신 샤드 우선)")
+    columns = (
+        np.concatenate(merged_columns[0]) if shards else np.empty(0, dtype=np.int64),
+        np.concatenate(merged_columns[1]) if shards else np.empty(0, dtype=np.int64),
+        np.concatenate(merged_columns[2]) if shards else np.empty((0, 4)),
+    )
+    return images, category_list, columns
+
+def load_coco_shards(json_paths, stream=False, num_workers=1):
+    """샤드 json들을 프로세스 풀로 병렬 파싱한 뒤 병합"""
+    if len(json_paths) == 1:
+        shard_images, category_list, columns = load_coco_shard(json_paths[0], stream)
+        return {img.id: img for img in shard_images}, category_list, columns
+
+    print(f"[INFO] 샤드 json {len(json_paths)}개 병렬 파싱 (프로세스 {num_workers}개)")
+    with ProcessPoolExecutor(max_workers=max(1, min(num_workers, len(json_paths)))) as pool:
+        shards = list(pool.map(load_coco_shard, json_paths, [stream] * len(json_paths)))
+    images, category_list, columns = merge_coco_shards(shards)
+    print(f"[INFO] 병합 완료: 이미지 {len(images)}개, 카테고리 {len(category_list)}개, 어노테이션 {len(columns[0])}개")
+    return images, category_list, columns
+
+def class_order(category_list, class_names=CLASS_NAMES):
+    """YOLO class 이름 목록: class_names 순서로 고정하고, 그 외 카테고리는 이름순으로 뒤에 추가
+    (샤드 json 순서나 카테고리 등장 순서가 바뀌어도 class id가 바뀌지 않도록)"""
+    ordered = list(class_names)
+    extra = sorted({name for _, name in category_list} - set(ordered))
+    if extra:
+        print(f"[경고] --class-names에 없는 카테고리를 뒤에 추가합니다: {extra}")
+    return ordered + extra
+
+def build_label_texts(image_ids, class_ids, bboxes, images):
+    """bbox 컬럼을 한 번에 YOLO 정규화 좌표로 변환하고 (image_id, 라벨 텍스트)를 이미지별로 반환"""
+    ids = np.asarray(image_ids, dtype=np.int64)
+    cls = np.asarray(class_ids, dtype=np.int64)
+    boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    if len(ids) == 0 or not images:
+        return
+
+    # image_id -> (width, height) 조회를 정렬 + searchsorted로 벡터화
+    record_ids = np.fromiter(images.keys(), dtype=np.int64, count=len(images))
+    sizes = np.array([(img.width, img.height) for img in images.values()], dtype=np.float64).reshape(-1, 2)
+    order = np.argsort(record_ids)
+    record_ids, sizes = record_ids[order], sizes[order]
+    pos = np.minimum(np.searchsorted(record_ids, ids), len(record_ids) - 1)
+    wh = sizes[pos]
+    valid = (record_ids[pos] == ids) & (wh[:, 0] > 0) & (wh[:, 1] > 0)
+    if not valid.all():
+        print(f"[경고] 이미지 정보가 없거나 크기가 0인 어노테이션 {int((~valid).sum())}개 제외")
+        ids, cls, boxes, wh = ids[valid], cls[valid], boxes[valid], wh[valid]
+
+    # COCO bbox: [x_min, y_min, width, height] -> YOLO: [class, x_center, y_center, width, height] (정규화)
+    rows = np.empty((len(ids), 5), dtype=np.float64)
+    rows[:, 0] = cls
+    rows[:, 1] = (boxes[:, 0] + boxes[:, 2] / 2) / wh[:, 0]
+    rows[:, 2] = (boxes[:, 1] + boxes[:, 3] / 2) / wh[:, 1]
+    rows[:, 3] = boxes[:, 2] / wh[:, 0]
+    rows[:, 4] = boxes[:, 3] / wh[:, 1]
+
+    # image_id 기준으로 묶기 (같은 이미지 내 어노테이션 순서는 유지)
+    order = np.argsort(ids, kind='stable')
+    ids, rows = ids[order], rows[order]
+    unique_ids, starts = np.unique(ids, return_index=True)
+    ends = np.append(starts[1:], len(ids))
+    for image_id, start, end in zip(unique_ids.tolist(), starts.tolist(), ends.tolist()):
+        block = rows[start:end]
+        yield image_id, (LABEL_LINE_FORMAT * len(block)) % tuple(block.ravel().tolist())
+
+def write_label_files(label_texts, images, labels_dir):
+    """이미지별 라벨 파일을 한 번씩만 열어서 기록하고 기록한 파일 수 반환"""
+    written = 0
+    for image_id, text in label_texts:
+        img_name = os.path.splitext(images[image_id].file_name)[0]
+        with open(os.path.join(labels_dir, f"{img_name}.txt"), 'w') as f:
+            f.write(text)
+        written += 1
+    return written
+
+def label_digest(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def load_manifest(output_folder, name=MANIFEST_NAME):
+    """이전 실행의 매니페스트 로드 (없거나 형식이 다르면 None)"""
+    path = os.path.join(output_folder, name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[경고] 매니페스트를 읽을 수 없어 전체 변환합니다: {path}, 에러: {e}")
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        print(f"[경고] 매니페스트 버전이 달라 전체 변환합니다: {manifest.get('version')}")
+        return None
+    return manifest
+
+def save_manifest(output_folder, manifest, name=MANIFEST_NAME):
+    """매니페스트를 임시 파일에 쓴 뒤 교체 (중간에 실패해도 이전 매니페스트 유지)"""
+    path = os.path.join(output_folder, name)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+def stat_sources(images, image_folder, num_workers=8):
+    """원본 이미지의 (크기, mtime_ns)를 병렬로 조회, 없는 파일은 None"""
+    def _stat(img):
+        try:
+            st = os.stat(os.path.join(image_folder, img.file_name))
+        except FileNotFoundError:
+            return img.file_name, None
+        return img.file_name, (st.st_size, st.st_mtime_ns)
+
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+        return dict(pool.map(_stat, images.values()))
+
+def build_manifest_entries(images, label_texts, source_stats):
+    """출력 파일명 기준 매니페스트 항목 생성"""
+    entries = {}
+    for image_id, img in images.items():
+        stat = source_stats.get(img.file_name)
+        entries[img.file_name] = {
+            'id': image_id,
+            'size': stat[0] if stat else None,
+            'mtime_ns': stat[1] if stat else None,
+            'label_digest': label_digest(label_texts.get(image_id, '')),
+        }
+    return entries
+
+def plan_changes(previous, entries, images_dir, labels_dir):
+    """이전 매니페스트와 비교해서 (이미지 갱신 대상, 라벨 갱신 대상, 삭제 대상) 파일명 목록 반환"""
+    if previous is None:
+        names = list(entries)
+        return names, names, []
+
+    old_entries = previous.get('images', {})
+    existing_images = set(os.listdir(images_dir))
+    existing_labels = set(os.listdir(labels_dir))
+    image_updates, label_updates = [], []
+    for name, entry in entries.items():
+        old = old_entries.get(name)
+        source_changed = (
+            old is None
+            or entry['size'] is None
+            or (old.get('size'), old.get('mtime_ns')) != (entry['size'], entry['mtime_ns'])
+            or name not in existing_images
+        )
+        if source_changed:
+            image_updates.append(name)
+        label_name = os.path.splitext(name)[0] + '.txt'
+        has_label = entry['label_digest'] != label_digest('')
+        if old is None or old.get('label_digest') != entry['label_digest'] or has_label != (label_name in existing_labels):
+            label_updates.append(name)
+    deleted = [name for name in old_entries if name not in entries]
+    return image_updates, label_updates, deleted
+
+def remove_outputs(names, images_dir, labels_dir):
+    """삭제된 이미지의 이미지/라벨 파일 제거"""
+    for name in names:
+        for path in (os.path.join(images_dir, name),
+                     os.path.join(labels_dir, os.path.splitext(name)[0] + '.txt')):
+            if os.path.lexists(path):
+                os.remove(path)
+
+def shard_of(file_name, num_shards):
+    """파일명 해시로 샤드 번호 결정 (이미지 추가/삭제나 json 순서와 무관하게 고정)"""
+    return int.from_bytes(hashlib.sha1(file_name.encode('utf-8')).digest()[8:16], 'big') % num_shards
+
+def manifest_name(num_shards=1, shard_index=0):
+    if num_shards <= 1:
+        return MANIFEST_NAME
+    return f"manifest.shard-{shard_index:03d}-of-{num_shards:03d}.json"
+
+def split_by_shard(shard, num_shards):
+    """파싱한 json 하나를 이미지 샤드별 조각 목록으로 나눔 (카테고리 목록은 모든 조각에 그대로 유지)"""
+    shard_images, categories, (image_ids, category_ids, bboxes) = shard
+    owner = {img.id: shard_of(img.file_name, num_shards) for img in shard_images}
+    buckets = [[] for _ in range(num_shards)]
+    for img in shard_images:
+        buckets[owner[img.id]].append(img)
+    image_ids = np.asarray(image_ids, dtype=np.int64)
+    category_ids = np.asarray(category_ids, dtype=np.int64)
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    ann_owner = np.fromiter((owner.get(i, -1) for i in image_ids.tolist()), dtype=np.int64, count=len(image_ids))
+    return [(buckets[i], categories, (image_ids[ann_owner == i], category_ids[ann_owner == i], bboxes[ann_owner == i]))
+            for i in range(num_shards)]
+
+def index_piece_path(index_dir, json_index, shard_index):
+    return os.path.join(index_dir, f"json-{json_index:04d}.shard-{shard_index:03d}.pkl")
+
+def write_index_pieces(json_path, json_index, index_dir, num_shards, stream=False):
+    """json 하나를 파싱해서 샤드별 조각 파일로 저장 (프로세스 풀 작업 단위)"""
+    pieces = split_by_shard(load_coco_shard(json_path, stream), num_shards)
+    for shard_index, piece in enumerate(pieces):
+        path = index_piece_path(index_dir, json_index, shard_index)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(piece, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+    return json_index
+
+def claim_json(index_dir, json_index, shard_index):
+    """json 파싱을 맡겠다고 표시 (이미 다른 샤드가 맡았으면 False, 같은 샤드의 재시도면 다시 맡음)"""
+    path = os.path.join(index_dir, f"json-{json_index:04d}.claim")
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        with open(path, 'r') as f:
+            return f.read().strip() == str(shard_index)
+    with os.fdopen(fd, 'w') as f:
+        f.write(str(shard_index))
+    return True
+
+def load_partitioned_coco(json_paths, args):
+    """json 파싱을 샤드들이 나눠 맡고, 공유 출력 폴더의 조각 파일을 모아 이 샤드의 인덱스만 병합
+
+    각 샤드는 빈 파싱 슬롯이 생길 때마다 아직 아무도 맡지 않은 json을 하나 맡아 파싱하고, 모든 샤드용 조각을 기록한다.
+    단계 캐시가 적중한 샤드는 참여하지 않으므로 캐시 미스 샤드끼리 전체 json을 나눠 처리한다.
+    """
+    signature = [[os.path.basename(p), os.path.getsize(p), os.stat(p).st_mtime_ns] for p in json_paths]
+    index_dir = os.path.join(args.output_folder, INDEX_DIR, step_fingerprint(
+        'coco2yolo-index', run_id=args.run_id, num_shards=args.num_shards, coco_json=signature)[:16])
+    os.makedirs(index_dir, exist_ok=True)
+
+    # 샤드마다 다른 json부터 시작해서 처음부터 같은 json을 두고 경쟁하지 않도록 함
+    order = [(args.shard_index + i) % len(json_paths) for i in range(len(json_paths))]
+    workers = max(1, min(args.parse_workers, len(json_paths)))
+    parsed = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = set()
+        for i in order:
+            if len(running) >= workers:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                parsed += [f.result() for f in done]
+            if claim_json(index_dir, i, args.shard_index):
+                running.add(pool.submit(write_index_pieces, json_paths[i], i, index_dir, args.num_shards,
+                                        args.stream_json))
+        parsed += [f.result() for f in running]
+    print(f"[INFO] json {len(json_paths)}개 중 {len(parsed)}개 파싱 (나머지는 다른 샤드가 파싱)")
+
+    paths = [index_piece_path(index_dir, i, args.shard_index) for i in range(len(json_paths))]
+    deadline = time.monotonic() + args.merge_timeout
+    while True:
+        pending = [p for p in paths if not os.path.exists(p)]
+        if not pending:
+            break
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"json 인덱스 조각 대기 시간 초과 ({args.merge_timeout:.0f}s): "
+                               f"{', '.join(os.path.basename(p) for p in pending)}")
+        print(f"[INFO] 다른 샤드의 json 인덱스 조각 대기 중: {len(pending)}/{len(paths)}개 남음")
+        time.sleep(MERGE_POLL_INTERVAL)
+
+    pieces = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            pieces.append(pickle.load(f))
+    # json 순서대로 병합하므로 중복 file_name 우선순위는 전체 병합과 같음
+    images, category_list, columns = merge_coco_shards(pieces)
+    print(f"[INFO] 샤드 인덱스 병합: 이미지 {len(images)}개, 카테고리 {len(category_list)}개, "
+          f"어노테이션 {len(columns[0])}개")
+    return images, category_list, columns
+
+def dataset_fingerprint(json_paths, args):
+    """변환 결과를 결정하는 입력(COCO json 내용과 병합 순서, 원본 이미지 목록, 변환 옵션)의 캐시 키
+
+    샤드로 나누면 원본 이미지는 이 샤드에 속한 파일만 stat한다.
+    """
+    inputs, include = {}, None
+    if args.num_shards > 1:
+        inputs = {'num_shards': args.num_shards, 'shard_index': args.shard_index}
+        include = lambda rel: shard_of(rel.replace(os.sep, '/'), args.num_shards) == args.shard_index
+    return step_fingerprint(
+        'coco2yolo',
+        coco_json=[file_digest(p) for p in json_paths],
+        images=tree_digest(args.image_folder, args.num_workers, include=include),
+        latest_only=args.latest_only,
+        classes=list(args.class_names),
+        manifest_version=MANIFEST_VERSION,
+        **inputs
+    )
+
+def restore_cached_dataset(cache, key, meta, args, images_dir, labels_dir):
+    """캐시된 라벨/매니페스트로 출력 폴더를 갱신하고 이미지는 원본에서 생성 (출력 폴더의 기존 매니페스트와 다른 것만)"""
+    with open(os.path.join(cache.path(key), MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest_file = manifest_name(args.num_shards, args.shard_index)
+    entries = manifest['images']
+    previous = load_manifest(args.output_folder, manifest_file) if args.incremental else None
+    image_updates, label_updates, deleted = plan_changes(previous, entries, images_dir, labels_dir)
+    remove_outputs(deleted, images_dir, labels_dir)
+
+    jobs = [(os.path.join(args.image_folder, name), os.path.join(images_dir, name)) for name in image_updates]
+    stats = materialize_files(jobs, mode=args.link_mode, num_workers=args.num_workers)
+
+    cached_labels = set(meta.get('files', []))
+    restore, stale = [], []
+    for name in label_updates:
+        rel = os.path.relpath(os.path.join(labels_dir, os.path.splitext(name)[0] + '.txt'), args.output_folder)
+        (restore if rel in cached_labels else stale).append(rel)
+    for rel in stale:
+        path = os.path.join(args.output_folder, rel)
+        if os.path.lexists(path):
+            os.remove(path)
+    cache.restore(key, meta, args.output_folder, names=restore, num_workers=args.num_workers)
+    print(f"[INFO] 캐시 복원: 이미지 {stats['files']}개, 라벨 {len(restore)}개, 삭제 {len(deleted)}개")
+    manifest['run_id'] = args.run_id
+    save_manifest(args.output_folder, manifest, manifest_file)
+    return stats
+
+def convert(args):
+    """샤드 하나(샤드를 나누지 않으면 전체)를 변환해서 이미지/라벨과 샤드 매니페스트 생성"""
+    sharded = args.num_shards > 1
+    profiler = Profiler(f"coco2yolo_shard{args.shard_index}" if sharded else 'coco2yolo')
+    profile_name = f"profile.shard-{args.shard_index:03d}.json" if sharded else PROFILE_NAME
+    manifest_file = manifest_name(args.num_shards, args.shard_index)
     os.makedirs(args.output_folder, exist_ok=True)
     images_dir = os.path.join(args.output_folder, 'images')
     labels_dir = os.path.join(args.output_folder, 'labels')
     os.makedirs(images_dir, exist_ok=True)
     os.makedirs(labels_dir, exist_ok=True)
+    if sharded:
+        print(f"[INFO] 샤드 {args.shard_index + 1}/{args.num_shards} 변환 (run: {args.run_id or '-'})")
 
-    coco_json_path = find_latest_json(args.coco_json_folder)
-    with open(coco_json_path, 'r') as f:
-        coco = json.load(f)
+    if args.latest_only:
+        json_paths = [find_latest_json(args.coco_json_folder)]
+    else:
+        json_paths = find_coco_jsons(args.coco_json_folder)
 
-    images = {img['id']: img for img in coco['images']}
-    categories = {cat['id']: cat['name'] for cat in coco['categories']}
-    class_name_to_id = {cat['name']: i for i, cat in enumerate(coco['categories'])}
+    # 입력 지문이 같은 이전 변환 결과가 캐시에 있으면 파싱/변환 없이 복원
+    cache = key = None
+    if not args.no_step_cache:
+        cache = StepCache(args.cache_dir, 'coco2yolo')
+        with profiler.phase('fingerprint') as phase:
+            key = dataset_fingerprint(json_paths, args)
+            phase.add(files=len(json_paths))
+        cached = cache.lookup(key)
+        if cached is not None:
+            print(f"[INFO] 단계 캐시 적중: {key[:16]} (변환 생략)")
+            with profiler.phase('restore') as phase:
+                stats = restore_cached_dataset(cache, key, cached, args, images_dir, labels_dir)
+                phase.add(files=stats['files'])
+            profiler.log_mlflow(profiler.save(args.output_folder, profile_name))
+            print(f"[완료] 캐시된 YOLO 포맷 데이터셋이 {args.output_folder}에 복원되었습니다.")
+            return
+        print(f"[INFO] 단계 캐시 없음: {key[:16]} (전체 변환 후 저장)")
 
-    # 이미지 복사
-    for img in tqdm(coco['images'], desc='Copying images'):
-        src = os.path.join(args.image_folder, os.path.basename(img['file_name']))
-        dst = os.path.join(images_dir, os.path.basename(img['file_name']))
-        if os.path.exists(src):
-            shutil.copy(src, dst)
+    with profiler.phase('load_json') as phase:
+        if sharded:
+            images, category_list, columns = load_partitioned_coco(json_paths, args)
         else:
-            print(f"[경고] 이미지 파일 없음: {src}")
-
-    # 라벨 생성
-    for ann in tqdm(coco['annotations'], desc='Converting labels'):
-        img = images[ann['image_id']]
-        img_w, img_h = img['width'], img['height']
-        cat_id = ann['category_id']
-        class_id = class_name_to_id[categories[cat_id]]
-
-        # COCO bbox: [x_min, y_min, width, height] -> YOLO: [x_center, y_center, width, height] (정규화)
-        x, y, w, h = ann['bbox']
-        # 절대좌표를 정규화 (0~1 범위로)
-        # x /= img_w; w /= img_w; y /= img_h; h /= img_h
-        x_center = x + w / 2
-        y_center = y + h / 2
-
-        label_line = f"{class_id} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}\n"
-        img_name = os.path.splitext(os.path.basename(img['file_name']))[0]
-        label_path = os.path.join(labels_dir, f"{img_name}.txt")
-        with open(label_path, 'a') as f:
-            f.write(label_line)
+            images, category_list, columns = load_coco_shards(
+                json_paths, stream=args.stream_json, num_workers=args.parse_workers
+            )
+        phase.add(files=len(json_paths))
+    image_ids, category_ids, bboxes = columns
+
+    categories = dict(category_list)
+    class_names = class_order(category_list, args.class_names)
+    class_name_to_id = {name: i for i, name in enumerate(class_names)}
+
+    # 라벨 변환 (컬럼 단위 벡터 변환, 기록은 변경 여부 확인 후)
+    with profiler.phase('convert_labels') as phase:
+        class_index = {cat_id: class_name_to_id[name] for cat_id, name in categories.items()}
+        class_ids = map_class_ids(category_ids, class_index)
+        label_texts = dict(build_label_texts(image_ids, class_ids, bboxes, images))
+        phase.add(annotations=len(image_ids))
+
+    # 이전 매니페스트와 비교해서 처리 대상 결정
+    previous = load_manifest(args.output_folder, manifest_file) if args.incremental else None
+    if previous is not None and previous.get('classes') != class_names:
+        print(f"[경고] 클래스 목록이 바뀌어 전체 변환합니다: {previous.get('classes')} -> {class_names}")
+        previous = None
+    with profiler.phase('plan') as phase:
+        source_stats = stat_sources(images, args.image_folder, args.num_workers)
+        entries = build_manifest_entries(images, label_texts, source_stats)
+        image_updates, label_updates, deleted = plan_changes(previous, entries, images_dir, labels_dir)
+        phase.add(files=len(entries))
+    if previous is not None:
+        print(f"[INFO] 증분 변환: 전체 {len(entries)}개 중 이미지 갱신 {len(image_updates)}개, "
+              f"라벨 갱신 {len(label_updates)}개, 삭제 {len(deleted)}개")
+
+    remove_outputs(deleted, images_dir, labels_dir)
+
+    # 이미지 생성 (링크 또는 병렬 청크 복사)
+    with profiler.phase('materialize_images') as phase:
+        jobs = [(os.path.join(args.image_folder, name), os.path.join(images_dir, name)) for name in image_updates]
+        copy_stats = materialize_files(jobs, mode=args.link_mode, num_workers=args.num_workers)
+        phase.add(files=copy_stats['files'], source_bytes=copy_stats['bytes_total'],
+                  copied_bytes=copy_stats['bytes_copied'])
+
+    # 라벨 기록 (이미지별로 한 번씩, 어노테이션이 없어진 이미지는 라벨 제거)
+    with profiler.phase('write_labels') as phase:
+        updated_ids = [entries[name]['id'] for name in label_updates]
+        stale = [images[i].file_name for i in updated_ids if i not in label_texts]
+        for name in stale:
+            label_path = os.path.join(labels_dir, os.path.splitext(name)[0] + '.txt')
+            if os.path.lexists(label_path):
+                os.remove(label_path)
+        written = write_label_files(((i, label_texts[i]) for i in updated_ids if i in label_texts), images, labels_dir)
+        phase.add(files=written)
+    print(f"[INFO] 어노테이션 {len(image_ids)}개 -> 라벨 파일 {written}개 기록")
+
+    with profiler.phase('save_manifest') as phase:
+        manifest_path = save_manifest(args.output_folder, {
+            'version': MANIFEST_VERSION,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'source_json': [os.path.basename(p) for p in json_paths],
+            'classes': class_names,
+            'images': entries,
+            'fingerprint': key,
+            'shard': {'index': args.shard_index, 'count': args.num_shards},
+            'run_id': args.run_id,
+        }, manifest_file)
+        phase.add(files=1)
+    print(f"[INFO] 매니페스트 저장: {manifest_path}")
+
+    if cache is not None:
+        with profiler.phase('store_cache') as phase:
+            # 이 샤드의 라벨만 저장 (다른 샤드가 같은 labels 폴더에 기록 중일 수 있음)
+            label_paths = [os.path.join(labels_dir, os.path.splitext(name)[0] + '.txt') for name in entries]
+            files = {os.path.relpath(path, args.output_folder): path for path in label_paths if os.path.exists(path)}
+            files[MANIFEST_NAME] = manifest_path
+            cache.store(key, {'created': time.strftime('%Y-%m-%d %H:%M:%S')}, files, num_workers=args.num_workers)
+            phase.add(files=len(files))
+
+    profiler.log_mlflow(profiler.save(args.output_folder, profile_name))
 
     print(f"[완료] YOLO 포맷 데이터셋이 {args.output_folder}에 생성되었습니다.")
 
+def wait_for_shard_manifests(output_folder, num_shards, run_id='', timeout=3600):
+    """모든 샤드 매니페스트(run_id가 주어지면 같은 실행의 것)가 준비될 때까지 기다렸다가 목록 반환"""
+    names = [manifest_name(num_shards, i) for i in range(num_shards)]
+    deadline = time.monotonic() + timeout
+    while True:
+        manifests = [load_manifest(output_folder, name) if os.path.exists(os.path.join(output_folder, name)) else None
+                     for name in names]
+        pending = [name for name, m in zip(names, manifests)
+                   if m is None or (run_id and m.get('run_id') != run_id)]
+        if not pending:
+            return manifests
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"샤드 매니페스트 대기 시간 초과 ({timeout:.0f}s): {', '.join(pending)}")
+        print(f"[INFO] 샤드 매니페스트 대기 중: {len(pending)}/{num_shards}개 남음")
+        time.sleep(MERGE_POLL_INTERVAL)
+
+def merge_shard_manifests(output_folder, num_shards, run_id='', timeout=3600):
+    """샤드 매니페스트를 검증해서 하나의 manifest.json으로 합치고, 어느 샤드에도 없는 이전 출력 파일 제거"""
+    start = time.perf_counter()
+    manifests = wait_for_shard_manifests(output_folder, num_shards, run_id, timeout)
+    images_dir = os.path.join(output_folder, 'images')
+    labels_dir = os.path.join(output_folder, 'labels')
+    errors = []
+    first = manifests[0]
+    entries = {}
+    for index, manifest in enumerate(manifests):
+        if manifest.get('shard') != {'index': index, 'count': num_shards}:
+            errors.append(f"샤드 {index}: 샤드 정보 불일치 {manifest.get('shard')}")
+        for key in ('classes', 'source_json'):
+            if manifest.get(key) != first.get(key):
+                errors.append(f"샤드 {index}: {key} 불일치 ({manifest.get(key)} != {first.get(key)})")
+        for name, entry in manifest['images'].items():
+            if name in entries:
+                errors.append(f"샤드 {index}: 중복 이미지 {name}")
+            elif shard_of(name, num_shards) != index:
+                errors.append(f"샤드 {index}: 다른 샤드에 속한 이미지 {name}")
+            entries[name] = entry
+            # 원본이 없던 이미지는 출력도 없음, 라벨은 어노테이션이 있는 이미지만
+            if entry['size'] is not None and not os.path.exists(os.path.join(images_dir, name)):
+                errors.append(f"샤드 {index}: 이미지 파일 없음 {name}")
+            has_label = entry['label_digest'] != label_digest('')
+            if has_label != os.path.exists(os.path.join(labels_dir, os.path.splitext(name)[0] + '.txt')):
+                errors.append(f"샤드 {index}: 라벨 파일 {'없음' if has_label else '남아 있음'} {name}")
+    if errors:
+        for error in errors[:MAX_MERGE_ERRORS]:
+            print(f"[ERROR] {error}")
+        raise ValueError(f"샤드 매니페스트 검증 실패: {len(errors)}건")
+
+    # 샤드 수가 바뀌었거나 삭제된 이미지의 이전 출력 정리
+    labels = {os.path.splitext(name)[0] + '.txt' for name in entries}
+    orphans = [path for path in list_files(images_dir) if os.path.relpath(path, images_dir) not in entries]
+    orphans += [path for path in list_files(labels_dir) if os.path.relpath(path, labels_dir) not in labels]
+    for path in orphans:
+        os.remove(path)
+    # 모든 샤드가 매니페스트를 썼으면 json 인덱스 조각은 더 이상 필요 없음
+    shutil.rmtree(os.path.join(output_folder, INDEX_DIR), ignore_errors=True)
+
+    path = save_manifest(output_folder, {
+        'version': MANIFEST_VERSION,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'source_json': first['source_json'],
+        'classes': first['classes'],
+        'images': entries,
+        'fingerprint': step_fingerprint('coco2yolo-merge', shards=[m.get('fingerprint') for m in manifests]),
+        'shard': {'index': 0, 'count': 1, 'merged_from': num_shards},
+        'run_id': run_id,
+    })
+    print(f"[INFO] 샤드 {num_shards}개 병합: 이미지 {len(entries)}개, 정리한 파일 {len(orphans)}개 "
+          f"({time.perf_counter() - start:.2f}s) -> {path}")
+    return path
+
+def list_files(folder):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(folder) for name in names)
+
+def _strip_arg(argv, option):
+    """argv에서 '--option 값'과 '--option=값' 형태 제거"""
+    stripped, skip = [], False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == option:
+            skip = True
+        elif not arg.startswith(option + '='):
+            stripped.append(arg)
+    return stripped
+
+def run_local_shards(args):
+    """샤드 변환을 로컬 프로세스 N개로 동시에 실행하고 병합 (다중 노드 작업을 한 머신에서 재현)"""
+    run_id = args.run_id or f"local-{os.getpid()}-{int(time.time())}"
+    argv = sys.argv[1:]
+    for option in ('--local-shards', '--num-shards', '--shard-index', '--run-id'):
+        argv = _strip_arg(argv, option)
+    # 각 프로세스가 이미지 생성 스레드를 나눠 쓰도록 기본값 조정
+    if '--num-workers' not in argv and not any(a.startswith('--num-workers=') for a in argv):
+        argv += ['--num-workers', str(max(1, args.num_workers // args.local_shards))]
+    start = time.perf_counter()
+    procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__)] + argv +
+                              ['--num-shards', str(args.local_shards), '--shard-index', str(i),
+                               '--run-id', run_id, '--no-merge'])
+             for i in range(args.local_shards)]
+    failed = [i for i, proc in enumerate(procs) if proc.wait() != 0]
+    if failed:
+        raise RuntimeError(f"샤드 변환 실패: {failed}")
+    print(f"[INFO] 로컬 샤드 {args.local_shards}개 변환 완료 ({time.perf_counter() - start:.2f}s)")
+    merge_shard_manifests(args.output_folder, args.local_shards, run_id, timeout=0)
+
+def main():
+    args = parse_args()
+    if args.local_shards > 0:
+        run_local_shards(args)
+    elif args.merge_only:
+        merge_shard_manifests(args.output_folder, args.num_shards, args.run_id, args.merge_timeout)
+    else:
+        convert(args)
+        # 샤드 0이 나머지 샤드를 기다렸다가 병합
+        if args.num_shards > 1 and args.shard_index == 0 and not args.no_merge:
+            merge_shard_manifests(args.output_folder, args.num_shards, args.run_id, args.merge_timeout)
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
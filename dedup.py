@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from step_cache import StepCache, default_cache_dir, step_fingerprint, tree_digest
+
+PHASH_VERSION = 1  # 해시 계산 방식이 바뀌면 올려서 캐시 무효화
+HASH_SIZE = 8  # 8x8 저주파 DCT 계수 -> 64비트 해시
+DCT_SIZE = 32  # DCT 입력 크기 (HASH_SIZE의 4배)
+DEDUP_THRESHOLD = 6  # 해밍 거리 이하이면 거의 같은 이미지로 판단 (64비트 중)
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+
+def _dct_matrix(n):
+    """정규직교 DCT-II 행렬 (D @ x @ D.T 가 2D DCT)"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    d = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    d[0] /= np.sqrt(2.0)
+    return d
+
+_DCT = _dct_matrix(DCT_SIZE)
+
+def phash(path):
+    """흑백 32x32 축소 이미지의 저주파 8x8 DCT 계수를 중앙값과 비교한 64비트 지각 해시, 디코딩 실패 시 None"""
+    import cv2
+    # JPEG는 1/4 크기로 바로 디코딩 (원본 해상도 디코딩 생략)
+    im = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if im is None:
+        return None
+    small = cv2.resize(im, (DCT_SIZE, DCT_SIZE), interpolation=cv2.INTER_AREA).astype(np.float64)
+    coeffs = (_DCT @ small @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    bits = coeffs > np.median(coeffs[1:])  # DC 성분은 밝기라서 중앙값 계산에서 제외
+    return int(np.packbits(bits).view('>u8')[0])
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """해밍 거리 BK-tree: 거리 r 이내 검색 시 삼각 부등식으로 대부분의 노드를 건너뜀"""
+
+    def __init__(self):
+        self.root = None  # [해시, 항목, {거리: 자식 노드}]
+        self.size = 0
+
+    def add(self, h, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [h, item, {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, item, {}]
+                return
+            node = child
+
+    def query(self, h, radius):
+        """거리 radius 이내 (거리, 항목) 목록"""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                found.append((d, node[1]))
+            for child_d, child in node[2].items():
+                if d - radius <= child_d <= d + radius:
+                    stack.append(child)
+        return found
+
+def list_images(images_dir):
+    return sorted(f for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTS))
+
+def compute_hashes(images_dir, names, cache_dir=None, num_workers=None):
+    """이미지별 지각 해시를 프로세스 풀로 병렬 계산 (폴더 지문이 같으면 캐시 재사용)"""
+    cache = key = None
+    if cache_dir:
+        cache = StepCache(cache_dir, 'phash')
+        key = step_fingerprint('phash', images=tree_digest(images_dir), version=PHASH_VERSION)
+        cached = cache.lookup(key)
+        if cached is not None:
+            print(f"[INFO] 지각 해시 캐시 사용: {key[:16]}")
+            return cached['hashes']
+
+    paths = [os.path.join(images_dir, name) for name in names]
+    with ProcessPoolExecutor(max_workers=num_workers or os.cpu_count() or 1) as pool:
+        hashes = dict(zip(names, pool.map(phash, paths, chunksize=64)))
+    if cache is not None:
+        cache.store(key, {'hashes': hashes})
+    return hashes
+
+def find_near_duplicates(hashes, threshold=DEDUP_THRESHOLD):
+    """이름 순(연속 프레임이 인접)으로 보면서 이미 남긴 이미지와 거리 threshold 이내면 중복으로 표시, {중복: 대표} 반환"""
+    tree = BKTree()
+    duplicates = {}
+    for name in sorted(hashes):
+        h = hashes[name]
+        if h is None:
+            continue  # 해시를 못 구한 이미지는 항상 유지
+        matches = tree.query(h, threshold)
+        if matches:
+            duplicates[name] = min(matches)[1]
+        else:
+            tree.add(h, name)
+    return duplicates
+
+def dedup_dataset(data_folder, threshold=DEDUP_THRESHOLD, cache_dir=None, num_workers=None):
+    """data_folder/images의 거의 같은 이미지를 찾아서 제외할 이미지와 통계를 담은 리포트 반환"""
+    images_dir = os.path.join(data_folder, 'images')
+    names = list_images(images_dir)
+    start = time.perf_counter()
+    hashes = compute_hashes(images_dir, names, cache_dir, num_workers)
+    hash_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    duplicates = find_near_duplicates(hashes, threshold)
+    search_seconds = time.perf_counter() - start
+
+    total = len(names)
+    pruned = len(duplicates)
+    report = {
+        'threshold': threshold,
+        'total_images': total,
+        'kept_images': total - pruned,
+        'pruned_images': pruned,
+        'pruned_ratio': pruned / total if total else 0.0,
+        'unreadable_images': sum(h is None for h in hashes.values()),
+        'hash_seconds': hash_seconds,
+        'search_seconds': search_seconds,
+        # 에포크 시간은 학습 이미지 수에 거의 비례
+        'estimated_epoch_time_saving': pruned / total if total else 0.0,
+        'duplicates': duplicates,
+    }
+    print(f"[INFO] 중복 제거 (해밍 거리 <= {threshold}): 이미지 {total}개 중 {pruned}개 제외 "
+          f"({report['pruned_ratio'] * 100:.1f}%, 해시 {hash_seconds:.2f}s, 검색 {search_seconds:.2f}s)")
+    print(f"[INFO] 예상 에포크 시간 절감: {report['estimated_epoch_time_saving'] * 100:.1f}%")
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="지각 해시로 거의 같은 이미지(연속 프레임 등) 찾기")
+    parser.add_argument('--data-folder', type=str, required=True, help='images/, labels/가 있는 YOLO 데이터셋 폴더')
+    parser.add_argument('--threshold', type=int, default=DEDUP_THRESHOLD, help='중복으로 볼 최대 해밍 거리 (64비트 중)')
+    parser.add_argument('--cache-dir', type=str, default=default_cache_dir())
+    parser.add_argument('--num-workers', type=int, default=None)
+    parser.add_argument('--output', type=str, default=None, help='리포트 json 경로 (중복 -> 대표 이미지 목록 포함)')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    report = dedup_dataset(args.data_folder, args.threshold, args.cache_dir, args.num_workers)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"[완료] 리포트 저장: {args.output}")
+
+if __name__ == "__main__":
+    main()
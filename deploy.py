@@ -1,15 +1,50 @@
+import argparse
+import json
+import os
+
 from azure.ai.ml import MLClient
-from azure.ai.ml.entities import ManagedOnlineEndpoint, ManagedOnlineDeployment, Model
+from azure.ai.ml.entities import ManagedOnlineEndpoint, ManagedOnlineDeployment, Model, CodeConfiguration
 from azure.identity import DefaultAzureCredential
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="모델 등록 및 온라인 엔드포인트 배포")
+    parser.add_argument("--model-folder", type=str, default="outputs/model",
+                        help="export_model.py 출력 폴더 (model/ 폴더와 export_report.json)")
+    parser.add_argument("--eval-folder", type=str, default=None, help="model_eval 출력 폴더 (evaluation_report.json)")
+    return parser.parse_args()
+
+def load_json(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+args = parse_args()
 ml_client = MLClient(DefaultAzureCredential(), "ca3a7121-8c69-4769-a3c4-01dbafb3872d", "Green-Hat", "greenhat-ai")
 
+# export 단계에서 선택된 모델 (없으면 폴더 전체)
+model_path = os.path.join(args.model_folder, 'model')
+if not os.path.isdir(model_path):
+    model_path = args.model_folder
+export_report = load_json(os.path.join(args.model_folder, 'export_report.json'))
+eval_report = load_json(os.path.join(args.eval_folder, 'evaluation_report.json') if args.eval_folder else None)
+
+tags = {}
+if export_report:
+    selected = export_report['selected']
+    tags.update({'format': selected['format'], 'p50_ms': f"{selected['p50_ms']:.1f}",
+                 'mAP50-95': f"{selected['mAP50-95']:.4f}"})
+    print(f"[INFO] 배포 모델: {selected['format']} (p50 {selected['p50_ms']:.1f}ms, mAP50-95 {selected['mAP50-95']:.4f})")
+if eval_report:
+    tags['eval_mAP50'] = f"{eval_report['summary']['mAP50']:.4f}"
+
 # 모델 등록
 model = ml_client.models.create_or_update(
     Model(
-        path="outputs/model",  # 모델 파일 경로
+        path=model_path,  # 모델 파일 경로
         name="greenhat-ai-model",
-        version="1"
+        version="1",
+        tags=tags
     )
 )
 
@@ -19,7 +54,18 @@ deployment = ManagedOnlineDeployment(
     name="blue",
     endpoint_name=endpoint_name,
     model=model.id,
+    environment="azureml:greenhat-ml-pipeline-env@latest",
+    code_configuration=CodeConfiguration(code=".", scoring_script="score.py"),
+    # score.py 마이크로 배칭 설정 (Standard_DS3_v2: 4 vCPU)
+    environment_variables={
+        "SCORE_MAX_BATCH_SIZE": "8",
+        "SCORE_MAX_WAIT_MS": "10",
+        "SCORE_NUM_THREADS": "4",
+        "SCORE_CACHE_SIZE": "2048",
+        "SCORE_CACHE_TTL_S": "300",
+        "SCORE_TILE_SIZE": "0",  # 고해상도 현장 사진이면 640 등으로 설정 (타일 추론)
+    },
     instance_type="Standard_DS3_v2",
     instance_count=1
 )
-ml_client.online_deployments.begin_create_or_update(deployment)
\ No newline at end of file
+ml_client.online_deployments.begin_create_or_update(deployment)
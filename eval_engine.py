@@ -0,0 +1,597 @@
+import hashlib
+import io
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)  # mAP50-95
+RECALL_POINTS = np.linspace(0.0, 1.0, 101)  # COCO 101점 보간
+# COCO 기준 객체 크기 구간 (원본 픽셀 면적)
+SIZE_RANGES = {'small': (0, 32 ** 2), 'medium': (32 ** 2, 96 ** 2), 'large': (96 ** 2, float('inf'))}
+CACHE_MIN_CONF = 0.001  # 캐시에 저장하는 NMS 전 후보의 최소 신뢰도 (YOLO val 기본값과 동일)
+MAX_DET = 300
+MAX_NMS = 30000
+MAX_WH = 7680  # 클래스별 NMS를 위한 좌표 오프셋
+SWEEP_CONF = [0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.5, 0.6, 0.7]
+SWEEP_IOU = [0.3, 0.4, 0.45, 0.5, 0.6, 0.7]
+# 체크포인트 동시 평가 시 모델당 메모리 추정 (파일 크기 배수 + 입력 배치 배수)
+MODEL_MEMORY_FACTOR = 4
+ACTIVATION_MEMORY_FACTOR = 8
+MEMORY_BUDGET_RATIO = 0.5  # 디코딩 캐시를 만든 뒤 남은 메모리 중 사용할 비율
+
+class FolderSamples:
+    """images/, labels/ 폴더를 PackedDataset과 같은 인터페이스로 제공"""
+
+    def __init__(self, data_folder):
+        self.images_dir = os.path.join(data_folder, 'images')
+        self.labels_dir = os.path.join(data_folder, 'labels')
+        self.names = sorted(f for f in os.listdir(self.images_dir) if f.lower().endswith(IMAGE_EXTS))
+
+    def __len__(self):
+        return len(self.names)
+
+    def load_image(self, name):
+        import cv2
+        return cv2.imread(os.path.join(self.images_dir, name), cv2.IMREAD_COLOR)
+
+    def image_bytes(self, name):
+        with open(os.path.join(self.images_dir, name), 'rb') as f:
+            return f.read()
+
+    def labels(self, name):
+        label_path = os.path.join(self.labels_dir, os.path.splitext(name)[0] + '.txt')
+        if not os.path.exists(label_path):
+            return np.empty((0, 5), dtype=np.float32)
+        with open(label_path, 'rb') as f:
+            data = f.read()
+        if not data.strip():
+            return np.empty((0, 5), dtype=np.float32)
+        return np.loadtxt(io.BytesIO(data), ndmin=2, dtype=np.float32)[:, :5]
+
+def iter_batches(samples, names, batch_size=16, num_workers=8, prefetch=2, load=None):
+    """스레드 풀로 다음 배치들을 미리 디코딩하면서 [(이름, 이미지, 라벨), ...] 배치를 반환"""
+    def _load(name):
+        return name, (load or samples.load_image)(name), samples.labels(name)
+
+    starts = iter(range(0, len(names), batch_size))
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+        pending = deque()
+
+        def _submit():
+            start = next(starts, None)
+            if start is not None:
+                pending.append([pool.submit(_load, name) for name in names[start:start + batch_size]])
+
+        for _ in range(max(1, prefetch)):
+            _submit()
+        while pending:
+            futures = pending.popleft()
+            _submit()
+            yield [f.result() for f in futures]
+
+def yolo_to_xyxy(labels, width, height):
+    """정규화 YOLO 라벨 [N, 5]를 (클래스 [N], 픽셀 xyxy [N, 4])로 변환"""
+    xc, yc = labels[:, 1] * width, labels[:, 2] * height
+    w, h = labels[:, 3] * width, labels[:, 4] * height
+    boxes = np.stack([xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2], axis=1)
+    return labels[:, 0].astype(np.int64), boxes
+
+def box_iou(a, b):
+    """xyxy 박스 a [N, 4], b [M, 4]의 IoU 행렬 [N, M]"""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+def match_predictions(pred_cls, gt_cls, iou, iou_thresholds=IOU_THRESHOLDS):
+    """IoU 임계값별로 예측이 정답과 매칭됐는지 [P, T] bool 행렬 반환 (정답 하나당 예측 하나)"""
+    correct = np.zeros((len(pred_cls), len(iou_thresholds)), dtype=bool)
+    if len(pred_cls) == 0 or len(gt_cls) == 0:
+        return correct
+    iou = iou * (gt_cls[:, None] == pred_cls[None, :])  # [G, P], 다른 클래스는 0
+    for t, threshold in enumerate(iou_thresholds):
+        matches = np.argwhere(iou >= threshold)
+        if len(matches) == 0:
+            continue
+        # IoU 큰 순서로 정렬 후 예측/정답 각각 한 번만 사용
+        matches = matches[iou[matches[:, 0], matches[:, 1]].argsort()[::-1]]
+        matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+        matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+        correct[matches[:, 1], t] = True
+    return correct
+
+def average_precision(tp, conf, n_gt):
+    """신뢰도 순으로 누적한 precision/recall 곡선에서 IoU 임계값별 AP [T]와 (P, R) 계산
+
+    (P, R)은 IoU 0.5 기준 F1이 최대인 신뢰도 지점의 값 (ultralytics와 같은 기준, 단 클래스별로 선택).
+    """
+    n_thr = tp.shape[1]
+    if n_gt == 0 or len(tp) == 0:
+        return np.zeros(n_thr), 0.0, 0.0
+    order = np.argsort(-conf, kind='stable')
+    tpc = np.cumsum(tp[order], axis=0)
+    fpc = np.cumsum(~tp[order], axis=0)
+    recall = tpc / n_gt
+    precision = tpc / (tpc + fpc)
+    # precision envelope (오른쪽에서 누적 최대) 후 101개 recall 지점에서 샘플링
+    envelope = np.flip(np.maximum.accumulate(np.flip(precision, axis=0), axis=0), axis=0)
+    ap = np.zeros(n_thr)
+    for t in range(n_thr):
+        idx = np.searchsorted(recall[:, t], RECALL_POINTS, side='left')
+        valid = idx < len(recall)
+        ap[t] = np.where(valid, envelope[np.minimum(idx, len(recall) - 1), t], 0.0).mean()
+    # 같은 신뢰도의 예측은 한꺼번에 포함되므로 각 신뢰도 값의 마지막 지점에서만 F1 비교
+    ends = np.append(np.diff(conf[order]) != 0, True)
+    p50, r50 = precision[ends, 0], recall[ends, 0]
+    f1 = 2 * p50 * r50 / np.maximum(p50 + r50, 1e-16)
+    best = int(f1.argmax())
+    return ap, float(p50[best]), float(r50[best])
+
+def summarize(records, class_names):
+    """이미지별 매칭 결과를 모아 전체/클래스별 지표 계산"""
+    tp = np.concatenate([r['tp'] for r in records]) if records else np.zeros((0, len(IOU_THRESHOLDS)), bool)
+    conf = np.concatenate([r['conf'] for r in records]) if records else np.zeros(0)
+    pred_cls = np.concatenate([r['pred_cls'] for r in records]) if records else np.zeros(0, np.int64)
+    gt_cls = np.concatenate([r['gt_cls'] for r in records]) if records else np.zeros(0, np.int64)
+
+    per_class = []
+    for c in np.unique(np.concatenate([gt_cls, pred_cls])).tolist():
+        mask = pred_cls == c
+        n_gt = int((gt_cls == c).sum())
+        ap, p, r = average_precision(tp[mask], conf[mask], n_gt)
+        per_class.append({
+            'class_id': int(c),
+            'class_name': class_names.get(int(c), str(c)) if isinstance(class_names, dict) else str(c),
+            'instances': n_gt,
+            'predictions': int(mask.sum()),
+            'precision': p,
+            'recall': r,
+            'f1_score': 2 * p * r / (p + r) if p + r > 0 else 0.0,
+            'mAP50': float(ap[0]),
+            'mAP50-95': float(ap.mean()),
+        })
+
+    # 전체 지표는 정답이 있는 클래스들의 평균 (YOLO val과 같은 방식)
+    scored = [m for m in per_class if m['instances'] > 0]
+    mean = lambda key: float(np.mean([m[key] for m in scored])) if scored else 0.0
+    overall = {key: mean(key) for key in ('precision', 'recall', 'mAP50', 'mAP50-95')}
+    p, r = overall['precision'], overall['recall']
+    overall['f1_score'] = 2 * p * r / (p + r) if p + r > 0 else 0.0
+    overall['instances'] = int(len(gt_cls))
+    return overall, per_class
+
+def _size_mask(boxes, size_range):
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return (area >= size_range[0]) & (area < size_range[1])
+
+def evaluate_detections(pred, gt_cls, gt_boxes):
+    """이미지 하나의 예측(cls, conf, xyxy)과 정답을 매칭해서 전체/크기 구간별 기록 반환"""
+    pred_cls, pred_conf, pred_boxes = pred
+    iou = box_iou(gt_boxes, pred_boxes)
+    records = {'all': {
+        'tp': match_predictions(pred_cls, gt_cls, iou),
+        'conf': pred_conf, 'pred_cls': pred_cls, 'gt_cls': gt_cls,
+    }}
+    for size, size_range in SIZE_RANGES.items():
+        gm, pm = _size_mask(gt_boxes, size_range), _size_mask(pred_boxes, size_range)
+        records[size] = {
+            'tp': match_predictions(pred_cls[pm], gt_cls[gm], iou[np.ix_(gm, pm)]),
+            'conf': pred_conf[pm], 'pred_cls': pred_cls[pm], 'gt_cls': gt_cls[gm],
+        }
+    return records
+
+def _result_arrays(result):
+    boxes = result.boxes
+    return (boxes.cls.cpu().numpy().astype(np.int64),
+            boxes.conf.cpu().numpy().astype(np.float64),
+            boxes.xyxy.cpu().numpy().astype(np.float64))
+
+def evaluate_native(model, samples, conf_threshold=0.25, iou_threshold=0.45, imgsz=640,
+                    batch_size=16, num_workers=8, prefetch=2, device=None):
+    """디코딩 스레드 풀 + 배치 추론으로 테스트셋을 평가하고 전체/클래스별/크기별 지표 반환"""
+    class_names = getattr(model, 'names', {}) or {}
+    records = {'all': []}
+    records.update({size: [] for size in SIZE_RANGES})
+    n_images = 0
+    infer_time = 0.0
+    start = time.perf_counter()
+    for batch in iter_batches(samples, samples.names, batch_size, num_workers, prefetch):
+        batch = [item for item in batch if item[1] is not None]
+        if not batch:
+            continue
+        t0 = time.perf_counter()
+        results = model.predict([im for _, im, _ in batch], conf=conf_threshold, iou=iou_threshold,
+                                imgsz=imgsz, device=device, verbose=False)
+        infer_time += time.perf_counter() - t0
+        for (name, im, labels), result in zip(batch, results):
+            h, w = im.shape[:2]
+            gt_cls, gt_boxes = yolo_to_xyxy(labels, w, h)
+            for key, record in evaluate_detections(_result_arrays(result), gt_cls, gt_boxes).items():
+                records[key].append(record)
+        n_images += len(batch)
+    elapsed = time.perf_counter() - start
+
+    overall, per_class = summarize(records['all'], class_names)
+    per_size = {size: summarize(records[size], class_names)[0] for size in SIZE_RANGES}
+    print(f"[INFO] 평가 이미지 {n_images}개 ({elapsed:.2f}s, {n_images / max(elapsed, 1e-9):.1f} img/s, "
+          f"추론 {infer_time:.2f}s)")
+    return {
+        **overall,
+        'per_class': per_class,
+        'per_size': per_size,
+        'num_images': n_images,
+        'images_per_sec': n_images / elapsed if elapsed > 0 else 0.0,
+    }
+
+def file_sha1(path, chunk_size=8 * 1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def nms(boxes, scores, classes, iou_threshold, max_det=MAX_DET):
+    """클래스별 greedy NMS (NumPy), 남은 인덱스를 신뢰도 내림차순으로 반환"""
+    order = np.argsort(-scores, kind='stable')[:MAX_NMS]
+    # 클래스마다 좌표를 멀리 떨어뜨려서 한 번의 NMS로 클래스별 NMS 수행
+    shifted = boxes + (classes * MAX_WH)[:, None]
+    keep = []
+    while order.size and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        iou = box_iou(shifted[i:i + 1], shifted[order[1:]])[0]
+        order = order[1:][iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+def postprocess_raw(raw, conf_threshold, iou_threshold):
+    """캐시된 후보 [K, 6] (x1, y1, x2, y2, conf, cls)에 신뢰도 필터 + NMS 적용 후 (cls, conf, xyxy) 반환"""
+    raw = raw[raw[:, 4] >= conf_threshold]
+    keep = nms(raw[:, :4], raw[:, 4], raw[:, 5], iou_threshold)
+    raw = raw[keep]
+    return raw[:, 5].astype(np.int64), raw[:, 4].astype(np.float64), raw[:, :4].astype(np.float64)
+
+def preprocess_image(im, imgsz=640):
+    """BGR 이미지를 letterbox 후 RGB CHW uint8 배열과 (배율, 패딩, 원본 크기) 메타로 변환"""
+    from letterbox_cache import letterbox
+    out, ratio, pad = letterbox(im, imgsz)
+    return np.ascontiguousarray(out[..., ::-1].transpose(2, 0, 1)), (ratio, pad, im.shape[:2])
+
+def default_device():
+    """CUDA를 쓸 수 있으면 'cuda', 아니면 'cpu'"""
+    try:
+        import torch
+        return 'cuda' if torch.cuda.is_available() else 'cpu'
+    except ImportError:
+        return 'cpu'
+
+def to_device(model, device=None):
+    """YOLO 모델 가중치를 device로 옮기고 모델 반환 (forward_raw는 가중치가 있는 device에서 추론)"""
+    if device:
+        model.model.to(device)
+    return model
+
+def forward_raw(model, x, metas, min_conf=CACHE_MIN_CONF):
+    """전처리된 배치 [B, 3, H, W] uint8로 모델 forward만 수행해서 이미지별 NMS 전 후보 [K, 6] (원본 픽셀 좌표) 반환"""
+    import torch
+
+    net = model.model
+    device = next(net.parameters()).device
+    x = torch.from_numpy(np.ascontiguousarray(x)).to(device).float() / 255.0
+    net.eval()
+    with torch.no_grad():
+        y = net(x)
+    return decode_raw((y[0] if isinstance(y, (list, tuple)) else y).float().cpu().numpy(), metas, min_conf)
+
+def decode_raw(y, metas, min_conf=CACHE_MIN_CONF):
+    """모델 출력 배열 (torch/ONNX 공통)을 이미지별 NMS 전 후보 [K, 6] (원본 픽셀 좌표)로 변환"""
+    outputs = []
+    for pred, ((rx, ry), (pad_x, pad_y), (h, w)) in zip(y, metas):
+        if pred.shape[-1] == 6:
+            # end-to-end(NMS 없는) 헤드: [max_det, 6] xyxy, conf, cls
+            xyxy, conf, cls = pred[:, :4], pred[:, 4], pred[:, 5]
+        else:
+            # 일반 헤드: [4 + nc, N] xywh + 클래스 점수
+            pred = pred.T
+            scores = pred[:, 4:]
+            cls = scores.argmax(axis=1)
+            conf = scores[np.arange(len(scores)), cls]
+            xc, yc, bw, bh = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+            xyxy = np.stack([xc - bw / 2, yc - bh / 2, xc + bw / 2, yc + bh / 2], axis=1)
+        mask = conf >= min_conf
+        xyxy, conf, cls = xyxy[mask], conf[mask], cls[mask]
+        # letterbox 좌표 -> 원본 좌표
+        xyxy = (xyxy - [pad_x, pad_y, pad_x, pad_y]) / [rx, ry, rx, ry]
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+        outputs.append(np.concatenate([xyxy, conf[:, None], cls[:, None]], axis=1).astype(np.float32))
+    return outputs
+
+class OnnxModel:
+    """forward_raw와 같은 방식으로 쓸 수 있는 onnxruntime 세션 래퍼 (클래스 이름은 ultralytics 메타데이터에서 읽음)"""
+
+    def __init__(self, path, names=None, num_threads=0):
+        import ast
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = names or (ast.literal_eval(metadata['names']) if 'names' in metadata else {})
+
+def onnx_forward_raw(model, x, metas, min_conf=CACHE_MIN_CONF):
+    """forward_raw와 같은 인터페이스의 onnxruntime 추론"""
+    y = model.session.run(None, {model.input_name: x.astype(np.float32) / 255.0})[0]
+    return decode_raw(y, metas, min_conf)
+
+def predict_raw(model, images, imgsz=640, min_conf=CACHE_MIN_CONF):
+    """letterbox + 모델 forward만 수행해서 이미지별 NMS 전 후보 [K, 6] (원본 픽셀 좌표) 반환"""
+    prepared = [preprocess_image(im, imgsz) for im in images]
+    return forward_raw(model, np.stack([x for x, _ in prepared]), [meta for _, meta in prepared], min_conf)
+
+class PredictionCache:
+    """(모델 해시, imgsz, 이미지 해시) 기준 NMS 전 예측 캐시 (이미지당 작은 .npz 하나)"""
+
+    def __init__(self, cache_dir, model_hash, imgsz):
+        self.root = os.path.join(cache_dir, 'predictions', f"{model_hash[:16]}-{imgsz}")
+        os.makedirs(self.root, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, image_hash):
+        return os.path.join(self.root, image_hash[:2], f"{image_hash}.npz")
+
+    def get(self, image_hash):
+        path = self._path(image_hash)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        with np.load(path) as data:
+            return data['pred'], tuple(data['shape'].tolist())
+
+    def put(self, image_hash, pred, shape):
+        path = self._path(image_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, pred=pred.astype(np.float32), shape=np.array(shape))
+        os.replace(tmp_path, path)
+
+def collect_predictions(model, model_path, samples, cache_dir, imgsz=640, batch_size=16, num_workers=8, prefetch=2):
+    """테스트셋 전체의 (NMS 전 후보, 정답 클래스, 정답 박스)를 캐시를 활용해서 수집"""
+    import cv2
+
+    cache = PredictionCache(cache_dir, file_sha1(model_path), imgsz)
+    items = []
+    start = time.perf_counter()
+    for batch in iter_batches(samples, samples.names, batch_size, num_workers, prefetch,
+                              load=lambda name: bytes(samples.image_bytes(name))):
+        misses = []
+        for name, data, labels in batch:
+            image_hash = hashlib.sha1(data).hexdigest()
+            cached = cache.get(image_hash)
+            items.append([name, cached[0] if cached else None, cached[1] if cached else None, labels])
+            if cached is None:
+                misses.append((len(items) - 1, image_hash, data))
+
+        # 캐시에 없는 이미지만 디코딩 + 배치 추론
+        decoded = [(i, h, cv2.imdecode(np.frombuffer(d, dtype=np.uint8), cv2.IMREAD_COLOR)) for i, h, d in misses]
+        decoded = [(i, h, im) for i, h, im in decoded if im is not None]
+        if decoded:
+            for (i, image_hash, im), pred in zip(decoded, predict_raw(model, [im for _, _, im in decoded], imgsz)):
+                cache.put(image_hash, pred, im.shape[:2])
+                items[i][1], items[i][2] = pred, im.shape[:2]
+    elapsed = time.perf_counter() - start
+    print(f"[INFO] 예측 캐시: 적중 {cache.hits}개, 추론 {cache.misses}개 ({elapsed:.2f}s)")
+
+    records = []
+    for name, pred, shape, labels in items:
+        if pred is None:
+            print(f"[경고] 이미지 디코딩 실패: {name}")
+            continue
+        gt_cls, gt_boxes = yolo_to_xyxy(labels, shape[1], shape[0])
+        records.append((pred.astype(np.float32), gt_cls, gt_boxes))
+    return records
+
+def metrics_from_predictions(records, conf_threshold, iou_threshold, class_names):
+    """캐시된 예측으로 임의의 conf/IoU 임계값에서 evaluate_native와 같은 형식의 지표 계산"""
+    per_image = [evaluate_detections(postprocess_raw(pred, conf_threshold, iou_threshold), gt_cls, gt_boxes)
+                 for pred, gt_cls, gt_boxes in records]
+    overall, per_class = summarize([r['all'] for r in per_image], class_names)
+    per_size = {size: summarize([r[size] for r in per_image], class_names)[0] for size in SIZE_RANGES}
+    return {**overall, 'per_class': per_class, 'per_size': per_size, 'num_images': len(records)}
+
+def sweep_thresholds(records, class_names, conf_values=SWEEP_CONF, iou_values=SWEEP_IOU):
+    """conf x IoU 격자의 지표를 계산하고 (격자 결과, F1 최고 지점) 반환"""
+    grid = []
+    start = time.perf_counter()
+    for iou_threshold in iou_values:
+        # 높은 conf의 NMS 결과는 낮은 conf NMS 결과를 conf로 거른 것과 같으므로 IoU마다 NMS는 한 번만 수행
+        kept = []
+        for pred, gt_cls, gt_boxes in records:
+            pred = pred[pred[:, 4] >= min(conf_values)]
+            kept.append((pred[nms(pred[:, :4], pred[:, 4], pred[:, 5], iou_threshold)], gt_cls, gt_boxes))
+        for conf_threshold in conf_values:
+            per_image = []
+            for pred, gt_cls, gt_boxes in kept:
+                pred = pred[pred[:, 4] >= conf_threshold]
+                detections = (pred[:, 5].astype(np.int64), pred[:, 4].astype(np.float64), pred[:, :4].astype(np.float64))
+                per_image.append(evaluate_detections(detections, gt_cls, gt_boxes)['all'])
+            overall, _ = summarize(per_image, class_names)
+            grid.append({'conf_threshold': conf_threshold, 'iou_threshold': iou_threshold, **overall})
+    best = max(grid, key=lambda m: (m['f1_score'], m['mAP50'])) if grid else None
+    print(f"[INFO] 임계값 스윕 {len(grid)}개 조합 ({time.perf_counter() - start:.2f}s)")
+    if best:
+        print(f"[INFO] 최고 F1 지점: conf={best['conf_threshold']}, iou={best['iou_threshold']}, "
+              f"F1={best['f1_score']:.4f}, P={best['precision']:.4f}, R={best['recall']:.4f}, mAP50={best['mAP50']:.4f}")
+    return grid, best
+
+def save_sweep(grid, best, output_dir):
+    path = os.path.join(output_dir, 'threshold_sweep.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'best_f1': best, 'grid': grid}, f, indent=2, ensure_ascii=False)
+    return path
+
+class DecodedImageCache:
+    """테스트셋을 한 번만 디코딩 + letterbox해서 메모리에 보관 (여러 체크포인트가 공유)
+
+    메모리가 부족하면 미리 디코딩하지 않고 batches() 호출마다 스트리밍으로 디코딩
+    """
+
+    def __init__(self, samples, imgsz=640, num_workers=8, prefetch=2):
+        self.imgsz = imgsz
+        self.samples, self.num_workers, self.prefetch = samples, num_workers, prefetch
+        self.names, self.metas, self.gt = [], [], []
+        start = time.perf_counter()
+        n = len(samples.names)
+        need = n * 3 * imgsz * imgsz
+        available = _available_memory()
+        self.streaming = available is not None and need > available * MEMORY_BUDGET_RATIO
+        if self.streaming:
+            self.images = None
+            print(f"[경고] 디코딩 캐시 {need / 1e6:.0f}MB가 남은 메모리 {available / 1e6:.0f}MB의 "
+                  f"{MEMORY_BUDGET_RATIO:.0%}를 넘어서 체크포인트마다 스트리밍 디코딩합니다.")
+            return
+        # letterbox 결과는 항상 imgsz x imgsz 이므로 연속 배열 하나에 저장
+        self.images = np.empty((n, 3, imgsz, imgsz), dtype=np.uint8)
+        for names, x, metas, gt in self._decode(64):
+            self.images[len(self.names):len(self.names) + len(names)] = x
+            self.names += names
+            self.metas += metas
+            self.gt += gt
+        self.images = self.images[:len(self.names)]
+        print(f"[INFO] 디코딩 캐시: 이미지 {len(self.names)}개, {self.images.nbytes / 1e6:.1f}MB "
+              f"({time.perf_counter() - start:.2f}s)")
+
+    def _decode(self, batch_size):
+        """(이름 목록, [B, 3, imgsz, imgsz] uint8, 메타 목록, 정답 목록) 배치를 디코딩 순서대로 생성"""
+        samples, imgsz = self.samples, self.imgsz
+        decode = lambda name: (lambda im: None if im is None else preprocess_image(im, imgsz))(samples.load_image(name))
+        for batch in iter_batches(samples, samples.names, batch_size, self.num_workers, self.prefetch, load=decode):
+            names, xs, metas, gt = [], [], [], []
+            for name, prepared, labels in batch:
+                if prepared is None:
+                    print(f"[경고] 이미지 디코딩 실패: {name}")
+                    continue
+                x, meta = prepared
+                h, w = meta[2]
+                names.append(name)
+                xs.append(x)
+                metas.append(meta)
+                gt.append(yolo_to_xyxy(labels, w, h))
+            if names:
+                yield names, np.stack(xs), metas, gt
+
+    def __len__(self):
+        return len(self.samples.names) if self.streaming else len(self.names)
+
+    def batches(self, batch_size):
+        if self.streaming:
+            for _, x, metas, gt in self._decode(batch_size):
+                yield x, metas, gt
+            return
+        for start in range(0, len(self.names), batch_size):
+            end = start + batch_size
+            yield self.images[start:end], self.metas[start:end], self.gt[start:end]
+
+def _available_memory():
+    """/proc/meminfo의 MemAvailable (바이트), 알 수 없으면 None"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def auto_concurrency(model_paths, imgsz=640, batch_size=16, max_concurrent=None):
+    """모델 크기 + 배치 활성화 메모리 추정치로 남은 메모리 안에서 동시에 평가할 모델 수 결정"""
+    if max_concurrent:
+        return max(1, min(max_concurrent, len(model_paths)))
+    available = _available_memory()
+    if not available or not model_paths:
+        return 1
+    # 가중치(fp32 사본 + 로드 시 중간 사본)와 배치 입력/특징맵 대략치
+    per_model = max(os.path.getsize(p) for p in model_paths) * MODEL_MEMORY_FACTOR \
+        + batch_size * 3 * imgsz * imgsz * 4 * ACTIVATION_MEMORY_FACTOR
+    budget = available * MEMORY_BUDGET_RATIO
+    return max(1, min(len(model_paths), os.cpu_count() or 1, int(budget // per_model)))
+
+def score_checkpoint(model, cache, conf_threshold=0.25, iou_threshold=0.45, batch_size=16, forward=forward_raw):
+    """디코딩 캐시로 체크포인트 하나를 평가해서 evaluate_native와 같은 형식의 지표 반환 (forward로 ONNX 등 교체 가능)"""
+    class_names = getattr(model, 'names', {}) or {}
+    records = {'all': []}
+    records.update({size: [] for size in SIZE_RANGES})
+    n_images = 0
+    start = time.perf_counter()
+    for x, metas, gt in cache.batches(batch_size):
+        n_images += len(x)
+        for raw, (gt_cls, gt_boxes) in zip(forward(model, x, metas, conf_threshold), gt):
+            for key, record in evaluate_detections(postprocess_raw(raw, conf_threshold, iou_threshold),
+                                                   gt_cls, gt_boxes).items():
+                records[key].append(record)
+    elapsed = time.perf_counter() - start
+    overall, per_class = summarize(records['all'], class_names)
+    per_size = {size: summarize(records[size], class_names)[0] for size in SIZE_RANGES}
+    return {
+        **overall,
+        'per_class': per_class,
+        'per_size': per_size,
+        'num_images': n_images,
+        'images_per_sec': n_images / elapsed if elapsed > 0 else 0.0,
+    }
+
+def compare_checkpoints(model_paths, load_model, samples, conf_threshold=0.25, iou_threshold=0.45, imgsz=640,
+                        batch_size=16, num_workers=8, max_concurrent=None, rank_by='mAP50-95'):
+    """여러 체크포인트를 공유 디코딩 캐시로 동시에 평가하고 rank_by 기준 내림차순 결과 목록 반환"""
+    # 같은 내용의 체크포인트(weights/best.pt 와 final/best.pt 등)는 한 번만 평가
+    unique = {}
+    for path in model_paths:
+        unique.setdefault(file_sha1(path), path)
+    paths = list(unique.values())
+    if len(paths) < len(model_paths):
+        print(f"[INFO] 중복 체크포인트 {len(model_paths) - len(paths)}개 제외")
+
+    cache = DecodedImageCache(samples, imgsz, num_workers)
+    concurrency = auto_concurrency(paths, imgsz, batch_size, max_concurrent)
+    print(f"[INFO] 체크포인트 {len(paths)}개 평가 (동시 {concurrency}개)")
+
+    def _score(path):
+        return {'path': path, **score_checkpoint(load_model(path), cache, conf_threshold, iou_threshold, batch_size)}
+
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(_score, path): path for path in paths}
+        for future in futures:
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[ERROR] 체크포인트 평가 실패: {path}, 에러: {e}")
+                continue
+            print(f"[INFO] {path}: mAP50 {result['mAP50']:.4f}, mAP50-95 {result['mAP50-95']:.4f}, "
+                  f"F1 {result['f1_score']:.4f} ({result['images_per_sec']:.1f} img/s)")
+            results.append(result)
+
+    results.sort(key=lambda r: (r[rank_by], r['mAP50'], r['f1_score']), reverse=True)
+    for rank, result in enumerate(results, 1):
+        result['rank'] = rank
+    return results
+
+def format_comparison_table(results):
+    """순위표 텍스트 (rank, checkpoint, P, R, F1, mAP50, mAP50-95)"""
+    header = f"{'rank':>4}  {'checkpoint':<40} {'P':>7} {'R':>7} {'F1':>7} {'mAP50':>7} {'mAP50-95':>9}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        name = r['path'] if len(r['path']) <= 40 else '...' + r['path'][-37:]
+        lines.append(f"{r['rank']:>4}  {name:<40} {r['precision']:>7.4f} {r['recall']:>7.4f} {r['f1_score']:>7.4f} "
+                     f"{r['mAP50']:>7.4f} {r['mAP50-95']:>9.4f}")
+    return "\n".join(lines)
@@ -5,11 +5,22 @@ import numpy as np
 from pathlib import Path
 from datetime import datetime
 import mlflow
+from metrics_logger import AsyncMetricsLogger
+from profiler import PROFILE_NAME, Profiler
+from step_cache import default_cache_dir
 import os
 import json
+import re
 from ultralytics import YOLO
 import shutil
 import glob
+from pack_dataset import PackedDataset, packed_validator
+from eval_engine import (FolderSamples, evaluate_native, collect_predictions, metrics_from_predictions,
+                         sweep_thresholds, save_sweep, SWEEP_CONF, SWEEP_IOU, compare_checkpoints,
+                         format_comparison_table, default_device, to_device)
+from tiling import evaluate_tiled, TILE_SIZE, TILE_OVERLAP, TILE_MERGE_MODES
+from latency_bench import (benchmark_latency, log_latency_benchmark, BENCH_BATCH_SIZES, BENCH_THREADS,
+                           BENCH_WARMUP, BENCH_ITERATIONS, LATENCY_BENCHMARK_NOTE)
 
 # Azure ML Run context
 try:
@@ -20,15 +31,14 @@ except:
     azure_run = None
     IS_AZURE_RUN = False
 
+# param/metric은 백그라운드 스레드에서 묶어서 전송 (MLflow + Azure run)
+metrics_logger = AsyncMetricsLogger(azure_run if IS_AZURE_RUN else None)
+
 def log_metric(key, value):
-    mlflow.log_metric(key, value)
-    if IS_AZURE_RUN:
-        azure_run.log(key, value)
+    metrics_logger.log_metric(key, value)
 
 def log_param(key, value):
-    mlflow.log_param(key, value)
-    if IS_AZURE_RUN:
-        azure_run.log(key, value)
+    metrics_logger.log_param(key, value)
 
 def parse_args():
     parser = argparse.ArgumentParser(description="YOLO 모델 단일 평가")
@@ -42,12 +52,51 @@ def parse_args():
                        help="신뢰도 임계값")
     parser.add_argument("--iou-threshold", type=float, default=0.45,
                        help="IoU 임계값")
+    parser.add_argument("--packed-dir", type=str, default=None,
+                       help="pack_dataset.py로 만든 패킹 테스트 데이터셋 폴더 (지정하면 --data-folder 대신 사용)")
+    # 평가 방식은 하나만 선택 (tiled/sweep/compare는 모두 자체 추론 경로를 사용)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--engine", type=str, default="ultralytics", choices=["ultralytics", "native"],
+                       help="ultralytics: model.val(), native: 배치 추론 + NumPy 지표 (클래스별/크기별 결과 포함)")
+    parser.add_argument("--imgsz", type=int, default=640, help="추론 이미지 크기 (native 엔진)")
+    parser.add_argument("--device", type=str, default=default_device(),
+                       help="추론 장치 (cuda, cuda:0, cpu 등, 기본: CUDA를 쓸 수 있으면 cuda)")
+    parser.add_argument("--batch-size", type=int, default=16, help="추론 배치 크기 (native 엔진)")
+    parser.add_argument("--num-workers", type=int, default=8, help="이미지 디코딩 스레드 수 (native 엔진)")
+    mode.add_argument("--sweep", action="store_true",
+                       help="NMS 전 예측을 캐시에 저장하고 conf/IoU 격자를 재추론 없이 평가 (F1 최고 지점 리포트)")
+    parser.add_argument("--sweep-conf", type=float, nargs='+', default=SWEEP_CONF, help="스윕할 신뢰도 임계값 목록")
+    parser.add_argument("--sweep-iou", type=float, nargs='+', default=SWEEP_IOU, help="스윕할 NMS IoU 임계값 목록")
+    parser.add_argument("--cache-dir", type=str,
+                       default=default_cache_dir(),
+                       help="예측 캐시 폴더 (모델 해시 + 이미지 해시 기준)")
+    mode.add_argument("--compare", action="store_true",
+                       help="--model-path 폴더의 모든 체크포인트(epoch*.pt, best.pt, last.pt)를 한 번에 평가하고 순위표 생성")
+    parser.add_argument("--max-concurrent", type=int, default=0,
+                       help="동시에 평가할 체크포인트 수 (0: 남은 메모리 기준 자동)")
+    parser.add_argument("--rank-by", type=str, default="mAP50-95", choices=["mAP50-95", "mAP50", "f1_score"],
+                       help="체크포인트 순위 기준 지표")
+    mode.add_argument("--tiled", action="store_true",
+                       help="고해상도 이미지를 겹치는 타일로 나눠 추론하고 전체 이미지 추론과 정확도/지연시간 비교")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE, help="타일 크기 (원본 픽셀)")
+    parser.add_argument("--tile-overlap", type=float, default=TILE_OVERLAP, help="타일 겹침 비율")
+    parser.add_argument("--tile-merge", type=str, default="nms", choices=TILE_MERGE_MODES,
+                       help="타일 간 중복 박스 병합 방식")
+    parser.add_argument("--benchmark", action="store_true",
+                       help="평가한 PyTorch 체크포인트의 CPU 지연시간/처리량 벤치마크를 함께 수행해서 리포트에 기록 "
+                            "(배포 모델 기준 결과는 export_model.py의 export_report.json)")
+    parser.add_argument("--bench-batch-sizes", type=int, nargs='+', default=BENCH_BATCH_SIZES)
+    parser.add_argument("--bench-threads", type=int, nargs='+', default=BENCH_THREADS)
+    parser.add_argument("--bench-warmup", type=int, default=BENCH_WARMUP)
+    parser.add_argument("--bench-iterations", type=int, default=BENCH_ITERATIONS)
+    parser.add_argument("--latency-budget-ms", type=float, default=None,
+                       help="프레임당 지연시간 예산 (batch 1 p95 기준 충족 여부를 리포트)")
     return parser.parse_args()
 
-def load_model(model_path):
+def load_model(model_path, device=None):
     """모델 로드 및 정보 반환"""
     try:
-        model = YOLO(model_path)
+        model = to_device(YOLO(model_path), device)
         model_info = {
             'path': model_path,
             'name': Path(model_path).stem,
@@ -59,7 +108,53 @@ def load_model(model_path):
         print(f"[ERROR] 모델 로드 실패: {model_path}, 에러: {e}")
         return None
 
-def evaluate_model(model_info, data_yaml_path, conf_threshold=0.25, iou_threshold=0.45):
+def find_checkpoints(model_path):
+    """폴더 안의 모든 .pt 체크포인트를 에포크 순서로 반환 (epoch 번호 없는 best/last 등은 뒤에)"""
+    if not os.path.isdir(model_path):
+        return [model_path]
+    pt_files = glob.glob(os.path.join(model_path, '**/*.pt'), recursive=True)
+
+    def _order(path):
+        match = re.search(r'epoch(\d+)', Path(path).stem)
+        return (0, int(match.group(1)), path) if match else (1, 0, path)
+
+    return sorted(pt_files, key=_order)
+
+def evaluate_checkpoints(checkpoints, samples, output_dir, conf_threshold=0.25, iou_threshold=0.45, imgsz=640,
+                         batch_size=16, num_workers=8, max_concurrent=0, rank_by='mAP50-95', device=None):
+    """체크포인트 여러 개를 한 작업에서 평가하고 순위표를 저장, 1위 결과를 반환"""
+    print(f"[INFO] 체크포인트 비교 평가: {len(checkpoints)}개")
+
+    try:
+        results = compare_checkpoints(checkpoints, lambda path: to_device(YOLO(path), device), samples, conf_threshold, iou_threshold, imgsz,
+                                      batch_size, num_workers, max_concurrent or None, rank_by)
+    except Exception as e:
+        print(f"[ERROR] 체크포인트 비교 평가 실패, 에러: {e}")
+        return None
+    if not results:
+        return None
+
+    table = format_comparison_table(results)
+    print(table)
+    comparison = [{key: value for key, value in r.items() if key not in ('per_class', 'per_size')} for r in results]
+    with open(os.path.join(output_dir, 'checkpoint_comparison.json'), 'w', encoding='utf-8') as f:
+        json.dump({'rank_by': rank_by, 'conf_threshold': conf_threshold, 'iou_threshold': iou_threshold,
+                   'checkpoints': comparison}, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(output_dir, 'checkpoint_comparison.txt'), 'w', encoding='utf-8') as f:
+        f.write(table + "\n")
+
+    best = results[0]
+    return {
+        'model_name': Path(best['path']).stem,
+        'path': best['path'],
+        **{key: value for key, value in best.items() if key not in ('path', 'rank')},
+        'conf_threshold': conf_threshold,
+        'iou_threshold': iou_threshold,
+        'checkpoint_comparison': comparison,
+        'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S')
+    }
+
+def evaluate_model(model_info, data_yaml_path, conf_threshold=0.25, iou_threshold=0.45, validator=None, device=None):
     """모델 평가 수행"""
     if not model_info:
         return None
@@ -69,9 +164,11 @@ def evaluate_model(model_info, data_yaml_path, conf_threshold=0.25, iou_threshol
     try:
         # 모델 평가
         results = model_info['model'].val(
+            validator=validator,
             data=data_yaml_path,
             conf=conf_threshold,
             iou=iou_threshold,
+            device=device,
             verbose=True
         )
         
@@ -103,6 +200,116 @@ def evaluate_model(model_info, data_yaml_path, conf_threshold=0.25, iou_threshol
         print(f"[ERROR] 모델 평가 실패: {model_info['name']}, 에러: {e}")
         return None
 
+def evaluate_model_native(model_info, samples, conf_threshold=0.25, iou_threshold=0.45, imgsz=640,
+                          batch_size=16, num_workers=8, device=None):
+    """배치 평가 엔진으로 모델 평가 수행 (클래스별/크기별 결과 포함)"""
+    if not model_info:
+        return None
+
+    print(f"[INFO] 모델 평가 중 (native): {model_info['name']}")
+
+    try:
+        metrics = evaluate_native(model_info['model'], samples, conf_threshold, iou_threshold, imgsz,
+                                  batch_size, num_workers, device=device)
+    except Exception as e:
+        print(f"[ERROR] 모델 평가 실패: {model_info['name']}, 에러: {e}")
+        return None
+
+    evaluation_result = {
+        'model_name': model_info['name'],
+        **metrics,
+        'conf_threshold': conf_threshold,
+        'iou_threshold': iou_threshold,
+        'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S')
+    }
+
+    print(f"[INFO] 평가 완료: {model_info['name']}")
+    print(f"  - Precision: {evaluation_result['precision']:.4f}")
+    print(f"  - Recall: {evaluation_result['recall']:.4f}")
+    print(f"  - mAP50: {evaluation_result['mAP50']:.4f}")
+    print(f"  - mAP50-95: {evaluation_result['mAP50-95']:.4f}")
+    print(f"  - F1-Score: {evaluation_result['f1_score']:.4f}")
+    for m in evaluation_result['per_class']:
+        print(f"  - [{m['class_name']}] P: {m['precision']:.4f}, R: {m['recall']:.4f}, "
+              f"mAP50: {m['mAP50']:.4f}, mAP50-95: {m['mAP50-95']:.4f} ({m['instances']} instances)")
+
+    return evaluation_result
+
+def evaluate_model_tiled(model_info, samples, conf_threshold=0.25, iou_threshold=0.45, imgsz=640,
+                         tile_size=TILE_SIZE, overlap=TILE_OVERLAP, merge='nms', batch_size=4, num_workers=8):
+    """타일 추론으로 평가하고 전체 이미지 추론과의 비교 결과를 함께 반환"""
+    if not model_info:
+        return None
+
+    print(f"[INFO] 모델 평가 중 (tiled {tile_size}px, overlap {overlap}, {merge}): {model_info['name']}")
+
+    try:
+        comparison = evaluate_tiled(model_info['model'], samples, conf_threshold, iou_threshold, imgsz, tile_size,
+                                    overlap, merge, batch_size, num_workers)
+    except Exception as e:
+        print(f"[ERROR] 모델 평가 실패: {model_info['name']}, 에러: {e}")
+        return None
+
+    tiled = comparison['tiled']
+    evaluation_result = {
+        'model_name': model_info['name'],
+        **tiled,
+        'num_images': comparison['num_images'],
+        'conf_threshold': conf_threshold,
+        'iou_threshold': iou_threshold,
+        'tiling': {
+            'settings': comparison['settings'],
+            **{m: {**{key: value for key, value in comparison[m].items() if key not in ('per_class', 'per_size')},
+                   'small_mAP50': comparison[m]['per_size']['small']['mAP50']} for m in ('whole', 'tiled')},
+        },
+        'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S')
+    }
+
+    print(f"[INFO] 평가 완료: {model_info['name']}")
+    print(f"  - Precision: {evaluation_result['precision']:.4f}")
+    print(f"  - Recall: {evaluation_result['recall']:.4f}")
+    print(f"  - mAP50: {evaluation_result['mAP50']:.4f}")
+    print(f"  - mAP50-95: {evaluation_result['mAP50-95']:.4f}")
+    print(f"  - F1-Score: {evaluation_result['f1_score']:.4f}")
+
+    return evaluation_result
+
+def evaluate_model_sweep(model_info, samples, cache_dir, conf_threshold=0.25, iou_threshold=0.45, imgsz=640,
+                         batch_size=16, num_workers=8, sweep_conf=SWEEP_CONF, sweep_iou=SWEEP_IOU):
+    """한 번의 추론(또는 캐시)으로 지정 임계값 결과와 conf/IoU 스윕 결과를 함께 계산"""
+    if not model_info:
+        return None
+
+    print(f"[INFO] 모델 평가 중 (sweep): {model_info['name']}")
+
+    try:
+        records = collect_predictions(model_info['model'], model_info['path'], samples, cache_dir, imgsz,
+                                      batch_size, num_workers)
+        class_names = model_info['model'].names
+        metrics = metrics_from_predictions(records, conf_threshold, iou_threshold, class_names)
+        grid, best = sweep_thresholds(records, class_names, sweep_conf, sweep_iou)
+    except Exception as e:
+        print(f"[ERROR] 모델 평가 실패: {model_info['name']}, 에러: {e}")
+        return None
+
+    evaluation_result = {
+        'model_name': model_info['name'],
+        **metrics,
+        'conf_threshold': conf_threshold,
+        'iou_threshold': iou_threshold,
+        'threshold_sweep': {'best_f1': best, 'grid': grid},
+        'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S')
+    }
+
+    print(f"[INFO] 평가 완료: {model_info['name']} (conf={conf_threshold}, iou={iou_threshold})")
+    print(f"  - Precision: {evaluation_result['precision']:.4f}")
+    print(f"  - Recall: {evaluation_result['recall']:.4f}")
+    print(f"  - mAP50: {evaluation_result['mAP50']:.4f}")
+    print(f"  - mAP50-95: {evaluation_result['mAP50-95']:.4f}")
+    print(f"  - F1-Score: {evaluation_result['f1_score']:.4f}")
+
+    return evaluation_result
+
 def generate_evaluation_report(result, output_dir):
     """평가 리포트 생성"""
     if not result:
@@ -126,6 +333,20 @@ def generate_evaluation_report(result, output_dir):
             'iou_threshold': result['iou_threshold']
         }
     }
+    if 'per_class' in result:
+        report['per_class'] = result['per_class']
+        report['per_size'] = result['per_size']
+    if 'checkpoint_comparison' in result:
+        report['checkpoint_comparison'] = result['checkpoint_comparison']
+    if 'latency_benchmark' in result:
+        report['latency_benchmark'] = result['latency_benchmark']
+    else:
+        report['latency_benchmark_note'] = LATENCY_BENCHMARK_NOTE
+    if 'tiling' in result:
+        report['tiling'] = result['tiling']
+    if 'threshold_sweep' in result:
+        report['threshold_sweep'] = result['threshold_sweep']
+        save_sweep(result['threshold_sweep']['grid'], result['threshold_sweep']['best_f1'], output_dir)
     
     # JSON 파일로 저장
     report_path = os.path.join(output_dir, 'evaluation_report.json')
@@ -154,6 +375,62 @@ def generate_evaluation_report(result, output_dir):
         f.write(f"  mAP50: {result['mAP50']:.4f}\n")
         f.write(f"  mAP50-95: {result['mAP50-95']:.4f}\n")
         f.write(f"  F1-Score: {result['f1_score']:.4f}\n\n")
+
+        if 'per_class' in result:
+            f.write("클래스별 결과:\n")
+            f.write("-" * 40 + "\n")
+            for m in result['per_class']:
+                f.write(f"  {m['class_name']} ({m['instances']} instances): P {m['precision']:.4f}, "
+                        f"R {m['recall']:.4f}, F1 {m['f1_score']:.4f}, mAP50 {m['mAP50']:.4f}, "
+                        f"mAP50-95 {m['mAP50-95']:.4f}\n")
+            f.write("\n크기별 결과:\n")
+            f.write("-" * 40 + "\n")
+            for size, m in result['per_size'].items():
+                f.write(f"  {size} ({m['instances']} instances): mAP50 {m['mAP50']:.4f}, "
+                        f"mAP50-95 {m['mAP50-95']:.4f}\n")
+            f.write("\n")
+
+        if 'tiling' in result:
+            tiling = result['tiling']
+            settings = tiling['settings']
+            f.write(f"타일 추론 비교 (타일 {settings['tile_size']}px, 겹침 {settings['overlap']}, {settings['merge']}, "
+                    f"이미지당 타일 {settings['tiles_per_image']:.1f}개):\n")
+            f.write("-" * 40 + "\n")
+            for m in ('whole', 'tiled'):
+                r = tiling[m]
+                f.write(f"  {m}: mAP50 {r['mAP50']:.4f}, mAP50-95 {r['mAP50-95']:.4f}, "
+                        f"small mAP50 {r['small_mAP50']:.4f}, {r['ms_per_image']:.1f}ms/img\n")
+            f.write("\n")
+
+        if result.get('latency_benchmark', {}).get('results'):
+            bench = result['latency_benchmark']
+            f.write(f"CPU 지연시간 벤치마크 (warmup {bench['warmup']}, 반복 {bench['iterations']}):\n")
+            f.write("-" * 40 + "\n")
+            for r in bench['results']:
+                f.write(f"  batch {r['batch_size']}, threads {r['threads']}: p50 {r['p50_ms']:.1f}ms, "
+                        f"p95 {r['p95_ms']:.1f}ms, p99 {r['p99_ms']:.1f}ms, {r['images_per_sec']:.1f} img/s\n")
+            if 'meets_latency_budget' in bench:
+                f.write(f"  지연시간 예산 {bench['latency_budget_ms']}ms: "
+                        f"{'충족' if bench['meets_latency_budget'] else '초과'}\n")
+            f.write("\n")
+        elif 'latency_benchmark' not in result:
+            f.write(f"CPU 지연시간 벤치마크: {LATENCY_BENCHMARK_NOTE}\n\n")
+
+        if 'checkpoint_comparison' in result:
+            f.write("체크포인트 비교 (상위 10개, 전체 결과: checkpoint_comparison.txt):\n")
+            f.write("-" * 40 + "\n")
+            for m in result['checkpoint_comparison'][:10]:
+                f.write(f"  {m['rank']}. {m['path']}: mAP50 {m['mAP50']:.4f}, mAP50-95 {m['mAP50-95']:.4f}, "
+                        f"F1 {m['f1_score']:.4f}\n")
+            f.write("\n")
+
+        if result.get('threshold_sweep', {}).get('best_f1'):
+            best = result['threshold_sweep']['best_f1']
+            f.write("임계값 스윕 (F1 최고 지점):\n")
+            f.write("-" * 40 + "\n")
+            f.write(f"  conf {best['conf_threshold']}, iou {best['iou_threshold']}: P {best['precision']:.4f}, "
+                    f"R {best['recall']:.4f}, F1 {best['f1_score']:.4f}, mAP50 {best['mAP50']:.4f}\n")
+            f.write(f"  ({len(result['threshold_sweep']['grid'])}개 조합, 전체 결과: threshold_sweep.json)\n\n")
         
         # 성능 해석
         f.write("성능 해석:\n")
@@ -190,6 +467,86 @@ def generate_evaluation_report(result, output_dir):
     
     return report_path, txt_report_path
 
+def evaluate_single_model(args, data_yaml_path):
+    """--model-path의 모델 하나를 찾아서 선택한 엔진으로 평가"""
+    # 모델 로드
+    model_path = args.model_path
+    if os.path.isdir(model_path):
+        # 폴더에서 best.pt 파일 찾기
+        best_model_path = os.path.join(model_path, 'best.pt')
+        if not os.path.exists(best_model_path):
+            # final 폴더 안에서 찾기
+            best_model_path = os.path.join(model_path, 'final', 'best.pt')
+        if not os.path.exists(best_model_path):
+            # 폴더 내의 모든 .pt 파일 중 가장 최근 것 찾기
+            pt_files = glob.glob(os.path.join(model_path, '**/*.pt'), recursive=True)
+            if pt_files:
+                best_model_path = max(pt_files, key=os.path.getctime)
+            else:
+                print(f"[ERROR] 모델 파일을 찾을 수 없습니다: {model_path}")
+                return None
+        model_path = best_model_path
+    
+    # 가중치를 먼저 옮겨 두면 forward_raw 경로(tiled, sweep)도 같은 장치에서 추론
+    model_info = load_model(model_path, args.device)
+    if not model_info:
+        print("[ERROR] 모델을 로드할 수 없습니다.")
+        return None
+    
+    # 모델 평가
+    if args.tiled:
+        samples = PackedDataset(args.packed_dir) if args.packed_dir else FolderSamples(args.data_folder)
+        result = evaluate_model_tiled(
+            model_info,
+            samples,
+            args.conf_threshold,
+            args.iou_threshold,
+            imgsz=args.imgsz,
+            tile_size=args.tile_size,
+            overlap=args.tile_overlap,
+            merge=args.tile_merge,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers
+        )
+    elif args.sweep:
+        samples = PackedDataset(args.packed_dir) if args.packed_dir else FolderSamples(args.data_folder)
+        result = evaluate_model_sweep(
+            model_info,
+            samples,
+            args.cache_dir,
+            args.conf_threshold,
+            args.iou_threshold,
+            imgsz=args.imgsz,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+            sweep_conf=args.sweep_conf,
+            sweep_iou=args.sweep_iou
+        )
+    elif args.engine == 'native':
+        samples = PackedDataset(args.packed_dir) if args.packed_dir else FolderSamples(args.data_folder)
+        result = evaluate_model_native(
+            model_info,
+            samples,
+            args.conf_threshold,
+            args.iou_threshold,
+            imgsz=args.imgsz,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+            device=args.device
+        )
+    else:
+        result = evaluate_model(
+            model_info, 
+            data_yaml_path, 
+            args.conf_threshold, 
+            args.iou_threshold,
+            validator=packed_validator(args.packed_dir) if args.packed_dir else None,
+            device=args.device
+        )
+    if result:
+        result['path'] = model_path
+    return result
+
 def main():
     args = parse_args()
     
@@ -202,12 +559,13 @@ def main():
     
     # 출력 디렉토리 생성
     os.makedirs(args.output_dir, exist_ok=True)
+    profiler = Profiler('evaluate')
     
     # data.yaml 파일 경로 (임시 디렉토리에 생성)
     images_folder = os.path.join(args.data_folder, 'images')
     labels_folder = os.path.join(args.data_folder, 'labels')
     
-    if not os.path.exists(images_folder) or not os.path.exists(labels_folder):
+    if not args.packed_dir and (not os.path.exists(images_folder) or not os.path.exists(labels_folder)):
         print(f"[ERROR] images 또는 labels 폴더를 찾을 수 없습니다: {args.data_folder}")
         print(f"[INFO] images 폴더: {images_folder}")
         print(f"[INFO] labels 폴더: {labels_folder}")
@@ -218,10 +576,12 @@ def main():
     temp_dir = tempfile.mkdtemp()
     data_yaml_path = os.path.join(temp_dir, 'data.yaml')
     
-    data_yaml_content = f"""path: {args.data_folder}
-train: images
-val: images
-test: images
+    # 패킹 데이터셋이면 폴더 전체가 평가 대상 (이미지 목록은 인덱스에서 읽음)
+    dataset_path, split_path = (args.packed_dir, '.') if args.packed_dir else (args.data_folder, 'images')
+    data_yaml_content = f"""path: {dataset_path}
+train: {split_path}
+val: {split_path}
+test: {split_path}
 
 nc: 2
 names: ['helmet', 'no-helmet']
@@ -235,66 +595,107 @@ names: ['helmet', 'no-helmet']
     log_param("model_path", args.model_path)
     log_param("conf_threshold", args.conf_threshold)
     log_param("iou_threshold", args.iou_threshold)
+    log_param("device", args.device)
     
-    # 모델 로드
-    model_path = args.model_path
-    if os.path.isdir(model_path):
-        # 폴더에서 best.pt 파일 찾기
-        best_model_path = os.path.join(model_path, 'best.pt')
-        if not os.path.exists(best_model_path):
-            # final 폴더 안에서 찾기
-            best_model_path = os.path.join(model_path, 'final', 'best.pt')
-        if not os.path.exists(best_model_path):
-            # 폴더 내의 모든 .pt 파일 중 가장 최근 것 찾기
-            pt_files = glob.glob(os.path.join(model_path, '**/*.pt'), recursive=True)
-            if pt_files:
-                best_model_path = max(pt_files, key=os.path.getctime)
-            else:
-                print(f"[ERROR] 모델 파일을 찾을 수 없습니다: {model_path}")
-                return
-        model_path = best_model_path
-    
-    model_info = load_model(model_path)
-    if not model_info:
-        print("[ERROR] 모델을 로드할 수 없습니다.")
-        return
-    
-    # 모델 평가
-    result = evaluate_model(
-        model_info, 
-        data_yaml_path, 
-        args.conf_threshold, 
-        args.iou_threshold
-    )
+    with profiler.phase('evaluate') as phase:
+        result = None
+        # 체크포인트 비교 모드
+        checkpoints = find_checkpoints(args.model_path) if args.compare else None
+        if args.compare and not checkpoints:
+            print(f"[ERROR] 모델 파일을 찾을 수 없습니다: {args.model_path}")
+        elif args.compare:
+            samples = PackedDataset(args.packed_dir) if args.packed_dir else FolderSamples(args.data_folder)
+            result = evaluate_checkpoints(
+                checkpoints,
+                samples,
+                args.output_dir,
+                args.conf_threshold,
+                args.iou_threshold,
+                imgsz=args.imgsz,
+                batch_size=args.batch_size,
+                num_workers=args.num_workers,
+                max_concurrent=args.max_concurrent,
+                rank_by=args.rank_by,
+                device=args.device
+            )
+            if result:
+                log_param("best_checkpoint", result['path'])
+                for m in result['checkpoint_comparison']:
+                    for key in ('mAP50', 'mAP50-95', 'f1_score'):
+                        log_metric(f"{Path(m['path']).stem}_{key}", m[key])
+        else:
+            result = evaluate_single_model(args, data_yaml_path)
+        if result:
+            phase.add(files=result.get('num_images', 0))
     
     if not result:
         print("[ERROR] 모델 평가에 실패했습니다.")
+        metrics_logger.close()
+        mlflow.end_run(status="FAILED")
         return
+
+    # CPU 지연시간 벤치마크 (배포 대상 CPU 인스턴스 기준)
+    if args.benchmark:
+        with profiler.phase('benchmark'):
+            try:
+                result['latency_benchmark'] = benchmark_latency(
+                    result['path'],
+                    PackedDataset(args.packed_dir) if args.packed_dir else FolderSamples(args.data_folder),
+                    imgsz=args.imgsz,
+                    batch_sizes=args.bench_batch_sizes,
+                    thread_counts=args.bench_threads,
+                    warmup=args.bench_warmup,
+                    iterations=args.bench_iterations,
+                    conf_threshold=args.conf_threshold,
+                    iou_threshold=args.iou_threshold,
+                    latency_budget_ms=args.latency_budget_ms
+                )
+                log_latency_benchmark(result['latency_benchmark'], log_metric)
+            except Exception as e:
+                print(f"[경고] 지연시간 벤치마크 실패: {e}")
     
     # 리포트 생성
-    report_files = generate_evaluation_report(result, args.output_dir)
+    with profiler.phase('report'):
+        report_files = generate_evaluation_report(result, args.output_dir)
     
     # MLflow에 결과 로깅
     for metric, value in result.items():
-        if metric not in ['model_name', 'timestamp', 'conf_threshold', 'iou_threshold']:
+        if metric not in ['model_name', 'timestamp', 'conf_threshold', 'iou_threshold'] and isinstance(value, (int, float)):
             log_metric(metric, value)
+    for m in result.get('per_class', []):
+        for key in ('precision', 'recall', 'f1_score', 'mAP50', 'mAP50-95'):
+            log_metric(f"{m['class_name']}_{key}", m[key])
+    best = result.get('threshold_sweep', {}).get('best_f1')
+    if best:
+        for key in ('conf_threshold', 'iou_threshold', 'precision', 'recall', 'f1_score', 'mAP50', 'mAP50-95'):
+            log_metric(f"best_{key}", best[key])
+    for m, r in result.get('tiling', {}).items():
+        if m != 'settings':
+            for key in ('mAP50', 'mAP50-95', 'small_mAP50', 'ms_per_image'):
+                log_metric(f"{m}_{key}", r[key])
     
     # 아티팩트 업로드
-    if IS_AZURE_RUN:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    with profiler.phase('upload_artifacts') as phase:
+        if IS_AZURE_RUN:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            
+            # 리포트 파일들 업로드
+            for file_path in [args.output_dir]:
+                for file_name in os.listdir(file_path):
+                    full_path = os.path.join(file_path, file_name)
+                    if os.path.isfile(full_path):
+                        azure_run.upload_file(
+                            name=f"evaluation_{file_name}_{timestamp}", 
+                            path_or_stream=full_path
+                        )
         
-        # 리포트 파일들 업로드
-        for file_path in [args.output_dir]:
-            for file_name in os.listdir(file_path):
-                full_path = os.path.join(file_path, file_name)
-                if os.path.isfile(full_path):
-                    azure_run.upload_file(
-                        name=f"evaluation_{file_name}_{timestamp}", 
-                        path_or_stream=full_path
-                    )
-    
-    # MLflow 아티팩트 로깅
-    mlflow.log_artifacts(args.output_dir, artifact_path="evaluation_results")
+        # MLflow 아티팩트 로깅
+        mlflow.log_artifacts(args.output_dir, artifact_path="evaluation_results")
+        phase.add(files=len(os.listdir(args.output_dir)))
+
+    # 단계별 프로파일 (업로드 단계까지 포함해서 마지막에 저장)
+    profiler.log(log_metric, profiler.save(args.output_dir))
+    mlflow.log_artifact(os.path.join(args.output_dir, PROFILE_NAME), artifact_path="evaluation_results")
     
     print("\n" + "=" * 60)
     print("평가 완료!")
@@ -309,6 +710,7 @@ names: ['helmet', 'no-helmet']
     print(f"  mAP50-95: {result['mAP50-95']:.4f}")
     print(f"  F1-Score: {result['f1_score']:.4f}")
     
+    metrics_logger.close()
     mlflow.end_run()
 
 if __name__ == "__main__":
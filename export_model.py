@@ -0,0 +1,262 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+import mlflow
+from metrics_logger import AsyncMetricsLogger
+
+from eval_engine import (FolderSamples, DecodedImageCache, OnnxModel, preprocess_image, forward_raw, onnx_forward_raw,
+                         score_checkpoint)
+from latency_bench import (load_bench_images, run_case, benchmark_latency, log_latency_benchmark, BENCH_BATCH_SIZES,
+                           BENCH_THREADS, BENCH_WARMUP)
+
+# Azure ML Run context
+try:
+    from azureml.core.run import Run
+    azure_run = Run.get_context()
+    IS_AZURE_RUN = not isinstance(azure_run, str)
+except:
+    azure_run = None
+    IS_AZURE_RUN = False
+
+# param/metric은 백그라운드 스레드에서 묶어서 전송 (MLflow + Azure run)
+metrics_logger = AsyncMetricsLogger(azure_run if IS_AZURE_RUN else None)
+
+def log_metric(key, value):
+    metrics_logger.log_metric(key, value)
+
+def log_param(key, value):
+    metrics_logger.log_param(key, value)
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="best.pt -> ONNX (+ INT8) 변환 후 정확도/지연시간 기준으로 배포 모델 선택")
+    parser.add_argument("--model-folder", type=str, required=True, help="train.py 출력 폴더 (final/best.pt)")
+    parser.add_argument("--data-folder", type=str, required=True, help="정확도 비교용 테스트 데이터 폴더")
+    parser.add_argument("--calib-folder", type=str, default=None,
+                        help="INT8 캘리브레이션용 학습 데이터 폴더 (images/ 포함)")
+    parser.add_argument("--eval-folder", type=str, default=None, help="model_eval 출력 폴더 (FP32 평가 리포트 참고용)")
+    parser.add_argument("--output-dir", type=str, required=True, help="선택된 모델(model/)과 export_report.json 저장 폴더")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--int8", action="store_true", help="ONNX INT8 정적 양자화 모델도 생성")
+    parser.add_argument("--calib-images", type=int, default=128, help="캘리브레이션에 사용할 이미지 수")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="FP32(best.pt) 대비 허용 mAP50-95 하락폭 (절대값)")
+    parser.add_argument("--conf-threshold", type=float, default=0.25)
+    parser.add_argument("--iou-threshold", type=float, default=0.45)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--num-workers", type=int, default=8)
+    parser.add_argument("--bench-iterations", type=int, default=30)
+    parser.add_argument("--benchmark", action="store_true",
+                        help="후보 모델(PyTorch/ONNX/INT8)마다 CPU 지연시간/처리량 벤치마크(배치 크기 x 스레드 수)를 "
+                             "수행해서 export_report.json에 기록")
+    parser.add_argument("--bench-batch-sizes", type=int, nargs='+', default=BENCH_BATCH_SIZES)
+    parser.add_argument("--bench-threads", type=int, nargs='+', default=BENCH_THREADS)
+    parser.add_argument("--bench-warmup", type=int, default=BENCH_WARMUP)
+    parser.add_argument("--latency-budget-ms", type=float, default=None,
+                        help="프레임당 지연시간 예산 (batch 1 p95 기준 충족 여부를 리포트)")
+    return parser.parse_args()
+
+def find_best_model(model_folder):
+    for candidate in (os.path.join(model_folder, 'final', 'best.pt'), os.path.join(model_folder, 'best.pt')):
+        if os.path.exists(candidate):
+            return candidate
+    pt_files = glob.glob(os.path.join(model_folder, '**/best.pt'), recursive=True)
+    return max(pt_files, key=os.path.getctime) if pt_files else None
+
+def export_onnx(model_path, output_dir, imgsz):
+    """best.pt를 동적 배치 ONNX로 변환"""
+    from ultralytics import YOLO
+    exported = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    onnx_path = os.path.join(output_dir, 'model.onnx')
+    shutil.move(str(exported), onnx_path)
+    return onnx_path
+
+class ImageCalibrationReader:
+    """학습 이미지를 letterbox 전처리해서 onnxruntime 캘리브레이션 입력으로 하나씩 제공"""
+
+    def __init__(self, image_paths, input_name, imgsz):
+        self.image_paths = iter(image_paths)
+        self.input_name = input_name
+        self.imgsz = imgsz
+
+    def get_next(self):
+        import cv2
+        for path in self.image_paths:
+            im = cv2.imread(path, cv2.IMREAD_COLOR)
+            if im is None:
+                continue
+            x, _ = preprocess_image(im, self.imgsz)
+            return {self.input_name: x[None].astype(np.float32) / 255.0}
+        return None
+
+def calibration_images(calib_folder, count):
+    """학습 이미지 중 count개를 고르게 선택 (정렬 후 일정 간격)"""
+    images_dir = os.path.join(calib_folder, 'images')
+    names = sorted(f for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTS))
+    step = max(1, len(names) // max(1, count))
+    return [os.path.join(images_dir, name) for name in names[::step][:count]]
+
+def quantize_int8(onnx_path, output_dir, calib_paths, imgsz):
+    """onnxruntime 정적 양자화 (QDQ, 가중치 int8 채널별, 활성화 uint8)"""
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType, CalibrationDataReader
+
+    class _Reader(ImageCalibrationReader, CalibrationDataReader):
+        pass
+
+    input_name = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    int8_path = os.path.join(output_dir, 'model.int8.onnx')
+    quantize_static(onnx_path, int8_path, _Reader(calib_paths, input_name, imgsz),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    return int8_path
+
+def measure_latency(model, images, imgsz, conf_threshold, iou_threshold, iterations, forward=forward_raw):
+    """batch 1 기준 전처리 + 추론 + NMS 지연시간 (ms)"""
+    latencies = run_case(model, images[:1], imgsz, conf_threshold, iou_threshold, 5, iterations, forward) * 1000
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+def load_eval_report(eval_folder):
+    path = os.path.join(eval_folder, 'evaluation_report.json') if eval_folder else None
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    args = parse_args()
+    from ultralytics import YOLO
+
+    print("=" * 60)
+    print("모델 변환 / 양자화 시작")
+    print("=" * 60)
+
+    model_path = find_best_model(args.model_folder)
+    if not model_path:
+        print(f"[ERROR] best.pt를 찾을 수 없습니다: {args.model_folder}")
+        return
+    print(f"[INFO] 원본 모델: {model_path}")
+
+    candidates_dir = os.path.join(args.output_dir, 'candidates')
+    os.makedirs(candidates_dir, exist_ok=True)
+
+    mlflow.start_run()
+    log_param("export_model_path", model_path)
+    log_param("export_tolerance", args.tolerance)
+
+    # FP32 기준 (같은 전처리/후처리 경로에서 평가해야 변환에 따른 차이만 비교됨)
+    pt_model = YOLO(model_path)
+    pt_model.model.to('cpu').float().eval()
+    class_names = pt_model.names
+    samples = FolderSamples(args.data_folder)
+    cache = DecodedImageCache(samples, args.imgsz, args.num_workers)
+    bench_images = load_bench_images(samples, 1)
+
+    artifacts = []
+    metrics = score_checkpoint(pt_model, cache, args.conf_threshold, args.iou_threshold, args.batch_size)
+    p50, p95 = measure_latency(pt_model, bench_images, args.imgsz, args.conf_threshold, args.iou_threshold,
+                               args.bench_iterations)
+    artifacts.append({'format': 'pytorch', 'path': model_path, 'mAP50': metrics['mAP50'],
+                      'mAP50-95': metrics['mAP50-95'], 'p50_ms': p50, 'p95_ms': p95})
+
+    # ONNX FP32 / INT8 변환
+    onnx_paths = []
+    try:
+        onnx_paths.append(('onnx', export_onnx(model_path, candidates_dir, args.imgsz)))
+        if args.int8:
+            if not args.calib_folder:
+                print("[경고] --calib-folder가 없어 INT8 양자화를 건너뜁니다")
+            else:
+                calib_paths = calibration_images(args.calib_folder, args.calib_images)
+                print(f"[INFO] INT8 캘리브레이션 이미지 {len(calib_paths)}개")
+                start = time.perf_counter()
+                onnx_paths.append(('onnx-int8', quantize_int8(onnx_paths[0][1], candidates_dir, calib_paths,
+                                                              args.imgsz)))
+                print(f"[INFO] INT8 양자화 완료 ({time.perf_counter() - start:.1f}s)")
+    except Exception as e:
+        print(f"[경고] ONNX 변환/양자화 실패, 이후 후보 제외: {e}")
+
+    for fmt, path in onnx_paths:
+        try:
+            model = OnnxModel(path, class_names)
+            metrics = score_checkpoint(model, cache, args.conf_threshold, args.iou_threshold, args.batch_size,
+                                       forward=onnx_forward_raw)
+            p50, p95 = measure_latency(model, bench_images, args.imgsz, args.conf_threshold, args.iou_threshold,
+                                       args.bench_iterations, forward=onnx_forward_raw)
+        except Exception as e:
+            print(f"[경고] {fmt} 평가 실패: {e}")
+            continue
+        artifacts.append({'format': fmt, 'path': path, 'mAP50': metrics['mAP50'],
+                          'mAP50-95': metrics['mAP50-95'], 'p50_ms': p50, 'p95_ms': p95})
+
+    # 허용 범위 안에서 가장 빠른 모델 선택
+    reference = artifacts[0]['mAP50-95']
+    for a in artifacts:
+        a['size_mb'] = os.path.getsize(a['path']) / 1e6
+        a['mAP50-95_delta'] = a['mAP50-95'] - reference
+        a['within_tolerance'] = -a['mAP50-95_delta'] <= args.tolerance
+        print(f"[INFO] {a['format']:<10} mAP50-95 {a['mAP50-95']:.4f} ({a['mAP50-95_delta']:+.4f}), "
+              f"p50 {a['p50_ms']:.1f}ms, p95 {a['p95_ms']:.1f}ms, {a['size_mb']:.1f}MB"
+              f"{'' if a['within_tolerance'] else ' [허용 범위 초과]'}")
+    selected = min((a for a in artifacts if a['within_tolerance']), key=lambda a: a['p50_ms'])
+
+    model_dir = os.path.join(args.output_dir, 'model')
+    shutil.rmtree(model_dir, ignore_errors=True)
+    os.makedirs(model_dir)
+    selected_name = 'best.pt' if selected['format'] == 'pytorch' else 'model.onnx'
+    shutil.copy2(selected['path'], os.path.join(model_dir, selected_name))
+    print(f"[완료] 배포 모델 선택: {selected['format']} -> {os.path.join(model_dir, selected_name)}")
+
+    # CPU 지연시간 벤치마크: 후보 형식마다 배치 크기 x 스레드 수 격자 측정 (배포 대상과 같은 CPU 클러스터)
+    if args.benchmark:
+        for a in artifacts:
+            try:
+                a['latency_benchmark'] = benchmark_latency(
+                    a['path'],
+                    samples,
+                    imgsz=args.imgsz,
+                    batch_sizes=args.bench_batch_sizes,
+                    thread_counts=args.bench_threads,
+                    warmup=args.bench_warmup,
+                    iterations=args.bench_iterations,
+                    conf_threshold=args.conf_threshold,
+                    iou_threshold=args.iou_threshold,
+                    latency_budget_ms=args.latency_budget_ms
+                )
+                log_latency_benchmark(a['latency_benchmark'], log_metric,
+                                      prefix=f"latency_{a['format'].replace('-', '_')}")
+            except Exception as e:
+                print(f"[경고] {a['format']} 지연시간 벤치마크 실패: {e}")
+
+    eval_report = load_eval_report(args.eval_folder)
+    report = {
+        'export_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'source_model': model_path,
+        'tolerance': args.tolerance,
+        'selected': {**{k: v for k, v in selected.items() if k != 'latency_benchmark'}, 'file': selected_name},
+        'artifacts': artifacts,
+        'fp32_evaluation': eval_report.get('summary') if eval_report else None,
+        # 배포되는 모델 기준 벤치마크 (후보별 결과는 artifacts[*].latency_benchmark)
+        'latency_benchmark': selected.get('latency_benchmark'),
+    }
+    with open(os.path.join(args.output_dir, 'export_report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    log_param("export_selected_format", selected['format'])
+    for a in artifacts:
+        prefix = a['format'].replace('-', '_')
+        for key in ('mAP50-95', 'mAP50-95_delta', 'p50_ms', 'p95_ms', 'size_mb'):
+            log_metric(f"{prefix}_{key}", a[key])
+    mlflow.log_artifact(os.path.join(args.output_dir, 'export_report.json'), artifact_path="export")
+    metrics_logger.close()
+    mlflow.end_run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024  # 청크 복사 단위 (8MB)
+FICLONE = 0x40049409  # Linux reflink ioctl (btrfs/xfs 등)
+LINK_MODES = ('auto', 'hardlink', 'reflink', 'symlink', 'copy')
+LABEL_LINE_FORMAT = "%d %.6f %.6f %.6f %.6f\n"
+
+def _same_filesystem(src, dst_dir):
+    try:
+        return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+def _chunked_copy(src, dst):
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+    shutil.copystat(src, dst)
+
+def _link_candidates(mode, same_fs):
+    if mode == 'auto':
+        return ('hardlink', 'reflink', 'symlink', 'copy') if same_fs else ('copy',)
+    if mode == 'copy':
+        return ('copy',)
+    # 명시적 링크 모드도 실패하면 복사로 대체
+    return (mode, 'copy')
+
+def materialize_file(src, dst, mode='auto', same_fs=None):
+    """src를 dst 위치에 생성하고 (사용한 방식, 복사한 바이트 수) 반환"""
+    if same_fs is None:
+        same_fs = _same_filesystem(src, os.path.dirname(dst))
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    for method in _link_candidates(mode, same_fs):
+        try:
+            if method == 'hardlink':
+                os.link(src, dst)
+                return method, 0
+            if method == 'reflink':
+                _reflink(src, dst)
+                return method, 0
+            if method == 'symlink':
+                os.symlink(os.path.abspath(src), dst)
+                return method, 0
+            _chunked_copy(src, dst)
+            return method, os.path.getsize(dst)
+        except (OSError, ImportError):
+            if method == 'copy':
+                raise
+    raise OSError(f"파일 생성 실패: {src} -> {dst}")
+
+def materialize_files(jobs, mode='auto', num_workers=8, desc='Materializing images'):
+    """(src, dst) 목록을 스레드 풀로 병렬 생성하고 처리 통계 반환"""
+    stats = {'files': 0, 'missing': 0, 'failed': 0, 'bytes_total': 0, 'bytes_copied': 0, 'methods': {}}
+    if not jobs:
+        return stats
+
+    # 파일시스템 비교는 목적지 폴더 단위로 한 번만 수행
+    dst_dirs = {os.path.dirname(dst) for _, dst in jobs}
+    dst_devs = {d: os.stat(d).st_dev for d in dst_dirs}
+
+    def _work(src, dst):
+        try:
+            st = os.stat(src)
+        except FileNotFoundError:
+            return src, None, 0, 0, None
+        same_fs = st.st_dev == dst_devs[os.path.dirname(dst)]
+        try:
+            method, copied = materialize_file(src, dst, mode, same_fs)
+        except OSError as e:
+            return src, None, st.st_size, 0, e
+        return src, method, st.st_size, copied, None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+        futures = [pool.submit(_work, src, dst) for src, dst in jobs]
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            src, method, size, copied, error = future.result()
+            if error is not None:
+                stats['failed'] += 1
+                print(f"[ERROR] 이미지 생성 실패: {src}, 에러: {error}")
+            elif method is None:
+                stats['missing'] += 1
+                print(f"[경고] 이미지 파일 없음: {src}")
+            else:
+                stats['files'] += 1
+                stats['bytes_total'] += size
+                stats['bytes_copied'] += copied
+                stats['methods'][method] = stats['methods'].get(method, 0) + 1
+    elapsed = time.perf_counter() - start
+
+    stats['seconds'] = elapsed
+    stats['files_per_sec'] = stats['files'] / elapsed if elapsed > 0 else 0.0
+    stats['mb_per_sec'] = stats['bytes_copied'] / elapsed / 1e6 if elapsed > 0 else 0.0
+    print(f"[INFO] 이미지 {stats['files']}개 생성 ({elapsed:.2f}s, {stats['files_per_sec']:.1f} files/s)")
+    print(f"[INFO] 방식별 개수: {stats['methods']}, 누락: {stats['missing']}, 실패: {stats['failed']}")
+    print(f"[INFO] 전체 {stats['bytes_total'] / 1e6:.1f}MB 중 {stats['bytes_copied'] / 1e6:.1f}MB 복사 "
+          f"({stats['mb_per_sec']:.1f}MB/s)")
+    return stats
@@ -0,0 +1,138 @@
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+LABEL_STATS_VERSION = 1
+# 박스 크기(sqrt(w*h), 정규화) 히스토그램 구간: 작은 객체 쪽을 촘촘하게
+BOX_SIZE_BINS = [0.0, 0.01, 0.02, 0.04, 0.08, 0.16, 0.32, 0.64, 1.0]
+BOX_SIDE_BINS = [i / 10 for i in range(11)]
+
+def _default_workers():
+    return min(32, (os.cpu_count() or 1) * 4)
+
+def list_label_files(labels_dir):
+    if not os.path.isdir(labels_dir):
+        return []
+    return sorted(entry.path for entry in os.scandir(labels_dir) if entry.name.endswith('.txt'))
+
+def fingerprint_files(paths, num_workers=None):
+    """파일 목록의 (이름, 크기, mtime) 기반 지문 (내용을 읽지 않고 변경 여부 판단)"""
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return f"{os.path.basename(path)}:missing"
+        return f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+    with ThreadPoolExecutor(max_workers=num_workers or _default_workers()) as pool:
+        entries = list(pool.map(_stat, paths))
+    digest = hashlib.sha1(f"v{LABEL_STATS_VERSION}".encode('utf-8'))
+    for entry in entries:
+        digest.update(entry.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+def _parse_label_file(path):
+    """라벨 파일 하나를 (상태, [N, 5] 배열)로 파싱"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 'missing', None
+    if not data.strip():
+        return 'empty', None
+    try:
+        rows = np.loadtxt(io.BytesIO(data), ndmin=2)
+    except ValueError:
+        return 'malformed', None
+    if rows.shape[1] < 5:
+        return 'malformed', None
+    # 세그멘테이션 라벨 등 열이 더 많으면 앞의 5개(class, x, y, w, h)만 사용
+    return 'ok', rows[:, :5]
+
+def compute_label_stats(label_files, num_workers=None):
+    """라벨 파일 전체를 한 번 스캔해서 클래스별 개수, 박스 크기 히스토그램, 빈 파일 수 계산"""
+    counts = {'ok': 0, 'empty': 0, 'missing': 0, 'malformed': 0}
+    blocks = []
+    with ThreadPoolExecutor(max_workers=num_workers or _default_workers()) as pool:
+        for status, rows in pool.map(_parse_label_file, label_files):
+            counts[status] += 1
+            if rows is not None:
+                blocks.append(rows)
+
+    return summarize_labels(blocks, counts)
+
+def summarize_labels(blocks, counts):
+    """[N, 5] 라벨 배열 목록과 파일 상태별 개수로 통계 생성"""
+    rows = np.concatenate(blocks) if blocks else np.empty((0, 5))
+    class_ids = rows[:, 0].astype(np.int64)
+    widths, heights = rows[:, 3], rows[:, 4]
+    sizes = np.sqrt(np.clip(widths * heights, 0, None))
+    unique_ids, class_counts = np.unique(class_ids, return_counts=True)
+
+    return {
+        'version': LABEL_STATS_VERSION,
+        'num_files': sum(counts.values()),
+        'labeled_files': counts['ok'],
+        'empty_files': counts['empty'],
+        'missing_files': counts['missing'],
+        'malformed_files': counts['malformed'],
+        'total_boxes': int(len(rows)),
+        'class_counts': {str(c): int(n) for c, n in zip(unique_ids.tolist(), class_counts.tolist())},
+        'box_size_hist': {'bins': BOX_SIZE_BINS, 'counts': np.histogram(sizes, bins=BOX_SIZE_BINS)[0].tolist()},
+        'box_width_hist': {'bins': BOX_SIDE_BINS, 'counts': np.histogram(widths, bins=BOX_SIDE_BINS)[0].tolist()},
+        'box_height_hist': {'bins': BOX_SIDE_BINS, 'counts': np.histogram(heights, bins=BOX_SIDE_BINS)[0].tolist()},
+        'boxes_per_file_mean': float(len(rows) / counts['ok']) if counts['ok'] else 0.0,
+    }
+
+def get_label_stats(labels_dir, cache_dir=None, num_workers=None):
+    """labels 폴더 통계를 폴더 지문 기준으로 캐시해서 반환"""
+    stats = get_file_label_stats(list_label_files(labels_dir), cache_dir, num_workers)
+    stats['labels_dir'] = labels_dir
+    return stats
+
+def get_file_label_stats(label_files, cache_dir=None, num_workers=None):
+    """라벨 파일 목록(학습 분할 등) 통계를 파일 목록 지문 기준으로 캐시해서 반환"""
+    fingerprint = fingerprint_files(label_files, num_workers)
+
+    cache_path = os.path.join(cache_dir, 'label_stats', f"{fingerprint}.json") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+        print(f"[INFO] 라벨 통계 캐시 사용: {cache_path}")
+        return stats
+
+    stats = compute_label_stats(label_files, num_workers)
+    stats['fingerprint'] = fingerprint
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+    return stats
+
+def print_label_stats(stats, class_names=None):
+    class_names = class_names or {}
+    print(f"[INFO] 라벨 파일 {stats['num_files']}개 (라벨 있음 {stats['labeled_files']}, 빈 파일 {stats['empty_files']}, "
+          f"누락 {stats['missing_files']}, 오류 {stats['malformed_files']})")
+    print(f"[INFO] 전체 박스 {stats['total_boxes']}개, 파일당 평균 {stats['boxes_per_file_mean']:.2f}개")
+    for class_id, count in stats['class_counts'].items():
+        class_name = class_names.get(int(class_id), f"unknown_{class_id}")
+        print(f"[INFO] Class {class_id} ({class_name}): {count} instances")
+    hist = stats['box_size_hist']
+    print("[INFO] 박스 크기 분포 (sqrt(w*h)): " + ", ".join(
+        f"{lo:g}-{hi:g}: {n}" for lo, hi, n in zip(hist['bins'][:-1], hist['bins'][1:], hist['counts'])))
+
+def log_label_stats(stats, log_metric, class_names=None, prefix='label'):
+    """통계를 metric으로 로깅하고 전체 내용은 MLflow 아티팩트로 저장"""
+    import mlflow
+
+    class_names = class_names or {}
+    for key in ('num_files', 'empty_files', 'missing_files', 'malformed_files', 'total_boxes'):
+        log_metric(f"{prefix}_{key}", stats[key])
+    for class_id, count in stats['class_counts'].items():
+        log_metric(f"{prefix}_count_{class_names.get(int(class_id), class_id)}", count)
+    mlflow.log_dict(stats, f"{prefix}_stats.json")
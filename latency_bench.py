@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from eval_engine import FolderSamples, OnnxModel, preprocess_image, forward_raw, onnx_forward_raw, postprocess_raw
+
+# Standard_DS3_v2(4 vCPU) 기준 기본 측정 격자
+BENCH_BATCH_SIZES = [1, 4, 8]
+BENCH_THREADS = [1, 2, 4]
+BENCH_WARMUP = 5
+BENCH_ITERATIONS = 30
+PERCENTILES = (50, 95, 99)
+# 배포 모델(선택된 PyTorch/ONNX/INT8) 기준 벤치마크는 export 단계에서만 측정됨
+LATENCY_BENCHMARK_NOTE = "배포 모델 기준 결과는 model_export 단계의 export_report.json (latency_benchmark, artifacts[*].latency_benchmark) 참고"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="YOLO 모델 CPU 지연시간/처리량 벤치마크")
+    parser.add_argument('--model-path', type=str, required=True)
+    parser.add_argument('--data-folder', type=str, required=True, help='images/ 폴더가 있는 테스트 데이터 폴더')
+    parser.add_argument('--output-dir', type=str, default=None, help='latency_benchmark.json 저장 폴더')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=BENCH_BATCH_SIZES)
+    parser.add_argument('--threads', type=int, nargs='+', default=BENCH_THREADS)
+    parser.add_argument('--warmup', type=int, default=BENCH_WARMUP)
+    parser.add_argument('--iterations', type=int, default=BENCH_ITERATIONS)
+    parser.add_argument('--conf-threshold', type=float, default=0.25)
+    parser.add_argument('--iou-threshold', type=float, default=0.45)
+    parser.add_argument('--latency-budget-ms', type=float, default=None, help='프레임당 지연시간 예산 (batch 1 p95 기준)')
+    return parser.parse_args()
+
+def load_bench_images(samples, count):
+    """벤치마크 입력으로 쓸 이미지를 count개 디코딩 (테스트셋이 작으면 반복 사용)"""
+    images = []
+    for name in samples.names:
+        im = samples.load_image(name)
+        if im is not None:
+            images.append(im)
+        if len(images) >= count:
+            break
+    if not images:
+        raise ValueError("벤치마크에 사용할 이미지가 없습니다")
+    return [images[i % len(images)] for i in range(count)]
+
+def _pin_threads(threads):
+    """현재 프로세스를 앞쪽 threads개 코어에 고정하고 이전 affinity 반환 (지원하지 않으면 None)"""
+    if not hasattr(os, 'sched_getaffinity'):
+        return None
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, sorted(previous)[:threads])
+    return previous
+
+def run_case(model, images, imgsz, conf_threshold, iou_threshold, warmup, iterations, forward=forward_raw):
+    """전처리 + forward + NMS 전체를 배치 단위로 반복 측정해서 배치 지연시간 [iterations] (초) 반환"""
+    def _infer():
+        prepared = [preprocess_image(im, imgsz) for im in images]
+        raw = forward(model, np.stack([x for x, _ in prepared]), [meta for _, meta in prepared], conf_threshold)
+        return [postprocess_raw(r, conf_threshold, iou_threshold) for r in raw]
+
+    for _ in range(warmup):
+        _infer()
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        _infer()
+        latencies[i] = time.perf_counter() - start
+    return latencies
+
+def benchmark_latency(model_path, samples, imgsz=640, batch_sizes=BENCH_BATCH_SIZES, thread_counts=BENCH_THREADS,
+                      warmup=BENCH_WARMUP, iterations=BENCH_ITERATIONS, conf_threshold=0.25, iou_threshold=0.45,
+                      latency_budget_ms=None):
+    """배치 크기 x 스레드 수 격자에서 CPU 지연시간(p50/p95/p99)과 처리량 측정
+
+    .onnx 경로는 onnxruntime 세션으로, 그 외(.pt)는 PyTorch로 측정한다.
+    """
+    is_onnx = model_path.endswith('.onnx')
+    if is_onnx:
+        model, forward = None, onnx_forward_raw
+    else:
+        import torch
+        from ultralytics import YOLO
+
+        model, forward = YOLO(model_path), forward_raw  # 평가용 모델과 별개로 CPU에 로드
+        model.model.to('cpu').float().eval()
+        previous_threads = torch.get_num_threads()
+    images = load_bench_images(samples, max(batch_sizes))
+    cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+
+    results = []
+    try:
+        for threads in thread_counts:
+            if threads > cpu_count:
+                print(f"[경고] 스레드 {threads}개는 사용 가능한 코어 수({cpu_count})보다 많아 건너뜀")
+                continue
+            if is_onnx:
+                # onnxruntime 스레드 수는 세션 생성 시에만 정할 수 있음
+                model = OnnxModel(model_path, num_threads=threads)
+            else:
+                torch.set_num_threads(threads)
+            previous_affinity = _pin_threads(threads)
+            try:
+                for batch_size in batch_sizes:
+                    latencies = run_case(model, images[:batch_size], imgsz, conf_threshold, iou_threshold,
+                                         warmup, iterations, forward=forward) * 1000
+                    p50, p95, p99 = np.percentile(latencies, PERCENTILES)
+                    row = {
+                        'batch_size': batch_size,
+                        'threads': threads,
+                        'p50_ms': float(p50),
+                        'p95_ms': float(p95),
+                        'p99_ms': float(p99),
+                        'mean_ms': float(latencies.mean()),
+                        'per_image_p50_ms': float(p50 / batch_size),
+                        'images_per_sec': float(batch_size * 1000 / latencies.mean()),
+                    }
+                    results.append(row)
+                    print(f"[INFO] batch {batch_size}, threads {threads}: p50 {p50:.1f}ms, p95 {p95:.1f}ms, "
+                          f"p99 {p99:.1f}ms, {row['images_per_sec']:.1f} img/s")
+            finally:
+                if previous_affinity is not None:
+                    os.sched_setaffinity(0, previous_affinity)
+    finally:
+        if not is_onnx:
+            torch.set_num_threads(previous_threads)
+
+    summary = {
+        'model_path': model_path,
+        'format': 'onnx' if is_onnx else 'pytorch',
+        'device': 'cpu',
+        'imgsz': imgsz,
+        'warmup': warmup,
+        'iterations': iterations,
+        'cpu_count': cpu_count,
+        'results': results,
+    }
+    if results:
+        summary['best_throughput'] = max(results, key=lambda r: r['images_per_sec'])
+        single = [r for r in results if r['batch_size'] == 1]
+        if single:
+            summary['best_single_image'] = min(single, key=lambda r: r['p95_ms'])
+            if latency_budget_ms is not None:
+                summary['latency_budget_ms'] = latency_budget_ms
+                summary['meets_latency_budget'] = summary['best_single_image']['p95_ms'] <= latency_budget_ms
+                print(f"[INFO] 지연시간 예산 {latency_budget_ms}ms: "
+                      f"{'충족' if summary['meets_latency_budget'] else '초과'} "
+                      f"(batch 1 p95 {summary['best_single_image']['p95_ms']:.1f}ms)")
+    return summary
+
+def log_latency_benchmark(summary, log_metric, prefix='latency'):
+    for r in summary['results']:
+        key = f"{prefix}_b{r['batch_size']}_t{r['threads']}"
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'images_per_sec'):
+            log_metric(f"{key}_{metric}", r[metric])
+    if 'best_throughput' in summary:
+        log_metric(f"{prefix}_best_images_per_sec", summary['best_throughput']['images_per_sec'])
+    if 'best_single_image' in summary:
+        log_metric(f"{prefix}_best_single_p95_ms", summary['best_single_image']['p95_ms'])
+
+def main():
+    args = parse_args()
+    summary = benchmark_latency(args.model_path, FolderSamples(args.data_folder), args.imgsz, args.batch_sizes,
+                                args.threads, args.warmup, args.iterations, args.conf_threshold,
+                                args.iou_threshold, args.latency_budget_ms)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        path = os.path.join(args.output_dir, 'latency_benchmark.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"[완료] 벤치마크 결과 저장: {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from file_utils import LABEL_LINE_FORMAT, materialize_files
+
+LETTERBOX_VERSION = 1  # 캐시 형식/변환 방식이 바뀌면 올려서 기존 캐시 무효화
+LETTERBOX_MODES = ('letterbox', 'resize')
+PAD_COLOR = (114, 114, 114)  # YOLO 학습/추론 시 letterbox 패딩 색과 동일
+JPEG_QUALITY = 95
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+
+def letterbox(im, imgsz, mode='letterbox'):
+    """긴 변을 imgsz로 맞추고 (letterbox면 정사각형으로 가운데 패딩) (이미지, (x 배율, y 배율), (pad_x, pad_y)) 반환"""
+    import cv2
+    h0, w0 = im.shape[:2]
+    r = imgsz / max(h0, w0)
+    w, h = max(1, round(w0 * r)), max(1, round(h0 * r))
+    if (w, h) != (w0, h0):
+        im = cv2.resize(im, (w, h), interpolation=cv2.INTER_AREA if r < 1 else cv2.INTER_LINEAR)
+    ratio = (w / w0, h / h0)  # 반올림된 실제 크기 기준 배율
+    if mode != 'letterbox':
+        return im, ratio, (0, 0)
+    pad_x, pad_y = (imgsz - w) // 2, (imgsz - h) // 2
+    im = cv2.copyMakeBorder(im, pad_y, imgsz - h - pad_y, pad_x, imgsz - w - pad_x,
+                            cv2.BORDER_CONSTANT, value=PAD_COLOR)
+    return im, ratio, (pad_x, pad_y)
+
+def adjust_labels(rows, meta):
+    """원본 기준 정규화 라벨 [N, 5]를 캐시 이미지 기준 정규화 좌표로 변환"""
+    rows = rows.copy()
+    w0, h0 = meta['orig_size']
+    out_w, out_h = meta['size']
+    rx, ry = meta['ratio']
+    pad_x, pad_y = meta['pad']
+    rows[:, 1] = (rows[:, 1] * w0 * rx + pad_x) / out_w
+    rows[:, 2] = (rows[:, 2] * h0 * ry + pad_y) / out_h
+    rows[:, 3] = rows[:, 3] * w0 * rx / out_w
+    rows[:, 4] = rows[:, 4] * h0 * ry / out_h
+    return rows
+
+def _cache_entry(src_path, cache_root, imgsz, mode):
+    """원본 해시 + imgsz 기준 캐시 항목을 만들거나 재사용 (프로세스 풀 작업 단위)"""
+    import cv2
+    with open(src_path, 'rb') as f:
+        data = f.read()
+    key = hashlib.sha1(data).hexdigest()
+    entry_dir = os.path.join(cache_root, key[:2])
+    image_path = os.path.join(entry_dir, f"{key}.jpg")
+    meta_path = os.path.join(entry_dir, f"{key}.json")
+    if os.path.exists(meta_path) and os.path.exists(image_path):
+        with open(meta_path, 'r') as f:
+            return src_path, image_path, json.load(f), True, len(data)
+
+    im = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if im is None:
+        return src_path, None, None, False, len(data)
+    h0, w0 = im.shape[:2]
+    out, r, pad = letterbox(im, imgsz, mode)
+    ok, encoded = cv2.imencode('.jpg', out, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not ok:
+        return src_path, None, None, False, len(data)
+    meta = {'orig_size': [w0, h0], 'size': [out.shape[1], out.shape[0]], 'ratio': list(r), 'pad': list(pad)}
+
+    # 여러 프로세스/노드가 같은 캐시를 써도 깨지지 않도록 임시 파일에 쓴 뒤 교체
+    os.makedirs(entry_dir, exist_ok=True)
+    tmp_suffix = f".{os.getpid()}.tmp"
+    with open(image_path + tmp_suffix, 'wb') as f:
+        f.write(encoded.tobytes())
+    os.replace(image_path + tmp_suffix, image_path)
+    with open(meta_path + tmp_suffix, 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + tmp_suffix, meta_path)
+    return src_path, image_path, meta, False, len(data)
+
+def remove_orphans(folder, stems):
+    """folder에서 stems에 없는 파일(원본에서 삭제/디코딩 실패한 이미지의 이전 출력) 제거하고 개수 반환"""
+    removed = 0
+    for name in os.listdir(folder):
+        if os.path.splitext(name)[0] not in stems:
+            os.remove(os.path.join(folder, name))
+            removed += 1
+    return removed
+
+def _is_current(src, dst):
+    """dst가 이미 src와 같은 파일인지 확인 (같은 inode, 또는 크기 + mtime 일치)"""
+    try:
+        st, src_st = os.stat(dst), os.stat(src)
+    except OSError:
+        return False
+    if (st.st_dev, st.st_ino) == (src_st.st_dev, src_st.st_ino):
+        return True
+    return st.st_size == src_st.st_size and abs(st.st_mtime - src_st.st_mtime) < 1
+
+def _write_adjusted_label(src_label, dst_label, meta):
+    """조정한 라벨을 dst_label에 쓰고 파일을 바꿨는지 반환 (내용이 같으면 다시 쓰지 않음)"""
+    if not os.path.exists(src_label):
+        if os.path.lexists(dst_label):
+            os.remove(dst_label)
+            return True
+        return False
+    with open(src_label, 'rb') as f:
+        data = f.read()
+    text = ''
+    if data.strip():
+        rows = adjust_labels(np.loadtxt(io.BytesIO(data), ndmin=2)[:, :5], meta)
+        text = (LABEL_LINE_FORMAT * len(rows)) % tuple(rows.ravel().tolist())
+    if os.path.isfile(dst_label) and not os.path.islink(dst_label):
+        with open(dst_label, 'r') as f:
+            if f.read() == text:
+                return False
+    if os.path.lexists(dst_label):
+        os.remove(dst_label)
+    with open(dst_label, 'w') as f:
+        f.write(text)
+    return True
+
+def build_letterbox_dataset(data_folder, output_folder, imgsz, cache_dir, mode='letterbox', num_workers=None):
+    """data_folder(images/, labels/)를 imgsz로 미리 변환한 데이터셋을 output_folder에 만들고 경로 반환"""
+    images_dir = os.path.join(data_folder, 'images')
+    labels_dir = os.path.join(data_folder, 'labels')
+    out_images = os.path.join(output_folder, 'images')
+    out_labels = os.path.join(output_folder, 'labels')
+    os.makedirs(out_images, exist_ok=True)
+    os.makedirs(out_labels, exist_ok=True)
+    cache_root = os.path.join(cache_dir, 'letterbox', f"v{LETTERBOX_VERSION}-{mode}-{imgsz}")
+    os.makedirs(cache_root, exist_ok=True)
+
+    names = sorted(f for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTS))
+    src_paths = [os.path.join(images_dir, name) for name in names]
+    start = time.perf_counter()
+    hits = failed = src_bytes = unchanged_bytes = labels_written = 0
+    jobs, unchanged = [], []
+    with ProcessPoolExecutor(max_workers=num_workers or os.cpu_count() or 1) as pool:
+        results = pool.map(_cache_entry, src_paths, [cache_root] * len(names), [imgsz] * len(names),
+                           [mode] * len(names), chunksize=16)
+        for src_path, image_path, meta, hit, size in results:
+            src_bytes += size
+            if image_path is None:
+                failed += 1
+                print(f"[경고] 이미지 디코딩 실패: {src_path}")
+                continue
+            hits += hit
+            stem = os.path.splitext(os.path.basename(src_path))[0]
+            dst = os.path.join(out_images, f"{stem}.jpg")
+            # 이전 빌드에서 이미 연결된 캐시 파일은 다시 만들지 않음
+            if _is_current(image_path, dst):
+                unchanged.append(dst)
+                unchanged_bytes += os.path.getsize(image_path)
+            else:
+                jobs.append((image_path, dst))
+            labels_written += _write_adjusted_label(os.path.join(labels_dir, f"{stem}.txt"),
+                                                    os.path.join(out_labels, f"{stem}.txt"), meta)
+    elapsed = time.perf_counter() - start
+    built = len(jobs) + len(unchanged)
+
+    # 이전 빌드에는 있었지만 지금 원본에 없는 출력은 학습에 섞이지 않도록 제거
+    stems = {os.path.splitext(os.path.basename(dst))[0] for dst in unchanged + [dst for _, dst in jobs]}
+    orphans = remove_orphans(out_images, stems) + remove_orphans(out_labels, stems)
+    if orphans:
+        print(f"[INFO] 원본에 없는 이전 letterbox 출력 {orphans}개 제거")
+
+    # 캐시 파일은 링크로 연결 (다른 파일시스템이면 복사)
+    stats = materialize_files(jobs, mode='auto', desc='Linking letterboxed images')
+    cached_bytes = stats['bytes_total'] + unchanged_bytes
+    print(f"[INFO] letterbox 캐시 ({mode}, imgsz={imgsz}): {len(names)}개 중 재사용 {hits}개, "
+          f"신규 {built - hits}개, 실패 {failed}개 ({elapsed:.2f}s)")
+    print(f"[INFO] letterbox 출력: 이미지 {len(jobs)}개 생성, {len(unchanged)}개 변경 없음 / "
+          f"라벨 {labels_written}개 갱신, {built - labels_written}개 변경 없음")
+    if src_bytes:
+        print(f"[INFO] 데이터셋 크기: {src_bytes / 1e6:.1f}MB -> {cached_bytes / 1e6:.1f}MB "
+              f"({cached_bytes / src_bytes * 100:.1f}%)")
+    return output_folder
@@ -0,0 +1,74 @@
+import argparse
+import base64
+import json
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+
+# score.py 로컬 서버(또는 온라인 엔드포인트)에 동시 요청을 보내 지연시간/처리량 측정
+def parse_args():
+    parser = argparse.ArgumentParser(description="scoring 엔드포인트 부하 생성기")
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:5001/score')
+    parser.add_argument('--image-folder', type=str, required=True)
+    parser.add_argument('--concurrency', type=int, default=8, help='동시 요청 수')
+    parser.add_argument('--requests', type=int, default=200, help='전체 요청 수')
+    parser.add_argument('--images-per-request', type=int, default=1)
+    parser.add_argument('--api-key', type=str, default=os.environ.get('SCORE_API_KEY'), help='엔드포인트 인증 키')
+    return parser.parse_args()
+
+def load_payloads(image_folder, images_per_request, count):
+    names = sorted(f for f in os.listdir(image_folder) if f.lower().endswith(IMAGE_EXTS))
+    if not names:
+        raise ValueError(f"이미지가 없습니다: {image_folder}")
+    encoded = []
+    for name in names[:max(images_per_request, min(len(names), 64))]:
+        with open(os.path.join(image_folder, name), 'rb') as f:
+            encoded.append(base64.b64encode(f.read()).decode('ascii'))
+    payloads = []
+    for i in range(count):
+        images = [encoded[(i * images_per_request + j) % len(encoded)] for j in range(images_per_request)]
+        payloads.append(json.dumps({'images': images}).encode('utf-8'))
+    return payloads
+
+def send(url, payload, api_key=None):
+    headers = {'Content-Type': 'application/json'}
+    if api_key:
+        headers['Authorization'] = f"Bearer {api_key}"
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=payload, headers=headers)) as response:
+            response.read()
+            ok = response.status == 200
+    except Exception as e:
+        print(f"[경고] 요청 실패: {e}")
+        ok = False
+    return time.perf_counter() - start, ok
+
+def main():
+    args = parse_args()
+    payloads = load_payloads(args.image_folder, args.images_per_request, args.requests)
+    print(f"[INFO] {args.url}: 요청 {args.requests}개, 동시 {args.concurrency}, 요청당 이미지 {args.images_per_request}개")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda p: send(args.url, p, args.api_key), payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([t for t, ok in results if ok]) * 1000
+    failed = sum(1 for _, ok in results if not ok)
+    if len(latencies) == 0:
+        print("[ERROR] 성공한 요청이 없습니다")
+        return
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99))
+    print(f"  requests/sec : {len(latencies) / elapsed:.1f}")
+    print(f"  images/sec   : {len(latencies) * args.images_per_request / elapsed:.1f}")
+    print(f"  latency (ms) : p50 {p50:.1f}, p95 {p95:.1f}, p99 {p99:.1f}, max {latencies.max():.1f}")
+    print(f"  failed       : {failed}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import atexit
+import os
+import re
+import threading
+import time
+from queue import Queue, Empty
+
+FLUSH_INTERVAL = 2.0  # 초
+# MLflow log_batch 한 번에 보낼 수 있는 최대 개수
+MAX_METRICS_PER_BATCH = 1000
+MAX_PARAMS_PER_BATCH = 100
+_STOP = object()
+
+def metric_key(name):
+    """results.csv 열 이름을 MLflow 키로 변환 (예: 'metrics/mAP50(B)' -> 'metrics/mAP50_B')"""
+    return re.sub(r'[^\w\-./ :]+', '_', name.strip()).strip('_')
+
+class AsyncMetricsLogger:
+    """param/metric을 큐에 넣고 백그라운드 스레드에서 MlflowClient.log_batch로 묶어서 전송 (azure_run.log도 같은 스레드)"""
+
+    def __init__(self, azure_run=None, flush_interval=FLUSH_INTERVAL):
+        self.azure_run = azure_run
+        self.flush_interval = flush_interval
+        self.queue = Queue()
+        self.sent_metrics = 0
+        self.sent_params = 0
+        self.errors = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._pending = 0
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='metrics-logger', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run_id(self):
+        # 활성 run은 호출한 스레드 기준이므로 큐에 넣을 때 run_id를 같이 저장
+        import mlflow
+        run = mlflow.active_run()
+        if run is None:
+            # mlflow.log_metric과 같이 활성 run이 없으면 새로 시작 (호출한 쪽의 mlflow.end_run()으로 종료)
+            run = mlflow.start_run()
+            print(f"[경고] 활성화된 MLflow run이 없어서 새 run을 시작합니다: {run.info.run_id}")
+        return run.info.run_id
+
+    def _put(self, item):
+        self._ensure_thread()
+        with self._idle:
+            self._pending += 1
+        self.queue.put(item)
+
+    def log_param(self, key, value):
+        self._put(('param', self._run_id(), key, value, None, None))
+
+    def log_metric(self, key, value, step=None):
+        self._put(('metric', self._run_id(), key, float(value), step, int(time.time() * 1000)))
+
+    def log_metrics(self, metrics, step=None):
+        for key, value in metrics.items():
+            self.log_metric(key, value, step)
+
+    def flush(self, timeout=None):
+        """지금까지 넣은 항목이 모두 전송될 때까지 대기"""
+        if self._thread is None:
+            return
+        with self._idle:
+            self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self):
+        if self._thread is None:
+            return
+        self.flush()
+        self.queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        print(f"[INFO] 메트릭 로거: metric {self.sent_metrics}개, param {self.sent_params}개 전송 (실패 {self.errors}건)")
+
+    def _drain(self, first):
+        """첫 항목 이후 flush_interval 동안 또는 배치 한도까지 모은 항목 목록"""
+        items = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < MAX_METRICS_PER_BATCH:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except Empty:
+                break
+            items.append(item)
+            if item is _STOP:
+                break
+        return items
+
+    def _send(self, items):
+        from mlflow.entities import Metric, Param
+        from mlflow.tracking import MlflowClient
+
+        client = MlflowClient()
+        by_run = {}
+        for kind, run_id, key, value, step, timestamp in items:
+            metrics, params = by_run.setdefault(run_id, ([], {}))
+            if kind == 'metric':
+                # step을 지정하지 않은 metric은 기록 시각(ms)을 step으로 써서 같은 키의 값이 순서대로 쌓이게 함
+                metrics.append(Metric(key, value, timestamp, timestamp if step is None else step))
+            else:
+                params.setdefault(key, Param(key, str(value)))  # param은 변경 불가라서 처음 값만
+        for run_id, (metrics, params) in by_run.items():
+            params = list(params.values())
+            for start in range(0, len(params), MAX_PARAMS_PER_BATCH):
+                client.log_batch(run_id, params=params[start:start + MAX_PARAMS_PER_BATCH])
+            for start in range(0, len(metrics), MAX_METRICS_PER_BATCH):
+                client.log_batch(run_id, metrics=metrics[start:start + MAX_METRICS_PER_BATCH])
+            self.sent_metrics += len(metrics)
+            self.sent_params += len(params)
+
+        if self.azure_run is not None:
+            for kind, _, key, value, _, _ in items:
+                self.azure_run.log(key, value)
+
+    def _loop(self):
+        while True:
+            items = self._drain(self.queue.get())
+            stop = items[-1] is _STOP
+            items = [item for item in items if item is not _STOP]
+            if items:
+                try:
+                    self._send(items)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[경고] 메트릭 배치 전송 실패 ({len(items)}개): {e}")
+                with self._idle:
+                    self._pending -= len(items)
+                    self._idle.notify_all()
+            if stop:
+                return
+
+class ResultsCsvStreamer:
+    """학습 중 results.csv에 새로 추가된 에포크 행을 step(epoch) 기준 metric으로 로깅"""
+
+    def __init__(self, logger, csv_path=None, prefix=''):
+        self.logger = logger
+        self.csv_path = csv_path
+        self.prefix = prefix
+        self.logged_epochs = set()
+
+    def poll(self, csv_path=None, df=None):
+        """새 에포크 행을 로깅하고 개수 반환 (df를 넘기면 이미 읽은 results.csv를 그대로 사용)"""
+        import pandas as pd
+        if df is None:
+            path = csv_path or self.csv_path
+            if not path or not os.path.exists(path):
+                return 0
+            try:
+                df = pd.read_csv(path)
+            except (pd.errors.EmptyDataError, pd.errors.ParserError):
+                return 0  # 학습 프로세스가 쓰는 중이면 다음 호출에서 다시 읽음
+        df.columns = [c.strip() for c in df.columns]
+        logged = 0
+        for _, row in df.iterrows():
+            epoch = int(row['epoch'])
+            if epoch in self.logged_epochs:
+                continue
+            self.logged_epochs.add(epoch)
+            for column, value in row.items():
+                if column != 'epoch' and pd.notna(value):
+                    self.logger.log_metric(self.prefix + metric_key(column), value, step=epoch)
+            logged += 1
+        return logged
+
+    def on_fit_epoch_end(self, trainer):
+        """ultralytics 콜백: 에포크마다 trainer.csv의 새 행을 로깅"""
+        self.poll(getattr(trainer, 'csv', None))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="results.csv를 로컬 MLflow 파일 스토어에 로깅해서 비동기 로거 확인")
+    parser.add_argument('--results-csv', type=str, required=True)
+    parser.add_argument('--tracking-uri', type=str, default='file:./mlruns')
+    return parser.parse_args()
+
+def main():
+    import mlflow
+    from mlflow.tracking import MlflowClient
+
+    args = parse_args()
+    if args.tracking_uri.startswith('file:'):
+        os.environ.setdefault('MLFLOW_ALLOW_FILE_STORE', 'true')  # 최신 MLflow는 파일 스토어를 명시적으로 허용해야 함
+    mlflow.set_tracking_uri(args.tracking_uri)
+    logger = AsyncMetricsLogger()
+    with mlflow.start_run() as run:
+        logger.log_param('results_csv', args.results_csv)
+        start = time.perf_counter()
+        rows = ResultsCsvStreamer(logger, args.results_csv).poll()
+        queued = time.perf_counter() - start
+        logger.close()
+    client = MlflowClient()
+    data = client.get_run(run.info.run_id).data
+    history = {key: len(client.get_metric_history(run.info.run_id, key)) for key in data.metrics}
+    print(f"[INFO] run {run.info.run_id}: 에포크 {rows}개 (큐 적재 {queued * 1000:.1f}ms), "
+          f"metric 키 {len(history)}개, param {len(data.params)}개")
+    for key, count in sorted(history.items()):
+        print(f"  {key}: {count} steps")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PACK_VERSION = 1
+INDEX_JSON = 'index.json'
+INDEX_NPY = 'index.npy'
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+ALIGN = 64  # 라벨 배열을 float32로 바로 읽을 수 있도록 오프셋 정렬
+READ_WINDOW = 256  # 한 번에 미리 읽어둘 샘플 수 (메모리 상한)
+# index.npy 열 구성
+COL_SHARD, COL_IMG_OFF, COL_IMG_LEN, COL_LBL_OFF, COL_NBOX, COL_W, COL_H = range(7)
+
+# YOLO 데이터셋(images/, labels/)을 큰 샤드 파일 몇 개 + 오프셋 인덱스로 묶기
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-folder', type=str, required=True, help='coco2yolo 출력 폴더 (images/, labels/)')
+    parser.add_argument('--output-folder', type=str, required=True, help='샤드 파일과 인덱스를 저장할 폴더')
+    parser.add_argument('--shard-size-mb', type=int, default=1024, help='샤드 파일 하나의 최대 크기')
+    parser.add_argument('--num-workers', type=int, default=min(32, (os.cpu_count() or 1) * 4),
+                        help='원본 파일 읽기 스레드 수')
+    return parser.parse_args()
+
+def _image_size(data):
+    """cv2.imdecode 결과와 같은 (width, height) (EXIF 회전 적용 후 크기)"""
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as im:
+        w, h = im.size
+        orientation = im.getexif().get(0x0112, 1)
+    # EXIF Orientation 5~8은 90도 회전이 포함되어 가로/세로가 바뀜
+    return (h, w) if orientation in (5, 6, 7, 8) else (w, h)
+
+def _read_sample(images_dir, labels_dir, name):
+    """(이미지 바이트, 라벨 배열, 크기), 라벨이 잘못되었거나 이미지를 읽을 수 없으면 None"""
+    with open(os.path.join(images_dir, name), 'rb') as f:
+        img_bytes = f.read()
+    label_path = os.path.join(labels_dir, os.path.splitext(name)[0] + '.txt')
+    rows = np.empty((0, 5), dtype=np.float32)
+    if os.path.exists(label_path):
+        with open(label_path, 'rb') as f:
+            data = f.read()
+        if data.strip():
+            try:
+                rows = np.loadtxt(io.BytesIO(data), ndmin=2, dtype=np.float32)
+            except ValueError as e:
+                print(f"[경고] 잘못된 라벨 파일이라 샘플을 건너뜁니다: {label_path}, 에러: {e}")
+                return None
+            if rows.shape[1] < 5:
+                print(f"[경고] 라벨 열 수가 부족해서 샘플을 건너뜁니다: {label_path} ({rows.shape[1]}열)")
+                return None
+            rows = rows[:, :5]
+    try:
+        size = _image_size(img_bytes)
+    except Exception as e:
+        print(f"[경고] 이미지를 읽을 수 없어서 샘플을 건너뜁니다: {name}, 에러: {e}")
+        return None
+    return img_bytes, np.ascontiguousarray(rows), size
+
+class _ShardWriter:
+    """샤드 파일에 순서대로 기록하고 크기를 넘으면 다음 샤드로 넘어감"""
+
+    def __init__(self, output_folder, shard_size):
+        self.output_folder = output_folder
+        self.shard_size = shard_size
+        self.shards = []
+        self.f = None
+        self.offset = 0
+
+    def _open_next(self):
+        if self.f:
+            self.f.close()
+        name = f"shard-{len(self.shards):05d}.bin"
+        self.shards.append(name)
+        self.f = open(os.path.join(self.output_folder, name), 'wb')
+        self.offset = 0
+
+    def _write(self, data):
+        pad = -self.offset % ALIGN
+        if pad:
+            self.f.write(b'\0' * pad)
+            self.offset += pad
+        start = self.offset
+        self.f.write(data)
+        self.offset += len(data)
+        return start
+
+    def write_sample(self, img_bytes, label_bytes):
+        """이미지와 라벨을 같은 샤드에 기록하고 (샤드 번호, 이미지 오프셋, 라벨 오프셋) 반환"""
+        if self.f is None or (self.offset and self.offset + len(img_bytes) + len(label_bytes) + 2 * ALIGN > self.shard_size):
+            self._open_next()
+        img_off = self._write(img_bytes)
+        lbl_off = self._write(label_bytes)
+        return len(self.shards) - 1, img_off, lbl_off
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
+
+def pack_dataset(data_folder, output_folder, shard_size_mb=1024, num_workers=8):
+    """images/labels를 샤드 파일로 묶고 인덱스를 저장, 샘플 수 반환"""
+    images_dir = os.path.join(data_folder, 'images')
+    labels_dir = os.path.join(data_folder, 'labels')
+    names = sorted(f for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTS))
+    os.makedirs(output_folder, exist_ok=True)
+
+    start = time.perf_counter()
+    entries = np.zeros((len(names), 7), dtype=np.int64)
+    packed = []
+    writer = _ShardWriter(output_folder, shard_size_mb * 1024 * 1024)
+    total_bytes = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+            for window in range(0, len(names), READ_WINDOW):
+                batch = names[window:window + READ_WINDOW]
+                samples = pool.map(_read_sample, [images_dir] * len(batch), [labels_dir] * len(batch), batch)
+                for name, sample in zip(batch, samples):
+                    if sample is None:
+                        continue
+                    img_bytes, rows, (w, h) = sample
+                    shard, img_off, lbl_off = writer.write_sample(img_bytes, rows.tobytes())
+                    entries[len(packed)] = (shard, img_off, len(img_bytes), lbl_off, len(rows), w, h)
+                    packed.append(name)
+                    total_bytes += len(img_bytes) + rows.nbytes
+    finally:
+        writer.close()
+    skipped = len(names) - len(packed)
+    if skipped:
+        print(f"[경고] 라벨/이미지 오류로 샘플 {skipped}개를 패킹에서 제외했습니다.")
+    entries = entries[:len(packed)]
+    names = packed
+
+    # 인덱스는 마지막에 기록 (중간에 실패하면 인덱스가 없어서 사용되지 않음)
+    np.save(os.path.join(output_folder, INDEX_NPY), entries)
+    with open(os.path.join(output_folder, INDEX_JSON), 'w', encoding='utf-8') as f:
+        json.dump({'version': PACK_VERSION, 'shards': writer.shards, 'names': names}, f, ensure_ascii=False)
+
+    elapsed = time.perf_counter() - start
+    print(f"[INFO] 샘플 {len(names)}개를 샤드 {len(writer.shards)}개로 패킹 "
+          f"({total_bytes / 1e6:.1f}MB, {elapsed:.2f}s, {len(names) / max(elapsed, 1e-9):.1f} files/s)")
+    return len(names)
+
+class PackedDataset:
+    """샤드 파일을 mmap으로 열고 이미지 바이트/라벨을 복사 없이 슬라이스로 제공"""
+
+    def __init__(self, pack_dir):
+        self.pack_dir = pack_dir
+        with open(os.path.join(pack_dir, INDEX_JSON), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != PACK_VERSION:
+            raise ValueError(f"지원하지 않는 패킹 버전: {meta.get('version')}")
+        self.names = meta['names']
+        self.entries = np.load(os.path.join(pack_dir, INDEX_NPY))
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._files = []
+        self._maps = []
+        for shard in meta['shards']:
+            f = open(os.path.join(pack_dir, shard), 'rb')
+            self._files.append(f)
+            self._maps.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def _entry(self, key):
+        return self.entries[key if isinstance(key, (int, np.integer)) else self._index[key]]
+
+    def image_bytes(self, key):
+        """인코딩된 이미지 바이트 (mmap 위의 memoryview, 복사 없음)"""
+        e = self._entry(key)
+        return memoryview(self._maps[e[COL_SHARD]])[e[COL_IMG_OFF]:e[COL_IMG_OFF] + e[COL_IMG_LEN]]
+
+    def labels(self, key):
+        """[N, 5] float32 (class, x_center, y_center, w, h) 읽기 전용 배열 (복사 없음)"""
+        e = self._entry(key)
+        n = int(e[COL_NBOX])
+        if n == 0:
+            return np.empty((0, 5), dtype=np.float32)
+        return np.frombuffer(self._maps[e[COL_SHARD]], dtype=np.float32, count=n * 5,
+                             offset=int(e[COL_LBL_OFF])).reshape(n, 5)
+
+    def image_size(self, key):
+        """원본 이미지 (width, height)"""
+        e = self._entry(key)
+        return int(e[COL_W]), int(e[COL_H])
+
+    def load_image(self, key):
+        """BGR 이미지로 디코딩"""
+        import cv2
+        return cv2.imdecode(np.frombuffer(self.image_bytes(key), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def close(self):
+        for m in self._maps:
+            m.close()
+        for f in self._files:
+            f.close()
+        self._maps, self._files = [], []
+
+    # DataLoader 워커(spawn)로 넘길 때는 경로만 넘기고 다시 mmap
+    def __getstate__(self):
+        return {'pack_dir': self.pack_dir}
+
+    def __setstate__(self, state):
+        self.__init__(state['pack_dir'])
+
+def write_split_lists(pack, output_dir, assign):
+    """패킹된 샘플 이름을 assign(stem) 결과에 따라 분할별 목록 파일로 기록하고 경로 반환"""
+    splits = {'train': [], 'valid': [], 'test': []}
+    for name in pack.names:
+        splits[assign(os.path.splitext(name)[0])].append(name)
+    os.makedirs(output_dir, exist_ok=True)
+    list_paths = {}
+    for split, names in splits.items():
+        list_paths[split] = os.path.join(output_dir, f'{split}.txt')
+        print(f"[INFO] Writing {len(names)} packed sample names to {split}.txt")
+        with open(list_paths[split], 'w') as f:
+            f.writelines(name + '\n' for name in names)
+    return list_paths
+
+def packed_label_stats(pack, names=None):
+    """패킹된 라벨(names 지정 시 그 샘플만)로 label_stats와 같은 형식의 통계 계산 (mmap이라 파일 스캔 불필요)"""
+    from label_stats import summarize_labels
+    if names is None:
+        indices = np.arange(len(pack))
+    else:
+        indices = np.array([pack._index[name] for name in names if name in pack], dtype=np.int64)
+    nbox = pack.entries[indices, COL_NBOX]
+    blocks = [pack.labels(int(i)) for i in indices[nbox > 0].tolist()]
+    return summarize_labels(blocks, {'ok': len(blocks), 'empty': int((nbox == 0).sum()), 'missing': 0, 'malformed': 0})
+
+def _make_packed_yolo_dataset(pack_dir):
+    from ultralytics.data.dataset import YOLODataset
+
+    class PackedYOLODataset(YOLODataset):
+        """이미지/라벨을 개별 파일 대신 PackedDataset에서 읽는 YOLODataset"""
+
+        def __init__(self, *args, **kwargs):
+            self.pack = PackedDataset(pack_dir)
+            super().__init__(*args, **kwargs)
+
+        def get_img_files(self, img_path):
+            names = []
+            for p in img_path if isinstance(img_path, list) else [img_path]:
+                if os.path.isfile(p):
+                    with open(p, 'r') as f:
+                        names += [os.path.basename(line.strip()) for line in f if line.strip()]
+                else:
+                    names += self.pack.names
+            im_files = [name for name in names if name in self.pack]
+            if len(im_files) < len(names):
+                print(f"[경고] 패킹에 없는 샘플 {len(names) - len(im_files)}개 제외")
+            count = self.fraction if isinstance(self.fraction, int) else max(1, round(len(im_files) * self.fraction))
+            return im_files[:count]
+
+        def get_labels(self):
+            labels = []
+            for name in self.im_files:
+                rows = self.pack.labels(name)
+                w, h = self.pack.image_size(name)
+                labels.append({
+                    'im_file': name,
+                    'shape': (h, w),
+                    'cls': rows[:, 0:1].copy(),
+                    'bboxes': rows[:, 1:5].copy(),
+                    'segments': [],
+                    'keypoints': None,
+                    'normalized': True,
+                    'bbox_format': 'xywh',
+                })
+            return labels
+
+        def load_image(self, i, rect_mode=True, **kwargs):
+            import cv2
+            if self.ims[i] is not None:
+                return self.ims[i], self.im_hw0[i], self.im_hw[i]
+            im = self.pack.load_image(self.im_files[i])
+            if im is None:
+                raise FileNotFoundError(f"Image Not Found {self.im_files[i]}")
+            h0, w0 = im.shape[:2]
+            # BaseDataset.load_image와 같은 방식으로 리사이즈하고 버퍼 관리
+            if rect_mode:
+                r = self.imgsz / max(h0, w0)
+                if r != 1:
+                    w, h = min(math.ceil(w0 * r), self.imgsz), min(math.ceil(h0 * r), self.imgsz)
+                    im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+            elif not (h0 == w0 == self.imgsz):
+                im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+            if im.ndim == 2:
+                im = im[..., None]
+            # 증강(mosaic 등)이 self.buffer에서 인덱스를 고르므로 BaseDataset처럼 최근 이미지를 버퍼에 유지
+            if self.augment:
+                self.ims[i], self.im_hw0[i], self.im_hw[i] = im, (h0, w0), im.shape[:2]
+                self.buffer.append(i)
+                if 1 < len(self.buffer) >= self.max_buffer_length:
+                    j = self.buffer.pop(0)
+                    if self.cache != 'ram':
+                        self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+            return im, (h0, w0), im.shape[:2]
+
+    return PackedYOLODataset
+
+@contextlib.contextmanager
+def _packed_yolo_dataset(pack_dir):
+    """build_yolo_dataset이 PackedYOLODataset을 생성하도록 잠시 교체"""
+    from ultralytics.data import build
+    original = build.YOLODataset
+    build.YOLODataset = _make_packed_yolo_dataset(pack_dir)
+    try:
+        yield
+    finally:
+        build.YOLODataset = original
+
+def packed_trainer(pack_dir):
+    """model.train(trainer=...)에 넘길 패킹 데이터셋용 트레이너 클래스"""
+    from ultralytics.models.yolo.detect import DetectionTrainer
+
+    class PackedDetectionTrainer(DetectionTrainer):
+        def build_dataset(self, img_path, mode='train', batch=None):
+            with _packed_yolo_dataset(pack_dir):
+                return super().build_dataset(img_path, mode, batch)
+
+    return PackedDetectionTrainer
+
+def packed_validator(pack_dir):
+    """model.val(validator=...)에 넘길 패킹 데이터셋용 검증기 클래스"""
+    from ultralytics.models.yolo.detect import DetectionValidator
+
+    class PackedDetectionValidator(DetectionValidator):
+        def build_dataset(self, img_path, mode='val', batch=None):
+            with _packed_yolo_dataset(pack_dir):
+                return super().build_dataset(img_path, mode, batch)
+
+    return PackedDetectionValidator
+
+def main():
+    args = parse_args()
+    pack_dataset(args.data_folder, args.output_folder, args.shard_size_mb, args.num_workers)
+    print(f"[완료] 패킹 데이터셋이 {args.output_folder}에 생성되었습니다.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import json
+import os
+import platform
+import resource
+import time
+from contextlib import contextmanager
+
+PROFILE_NAME = 'profile.json'
+
+def _read_proc_io():
+    """/proc/self/io 값 (rchar/wchar: 시스템콜 기준, read_bytes/write_bytes: 실제 디스크 기준), 없으면 빈 dict"""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            return {key: int(value) for key, value in (line.split(':') for line in f if ':' in line)}
+    except OSError:
+        return {}
+
+def _reset_peak_rss():
+    """VmHWM(최대 RSS)을 현재 값으로 초기화 (Linux 4.0+), 성공 여부 반환"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_bytes():
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux ru_maxrss 단위는 KB
+
+def _snapshot():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        'wall': time.perf_counter(),
+        'cpu': own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        'io': _read_proc_io(),
+        # 종료된 자식 프로세스(프로세스 풀, 데이터로더 워커)의 디스크 I/O (512바이트 블록)
+        'child_blocks_in': children.ru_inblock,
+        'child_blocks_out': children.ru_oublock,
+        'child_maxrss': children.ru_maxrss * 1024,
+    }
+
+class Phase:
+    def __init__(self, name):
+        self.name = name
+        self.files = 0
+        self.extra = {}
+
+    def add(self, files=0, **extra):
+        """처리한 파일 수와 단계별 추가 값 기록"""
+        self.files += files
+        self.extra.update(extra)
+
+class Profiler:
+    """이름 붙인 단계별 wall/CPU 시간, 처리 파일 수, 읽기/쓰기 바이트, 최대 RSS 기록"""
+
+    def __init__(self, step):
+        self.step = step
+        self.phases = []
+        self.started = time.time()
+        self._start = _snapshot()
+
+    @contextmanager
+    def phase(self, name):
+        phase = Phase(name)
+        hwm_reset = _reset_peak_rss()
+        before = _snapshot()
+        try:
+            yield phase
+        finally:
+            after = _snapshot()
+            self.phases.append(self._measure(phase, before, after, hwm_reset))
+            p = self.phases[-1]
+            print(f"[INFO] [profile] {self.step}/{name}: {p['seconds']:.2f}s, 파일 {p['files']}개, "
+                  f"읽기 {p['bytes_read'] / 1e6:.1f}MB, 쓰기 {p['bytes_written'] / 1e6:.1f}MB, "
+                  f"최대 RSS {p['peak_rss_bytes'] / 1e6:.0f}MB")
+
+    @staticmethod
+    def _measure(phase, before, after, hwm_reset):
+        seconds = after['wall'] - before['wall']
+        io_delta = {key: after['io'].get(key, 0) - before['io'].get(key, 0)
+                    for key in ('rchar', 'wchar', 'read_bytes', 'write_bytes')}
+        child_read = (after['child_blocks_in'] - before['child_blocks_in']) * 512
+        child_write = (after['child_blocks_out'] - before['child_blocks_out']) * 512
+        bytes_read = io_delta['rchar'] + child_read
+        bytes_written = io_delta['wchar'] + child_write
+        return {
+            'name': phase.name,
+            'seconds': seconds,
+            'cpu_seconds': after['cpu'] - before['cpu'],
+            'files': phase.files,
+            'files_per_sec': phase.files / seconds if seconds > 0 else 0.0,
+            'bytes_read': bytes_read,
+            'bytes_written': bytes_written,
+            'disk_read_bytes': io_delta['read_bytes'] + child_read,
+            'disk_write_bytes': io_delta['write_bytes'] + child_write,
+            'read_mb_per_sec': bytes_read / seconds / 1e6 if seconds > 0 else 0.0,
+            # 단계 시작 시 VmHWM을 초기화할 수 없으면 프로세스 전체 최대값
+            'peak_rss_bytes': _peak_rss_bytes(),
+            'peak_rss_is_phase_local': hwm_reset,
+            'child_peak_rss_bytes': after['child_maxrss'],
+            **phase.extra,
+        }
+
+    def summary(self):
+        end = _snapshot()
+        total = self._measure(Phase('total'), self._start, end, False)
+        total['files'] = sum(p['files'] for p in self.phases)
+        total['peak_rss_bytes'] = max([p['peak_rss_bytes'] for p in self.phases] + [total['peak_rss_bytes']])
+        return {
+            'step': self.step,
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+            'host': platform.node(),
+            'cpu_count': os.cpu_count(),
+            'total': total,
+            'phases': self.phases,
+        }
+
+    def save(self, output_dir, name=PROFILE_NAME):
+        """output_dir/profile.json 저장 후 요약 dict 반환"""
+        summary = self.summary()
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] 프로파일 저장: {path} (전체 {summary['total']['seconds']:.2f}s)")
+        return summary
+
+    def log(self, log_metric, summary=None):
+        """단계별 시간/파일/바이트/RSS를 profile_<step>_<phase>_* metric으로 로깅"""
+        summary = summary or self.summary()
+        for p in summary['phases'] + [summary['total']]:
+            prefix = f"profile_{self.step}_{p['name']}"
+            log_metric(f"{prefix}_seconds", p['seconds'])
+            log_metric(f"{prefix}_files", p['files'])
+            log_metric(f"{prefix}_read_mb", p['bytes_read'] / 1e6)
+            log_metric(f"{prefix}_write_mb", p['bytes_written'] / 1e6)
+            log_metric(f"{prefix}_peak_rss_mb", p['peak_rss_bytes'] / 1e6)
+
+    def log_mlflow(self, summary=None):
+        """MLflow를 쓰지 않는 스크립트용: 활성 run이 없으면 새 run을 열어서 로깅 (실패해도 계속 진행)"""
+        try:
+            import mlflow
+            if mlflow.active_run() is not None:
+                self.log(mlflow.log_metric, summary)
+                return
+            with mlflow.start_run():
+                self.log(mlflow.log_metric, summary)
+        except Exception as e:
+            print(f"[경고] 프로파일 MLflow 로깅 실패: {e}")
@@ -0,0 +1,311 @@
+import argparse
+import base64
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Queue, Empty
+
+import numpy as np
+
+from eval_engine import OnnxModel, file_sha1, preprocess_image, forward_raw, onnx_forward_raw
+from tiling import predict_tiled, merge_boxes
+
+# 배포 환경 변수로 조정 가능한 기본값
+MAX_BATCH_SIZE = int(os.environ.get('SCORE_MAX_BATCH_SIZE', 8))
+MAX_WAIT_MS = float(os.environ.get('SCORE_MAX_WAIT_MS', 10))
+IMGSZ = int(os.environ.get('SCORE_IMGSZ', 640))
+CONF_THRESHOLD = float(os.environ.get('SCORE_CONF_THRESHOLD', 0.25))
+IOU_THRESHOLD = float(os.environ.get('SCORE_IOU_THRESHOLD', 0.45))
+NUM_THREADS = int(os.environ.get('SCORE_NUM_THREADS', 0))  # 0: 라이브러리 기본값
+WARMUP_ITERATIONS = 3
+MIN_CONF = 0.01  # 배치 forward 후 요청별 임계값을 적용하기 전의 최소 신뢰도
+CACHE_SIZE = int(os.environ.get('SCORE_CACHE_SIZE', 2048))  # 0이면 결과 캐시 사용 안 함
+CACHE_TTL_S = float(os.environ.get('SCORE_CACHE_TTL_S', 300))
+TILE_SIZE = int(os.environ.get('SCORE_TILE_SIZE', 0))  # 0이면 전체 이미지 추론, 양수면 타일 추론
+TILE_OVERLAP = float(os.environ.get('SCORE_TILE_OVERLAP', 0.2))
+TILE_MERGE = os.environ.get('SCORE_TILE_MERGE', 'nms')
+STATS_LOG_INTERVAL = int(os.environ.get('SCORE_STATS_LOG_INTERVAL', 1000))  # 요청 N개마다 통계 출력
+
+model = None
+model_version = None
+forward = None
+batcher = None
+result_cache = None
+request_count = 0
+request_count_lock = threading.Lock()  # ThreadingHTTPServer/Azure 워커 스레드가 동시에 run() 호출
+
+class MicroBatcher:
+    """요청 스레드들이 넣은 이미지를 최대 배치 크기 / 최대 대기 시간 기준으로 묶어 한 번에 추론"""
+
+    def __init__(self, infer, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.infer = infer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = Queue()
+        self.batches = 0
+        self.items = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def _collect(self):
+        """첫 항목을 기다린 뒤 max_wait 안에 들어온 항목을 max_batch_size까지 모음"""
+        try:
+            first = self.queue.get(timeout=0.1)
+        except Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            try:
+                outputs = self.infer(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), output in zip(batch, outputs):
+                future.set_result(output)
+            self.batches += 1
+            self.items += len(batch)
+
+    def stats(self):
+        return {'batches': self.batches, 'items': self.items,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0}
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+class ResultCache:
+    """(이미지 내용 해시, 모델 버전, 임계값) -> 탐지 결과 LRU 캐시 (크기 + TTL 기준 제거, 스레드 안전)"""
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl_s=CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl = ttl_s
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    @staticmethod
+    def make_key(data, version, conf_threshold, iou_threshold):
+        return f"{hashlib.sha1(data).hexdigest()}:{version}:{conf_threshold:g}:{iou_threshold:g}"
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'cache_size': len(self.entries), 'cache_hits': self.hits, 'cache_misses': self.misses,
+                    'cache_evictions': self.evictions, 'cache_expirations': self.expirations,
+                    'cache_hit_rate': self.hits / lookups if lookups else 0.0}
+
+def find_model_file(model_dir):
+    """model.onnx가 있으면 우선 사용, 없으면 .pt"""
+    for pattern in ('**/*.onnx', '**/*.pt'):
+        found = sorted(glob.glob(os.path.join(model_dir, pattern), recursive=True))
+        # 양자화 후보(candidates/)가 같이 있어도 선택된 model/ 폴더의 파일을 우선
+        found.sort(key=lambda p: (os.sep + 'model' + os.sep) not in p)
+        if found:
+            return found[0]
+    return None
+
+def load_model(model_path):
+    if model_path.endswith('.onnx'):
+        return OnnxModel(model_path, num_threads=NUM_THREADS), onnx_forward_raw
+    import torch
+    from ultralytics import YOLO
+    if NUM_THREADS:
+        torch.set_num_threads(NUM_THREADS)
+    yolo = YOLO(model_path)
+    yolo.model.to('cpu').float().eval()
+    return yolo, forward_raw
+
+def infer_batch(images):
+    """[BGR 이미지] 배치를 한 번의 forward로 추론해서 이미지별 NMS 전 후보 반환 (타일 모드면 모든 타일을 한 배치로)"""
+    if TILE_SIZE:
+        return predict_tiled(model, images, IMGSZ, TILE_SIZE, TILE_OVERLAP, forward, MIN_CONF)
+    prepared = [preprocess_image(im, IMGSZ) for im in images]
+    return forward(model, np.stack([x for x, _ in prepared]), [meta for _, meta in prepared], MIN_CONF)
+
+def format_detections(raw, conf_threshold, iou_threshold):
+    cls, conf, xyxy = merge_boxes(raw, conf_threshold, iou_threshold, TILE_MERGE if TILE_SIZE else 'nms')
+    names = getattr(model, 'names', {}) or {}
+    return [{'class_id': int(c), 'class_name': names.get(int(c), str(c)), 'confidence': round(float(s), 4),
+             'bbox': [round(float(v), 1) for v in box]} for c, s, box in zip(cls, conf, xyxy)]
+
+def decode_image(data):
+    import cv2
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def init(model_dir=None):
+    """모델을 한 번 로드하고 배치 크기별로 워밍업한 뒤 마이크로 배처 시작 (Azure ML 진입점)"""
+    global model, model_version, forward, batcher, result_cache
+    model_dir = model_dir or os.environ.get('AZUREML_MODEL_DIR', '.')
+    model_path = find_model_file(model_dir)
+    if not model_path:
+        raise FileNotFoundError(f"모델 파일을 찾을 수 없습니다: {model_dir}")
+    model, forward = load_model(model_path)
+    # 모델이나 타일 설정이 바뀌면 캐시 키도 바뀜
+    model_version = f"{file_sha1(model_path)[:12]}-tile{TILE_SIZE}-{TILE_OVERLAP:g}-{TILE_MERGE}"
+    result_cache = ResultCache(CACHE_SIZE, CACHE_TTL_S)
+
+    start = time.perf_counter()
+    dummy = np.full((IMGSZ, IMGSZ, 3), 114, dtype=np.uint8)
+    for batch_size in sorted({1, MAX_BATCH_SIZE}):
+        for _ in range(WARMUP_ITERATIONS):
+            infer_batch([dummy] * batch_size)
+    batcher = MicroBatcher(infer_batch, MAX_BATCH_SIZE, MAX_WAIT_MS)
+    print(f"[INFO] 모델 로드 + 워밍업 완료: {model_path} ({time.perf_counter() - start:.2f}s, "
+          f"max_batch={MAX_BATCH_SIZE}, max_wait={MAX_WAIT_MS}ms)")
+
+def stats():
+    return {**batcher.stats(), **result_cache.stats(), 'requests': request_count}
+
+def run(raw_data):
+    """{"images": [base64, ...], "conf": 선택, "iou": 선택} -> {"detections": [[...], ...]} (Azure ML 진입점)
+
+    배치 forward는 MIN_CONF로 한 번만 거르므로 conf는 MIN_CONF 이상으로 맞춰서 적용한다.
+    """
+    global request_count
+    try:
+        request = json.loads(raw_data)
+        # MIN_CONF보다 낮은 값은 실제로 적용되는 값으로 올려서 캐시 키와 결과를 일치시킴
+        conf_threshold = max(float(request.get('conf', CONF_THRESHOLD)), MIN_CONF)
+        iou_threshold = float(request.get('iou', IOU_THRESHOLD))
+        payloads = [base64.b64decode(data) for data in request['images']]
+    except (ValueError, KeyError, TypeError) as e:
+        return {'error': f"잘못된 요청: {e}"}
+
+    # 같은 프레임(바이트 동일)은 캐시에서 바로 응답하고, 나머지만 디코딩 후 배처에 넣음
+    # (다른 요청의 이미지와 같은 배치로 묶일 수 있음)
+    keys = [ResultCache.make_key(data, model_version, conf_threshold, iou_threshold) for data in payloads]
+    detections = [result_cache.get(key) for key in keys]
+    futures = {}
+    for i, data in enumerate(payloads):
+        if detections[i] is None:
+            im = decode_image(data)
+            futures[i] = batcher.submit(im) if im is not None else None
+    for i, future in futures.items():
+        if future is None:
+            detections[i] = {'error': '이미지 디코딩 실패'}
+            continue
+        try:
+            detections[i] = format_detections(future.result(), conf_threshold, iou_threshold)
+        except Exception as e:
+            # 배치 추론 실패는 해당 이미지 결과로만 돌려주고 나머지 이미지는 정상 응답
+            print(f"[ERROR] 추론 실패: {e}")
+            detections[i] = {'error': f"추론 실패: {e}"}
+            continue
+        result_cache.put(keys[i], detections[i])
+
+    with request_count_lock:
+        request_count += 1
+        count = request_count
+    if STATS_LOG_INTERVAL and count % STATS_LOG_INTERVAL == 0:
+        print(f"[INFO] scoring 통계: {json.dumps(stats())}")
+    return {'detections': detections}
+
+class ScoreHandler(BaseHTTPRequestHandler):
+    """로컬 테스트용 HTTP 서버 (POST /score -> run(), GET /health, /metrics -> 배처/캐시 통계)"""
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path != '/score':
+            self._send(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        result = run(self.rfile.read(length))
+        self._send(400 if 'error' in result else 200, result)
+
+    def do_GET(self):
+        if self.path not in ('/health', '/metrics'):
+            self._send(404, {'error': 'not found'})
+            return
+        self._send(200, {'status': 'ok', **stats()})
+
+    def log_message(self, format, *args):
+        pass
+
+class ScoreServer(ThreadingHTTPServer):
+    request_queue_size = 128  # 동시 연결이 많아도 accept 대기열에서 끊기지 않도록
+    daemon_threads = True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="scoring 스크립트 로컬 실행 (Azure ML 온라인 엔드포인트 대용)")
+    parser.add_argument('--model-dir', type=str, required=True, help='model.onnx 또는 best.pt가 있는 폴더')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    init(args.model_dir)
+    server = ScoreServer((args.host, args.port), ScoreHandler)
+    print(f"[INFO] 로컬 scoring 서버: http://{args.host}:{args.port}/score")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        print(f"[완료] scoring 통계: {stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from file_utils import materialize_files
+
+STEP_CACHE_VERSION = 1
+META_NAME = 'meta.json'
+DIGEST_CHUNK_SIZE = 8 * 1024 * 1024
+
+def default_cache_dir():
+    return os.environ.get("GREENHAT_CACHE_DIR", os.path.expanduser("~/.cache/greenhat"))
+
+def file_digest(path, chunk_size=DIGEST_CHUNK_SIZE):
+    """파일 내용 sha1 (COCO json처럼 내용이 곧 입력 버전인 파일용)"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def tree_digest(folder, num_workers=16, include=None):
+    """폴더 아래 모든 파일의 (상대 경로, 크기, mtime) 지문 (내용을 읽지 않음, 마운트 경로가 바뀌어도 동일)
+
+    include(상대 경로)가 주어지면 True인 파일만 stat한다 (샤드별 지문용).
+    """
+    paths = sorted(os.path.join(root, name) for root, _, names in os.walk(folder) for name in names)
+    if include is not None:
+        paths = [path for path in paths if include(os.path.relpath(path, folder))]
+
+    def _stat(path):
+        st = os.stat(path)
+        return f"{os.path.relpath(path, folder)}:{st.st_size}:{st.st_mtime_ns}\n"
+
+    digest = hashlib.sha1()
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+        for entry in pool.map(_stat, paths):
+            digest.update(entry.encode('utf-8'))
+    return digest.hexdigest()
+
+def step_fingerprint(step, **inputs):
+    """단계 이름 + 입력 지문 + 인자로 만든 캐시 키"""
+    payload = json.dumps({'step': step, 'version': STEP_CACHE_VERSION, 'inputs': inputs}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class StepCache:
+    """<cache_dir>/steps/<step>/<key[:2]>/<key>/ 에 단계 출력 파일과 meta.json을 저장하는 내용 주소 캐시"""
+
+    def __init__(self, cache_dir, step):
+        self.root = os.path.join(cache_dir, 'steps', step)
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def lookup(self, key):
+        """캐시 항목의 meta dict, 없으면 None (meta.json은 마지막에 기록되므로 있으면 완전한 항목)"""
+        meta_path = os.path.join(self.path(key), META_NAME)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[경고] 단계 캐시 메타를 읽을 수 없습니다: {meta_path}, 에러: {e}")
+            return None
+
+    def store(self, key, meta, files=None, num_workers=8):
+        """files({캐시 내 상대 경로: 원본 경로})와 meta를 임시 폴더에 만든 뒤 이름 변경으로 등록"""
+        final = self.path(key)
+        if os.path.exists(os.path.join(final, META_NAME)):
+            return final
+        tmp = f"{final}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        files = files or {}
+        for rel in files:
+            os.makedirs(os.path.dirname(os.path.join(tmp, rel)), exist_ok=True)
+        # 출력 파일이 나중에 제자리에서 다시 쓰일 수 있으므로 하드링크 대신 reflink(불가하면 복사)
+        materialize_files([(src, os.path.join(tmp, rel)) for rel, src in files.items()], mode='reflink',
+                          num_workers=num_workers, desc='Storing step cache')
+        with open(os.path.join(tmp, META_NAME), 'w', encoding='utf-8') as f:
+            json.dump({**meta, 'key': key, 'files': sorted(files)}, f, ensure_ascii=False)
+        try:
+            os.rename(tmp, final)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if os.path.exists(os.path.join(final, META_NAME)):
+                # 다른 실행이 같은 키를 먼저 등록한 경우
+                print(f"[INFO] 단계 캐시 이미 저장됨: {final}")
+            else:
+                print(f"[경고] 단계 캐시 저장 실패: {final}, 에러: {e}")
+            return final
+        print(f"[INFO] 단계 캐시 저장: {final} (파일 {len(files)}개)")
+        return final
+
+    def restore(self, key, meta, output_dir, names=None, num_workers=8):
+        """캐시 파일(names 지정 시 그 일부)을 output_dir 아래 같은 상대 경로로 생성하고 생성 통계 반환"""
+        entry = self.path(key)
+        names = meta.get('files', []) if names is None else names
+        for rel in names:
+            os.makedirs(os.path.dirname(os.path.join(output_dir, rel)), exist_ok=True)
+        return materialize_files([(os.path.join(entry, rel), os.path.join(output_dir, rel)) for rel in names],
+                                 mode='reflink', num_workers=num_workers, desc='Restoring step cache')
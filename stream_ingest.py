@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import threading
+import time
+from queue import Empty, Queue
+
+import numpy as np
+
+from eval_engine import predict_raw, postprocess_raw
+
+MOTION_WIDTH = 160  # 움직임 판단용 축소 영상 너비
+END = object()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="카메라/영상 스트림 움직임 기반 탐지")
+    parser.add_argument('--source', type=str, required=True, help='영상 파일, RTSP URL 또는 카메라 번호')
+    parser.add_argument('--model-path', type=str, required=True)
+    parser.add_argument('--output', type=str, default=None, help='추론한 프레임의 탐지 결과 jsonl 경로')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=200,
+                        help='배치가 다 차지 않아도 이 시간이 지나면 추론 (실시간 스트림 지연 제한)')
+    parser.add_argument('--frame-skip', type=int, default=1, help='N번째 프레임마다 하나만 검사 (1: 모든 프레임)')
+    parser.add_argument('--motion-threshold', type=float, default=0.01,
+                        help='변화 픽셀 비율이 이 값 이상이면 움직임으로 판단 (0: 움직임 게이트 끔)')
+    parser.add_argument('--pixel-threshold', type=int, default=25, help='픽셀 변화로 볼 밝기 차이')
+    parser.add_argument('--keyframe-interval', type=int, default=150,
+                        help='움직임이 없어도 검사 프레임 N개마다 한 번은 추론')
+    parser.add_argument('--max-frames', type=int, default=0, help='디코딩할 최대 프레임 수 (0: 끝까지)')
+    parser.add_argument('--conf-threshold', type=float, default=0.25)
+    parser.add_argument('--iou-threshold', type=float, default=0.45)
+    return parser.parse_args()
+
+def open_source(source):
+    import cv2
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        raise IOError(f"스트림을 열 수 없습니다: {source}")
+    return capture
+
+def read_frames(capture, queue, max_frames=0):
+    """디코딩 스레드: (프레임 번호, 타임스탬프 ms, 프레임)을 큐에 넣고 끝나면 END"""
+    import cv2
+    index = 0
+    try:
+        while not max_frames or index < max_frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            queue.put((index, capture.get(cv2.CAP_PROP_POS_MSEC), frame))
+            index += 1
+    finally:
+        capture.release()
+        queue.put(END)
+
+class MotionGate:
+    """직전에 추론한 프레임과 축소 흑백 영상 차이를 비교해서 바뀐 프레임만 통과"""
+
+    def __init__(self, threshold=0.01, pixel_threshold=25, keyframe_interval=150):
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.keyframe_interval = keyframe_interval
+        self.reference = None
+        self.since_keyframe = 0
+
+    def _small(self, frame):
+        import cv2
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (MOTION_WIDTH, max(1, round(h * MOTION_WIDTH / w))), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+    def check(self, frame):
+        """(통과 여부, 변화 픽셀 비율) 반환, 통과한 프레임이 다음 비교 기준이 됨"""
+        small = self._small(frame)
+        self.since_keyframe += 1
+        if self.reference is None or self.threshold <= 0 or self.since_keyframe >= self.keyframe_interval:
+            changed = 1.0
+        else:
+            diff = np.abs(small.astype(np.int16) - self.reference.astype(np.int16))
+            changed = float((diff > self.pixel_threshold).mean())
+        if changed < self.threshold:
+            return False, changed
+        self.reference = small
+        self.since_keyframe = 0
+        return True, changed
+
+def run_stream(model, frames, gate, batch_size=8, max_wait_ms=200, frame_skip=1, imgsz=640,
+               conf_threshold=0.25, iou_threshold=0.45, on_result=None):
+    """큐에서 프레임을 받아 건너뛰기 + 움직임 게이트 후 배치 추론, 처리량 통계 반환"""
+    names = getattr(model, 'names', {}) or {}
+    stats = {'decoded': 0, 'skipped': 0, 'static': 0, 'inferred': 0, 'batches': 0, 'infer_seconds': 0.0}
+    pending = []
+    first_pending = None
+
+    def _flush():
+        if not pending:
+            return
+        t0 = time.perf_counter()
+        raws = predict_raw(model, [frame for _, _, frame in pending], imgsz)
+        stats['infer_seconds'] += time.perf_counter() - t0
+        stats['inferred'] += len(pending)
+        stats['batches'] += 1
+        for (index, timestamp, _), raw in zip(pending, raws):
+            cls, conf, xyxy = postprocess_raw(raw, conf_threshold, iou_threshold)
+            if on_result:
+                on_result({'frame': index, 'timestamp_ms': timestamp, 'detections': [
+                    {'class_id': int(c), 'class_name': names.get(int(c), str(c)), 'confidence': round(float(s), 4),
+                     'bbox': [round(float(v), 1) for v in box]} for c, s, box in zip(cls, conf, xyxy)]})
+        pending.clear()
+
+    start = time.perf_counter()
+    while True:
+        # 대기 중인 배치가 있으면 max_wait_ms까지만 기다리고, 새 프레임이 없어도 시간이 지나면 추론
+        if pending:
+            remaining = max_wait_ms / 1000 - (time.perf_counter() - first_pending)
+            try:
+                item = frames.get(timeout=max(remaining, 0))
+            except Empty:
+                _flush()
+                continue
+        else:
+            item = frames.get()
+        if item is END:
+            break
+        index, timestamp, frame = item
+        stats['decoded'] += 1
+        if index % frame_skip:
+            stats['skipped'] += 1
+            continue
+        passed, _ = gate.check(frame)
+        if not passed:
+            stats['static'] += 1
+        else:
+            if not pending:
+                first_pending = time.perf_counter()
+            pending.append(item)
+        # 배치가 찼거나 첫 프레임이 너무 오래 기다렸으면 추론
+        if pending and (len(pending) >= batch_size or (time.perf_counter() - first_pending) * 1000 >= max_wait_ms):
+            _flush()
+    _flush()
+    elapsed = time.perf_counter() - start
+
+    stats['seconds'] = elapsed
+    stats['decoded_fps'] = stats['decoded'] / elapsed if elapsed > 0 else 0.0
+    stats['inferred_fps'] = stats['inferred'] / elapsed if elapsed > 0 else 0.0
+    stats['inference_ratio'] = stats['inferred'] / stats['decoded'] if stats['decoded'] else 0.0
+    return stats
+
+def main():
+    args = parse_args()
+    from ultralytics import YOLO
+
+    model = YOLO(args.model_path)
+    model.model.to(args.device).float().eval()
+    capture = open_source(args.source)
+    frames = Queue(maxsize=args.batch_size * 4)
+    reader = threading.Thread(target=read_frames, args=(capture, frames, args.max_frames), daemon=True)
+    reader.start()
+
+    gate = MotionGate(args.motion_threshold, args.pixel_threshold, args.keyframe_interval)
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    on_result = (lambda result: output.write(json.dumps(result, ensure_ascii=False) + "\n")) if output else None
+    try:
+        stats = run_stream(model, frames, gate, args.batch_size, args.max_wait_ms, max(1, args.frame_skip),
+                           args.imgsz, args.conf_threshold, args.iou_threshold, on_result)
+    finally:
+        if output:
+            output.close()
+    reader.join()
+
+    print(f"[INFO] 디코딩 {stats['decoded']}프레임 ({stats['decoded_fps']:.1f} fps), "
+          f"추론 {stats['inferred']}프레임 ({stats['inferred_fps']:.1f} fps, {stats['batches']}배치)")
+    print(f"[INFO] 건너뜀 {stats['skipped']}, 움직임 없음 {stats['static']}, "
+          f"추론 비율 {stats['inference_ratio'] * 100:.1f}%, 추론 시간 {stats['infer_seconds']:.2f}s / {stats['seconds']:.2f}s")
+    if args.output:
+        print(f"[완료] 탐지 결과 저장: {os.path.abspath(args.output)}")
+
+if __name__ == "__main__":
+    main()
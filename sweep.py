@@ -0,0 +1,308 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+
+import mlflow
+import pandas as pd
+
+from metrics_logger import AsyncMetricsLogger, ResultsCsvStreamer, metric_key
+from profiler import PROFILE_NAME, Profiler
+from train import add_dataset_args, prepare_dataset, log_dataset
+
+SWEEP_METRIC = 'metrics/mAP50-95(B)'
+POLL_INTERVAL = 10  # 초, 각 trial의 results.csv 확인 주기
+
+# Azure ML Run context
+try:
+    from azureml.core.run import Run
+    azure_run = Run.get_context()
+    IS_AZURE_RUN = not isinstance(azure_run, str)
+except:
+    azure_run = None
+    IS_AZURE_RUN = False
+
+metrics_logger = AsyncMetricsLogger(azure_run if IS_AZURE_RUN else None)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="한 노드에서 여러 학습 trial을 동시에 돌리고 successive halving으로 조기 종료")
+    parser.add_argument("--model_path", type=str, default="yolov8n.pt")
+    parser.add_argument("--data-folder", type=str, required=False)
+    parser.add_argument("--output-dir", type=str, required=False)
+    parser.add_argument("--epochs", type=int, default=30, help="trial당 최대 에포크 (모든 trial의 LR 스케줄 기준)")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--lr0", type=float, nargs='+', default=[0.0005, 0.001, 0.005, 0.01])
+    parser.add_argument("--momentum", type=float, nargs='+', default=[0.9, 0.937])
+    parser.add_argument("--batch", type=int, nargs='+', default=[16, 32])
+    parser.add_argument("--num-trials", type=int, default=0,
+                        help="탐색 공간(조합 전체)에서 무작위로 고를 trial 수 (0: 전체 조합)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-concurrent", type=int, default=2, help="동시에 학습할 trial 수")
+    parser.add_argument("--devices", type=str, default="0",
+                        help="trial에 순서대로 배정할 장치 목록 (예: '0,1' 또는 'cpu')")
+    parser.add_argument("--metric", type=str, default=SWEEP_METRIC, help="results.csv에서 비교할 열")
+    parser.add_argument("--grace-epochs", type=int, default=3, help="첫 번째 판정 에포크 (이전에는 중단하지 않음)")
+    parser.add_argument("--reduction-factor", type=int, default=3,
+                        help="판정 에포크마다 상위 1/N만 계속 학습 (판정 에포크: grace * N^k)")
+    # 분할/letterbox/중복 제거/패킹 옵션은 train.py와 동일 (trial 수만큼 파일을 복사하지 않도록 기본은 list)
+    add_dataset_args(parser, split_mode="list")
+    parser.add_argument("--trial-config", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.trial_config is None and (args.data_folder is None or args.output_dir is None):
+        parser.error("--data-folder와 --output-dir가 필요합니다")
+    return args
+
+def build_trials(args):
+    """하이퍼파라미터 조합 목록을 seed 기준으로 섞어서 반환 (num_trials가 있으면 그 수만큼)
+    (격자 순서대로 시작하면 먼저 끝난 trial들이 한쪽 영역에 몰려서 판정 기준이 치우침)"""
+    grid = [{'lr0': lr0, 'momentum': momentum, 'batch': batch}
+            for lr0, momentum, batch in itertools.product(args.lr0, args.momentum, args.batch)]
+    random.Random(args.seed).shuffle(grid)
+    if args.num_trials > 0:
+        grid = grid[:args.num_trials]
+    return grid
+
+def rung_epochs(grace_epochs, reduction_factor, max_epochs):
+    """successive halving 판정 에포크 목록 (grace, grace*eta, grace*eta^2, ... < max_epochs)"""
+    rungs = []
+    epoch = max(1, grace_epochs)
+    while epoch < max_epochs:
+        rungs.append(epoch)
+        epoch *= max(2, reduction_factor)
+    return rungs
+
+class SuccessiveHalving:
+    """비동기 successive halving (ASHA): 판정 에포크에 도달한 trial이 지금까지 같은 에포크에 도달한 trial 중
+    상위 1/eta가 아니면 중단"""
+
+    def __init__(self, rungs, reduction_factor):
+        self.rungs = rungs
+        self.eta = max(2, reduction_factor)
+        self.recorded = {epoch: {} for epoch in rungs}
+
+    def report(self, trial_id, epoch, value):
+        """trial의 epoch 결과를 기록하고 계속 학습할지 반환"""
+        if epoch not in self.recorded:
+            return True
+        scores = self.recorded[epoch]
+        scores[trial_id] = value
+        if len(scores) < self.eta:
+            return True  # 비교 대상이 적을 때는 계속
+        ranked = sorted(scores.values(), reverse=True)
+        cutoff = ranked[max(0, len(ranked) // self.eta - 1)]
+        return value >= cutoff
+
+def run_trial(config_path):
+    """trial 하위 프로세스: 설정 파일대로 학습 (최대 에포크까지, 중단은 상위 프로세스가 결정)"""
+    from ultralytics import YOLO
+    from pack_dataset import packed_trainer
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    model = YOLO(config['model_path'])
+    model.train(
+        trainer=packed_trainer(config['packed_dir']) if config.get('packed_dir') else None,
+        data=config['data'],
+        epochs=config['epochs'],
+        imgsz=config['imgsz'],
+        batch=config['batch'],
+        lr0=config['lr0'],
+        momentum=config['momentum'],
+        project=config['project'],
+        name=config['name'],
+        exist_ok=True,
+        device=config['device'],
+        workers=config['workers'],
+        patience=config['epochs'],  # 조기 종료는 sweep이 담당
+        plots=False,
+        verbose=False,
+    )
+
+class Trial:
+    def __init__(self, trial_id, params, trial_dir):
+        self.id = trial_id
+        self.params = params
+        self.dir = trial_dir
+        self.results_csv = os.path.join(trial_dir, 'results.csv')
+        self.proc = None
+        self.slot = None
+        self.status = 'pending'
+        self.history = {}  # epoch -> metric
+        self.streamer = ResultsCsvStreamer(metrics_logger, prefix=f"trial_{trial_id:03d}/")
+
+    def start(self, args, data_yaml, device, workers):
+        os.makedirs(self.dir, exist_ok=True)
+        config_path = os.path.join(self.dir, 'trial.json')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump({**self.params, 'model_path': args.model_path, 'data': data_yaml, 'epochs': args.epochs,
+                       'imgsz': args.imgsz, 'project': os.path.dirname(self.dir), 'name': os.path.basename(self.dir),
+                       'device': device, 'workers': workers, 'packed_dir': args.packed_dir}, f, indent=2)
+        log = open(os.path.join(self.dir, 'train.log'), 'w')
+        self.proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--trial-config', config_path],
+                                     stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+        self.status = 'running'
+        print(f"[INFO] trial {self.id:03d} 시작 ({device}): {self.params}")
+
+    def poll(self, metric):
+        """results.csv에서 새로 끝난 에포크의 metric 목록 [(epoch, 값)]"""
+        if not os.path.exists(self.results_csv):
+            return []
+        try:
+            df = pd.read_csv(self.results_csv)
+        except (pd.errors.EmptyDataError, pd.errors.ParserError):
+            return []  # 학습 프로세스가 쓰는 중
+        df.columns = [c.strip() for c in df.columns]
+        if metric not in df.columns:
+            return []
+        df = df.dropna(subset=[metric])
+        # 위에서 읽은 완성된 행만 스트리머로 넘김 (쓰는 중인 파일을 다시 읽지 않음)
+        self.streamer.poll(df=df)
+        new = []
+        for epoch, value in zip(df['epoch'].astype(int), df[metric].astype(float)):
+            if epoch not in self.history:
+                self.history[epoch] = value
+                new.append((epoch, value))
+        return new
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+
+    @property
+    def best(self):
+        return max(self.history.values()) if self.history else float('-inf')
+
+    def summary(self):
+        return {'id': self.id, **self.params, 'status': self.status, 'epochs_run': len(self.history),
+                'best_metric': self.best if self.history else None, 'dir': self.dir}
+
+def run_sweep(args, data_yaml):
+    trials = [Trial(i, params, os.path.join(args.output_dir, 'trials', f"trial_{i:03d}"))
+              for i, params in enumerate(build_trials(args))]
+    rungs = rung_epochs(args.grace_epochs, args.reduction_factor, args.epochs)
+    scheduler = SuccessiveHalving(rungs, args.reduction_factor)
+    devices = [d.strip() for d in args.devices.split(',') if d.strip()]
+    workers = max(1, (os.cpu_count() or 1) // max(1, args.max_concurrent))
+    print(f"[INFO] trial {len(trials)}개, 동시 {args.max_concurrent}개, 판정 에포크 {rungs} (상위 1/{scheduler.eta} 유지)")
+
+    pending = list(trials)
+    running = []
+    slots = list(range(args.max_concurrent))  # 빈 장치 슬롯
+    start = time.perf_counter()
+    try:
+        while pending or running:
+            while pending and slots:
+                trial = pending.pop(0)
+                trial.slot = slots.pop(0)
+                trial.start(args, data_yaml, devices[trial.slot % len(devices)], workers)
+                running.append(trial)
+
+            time.sleep(POLL_INTERVAL)
+            for trial in list(running):
+                # ultralytics results.csv의 epoch는 1부터 시작
+                for epoch, value in trial.poll(args.metric):
+                    if not scheduler.report(trial.id, epoch, value):
+                        print(f"[INFO] trial {trial.id:03d} 중단: epoch {epoch} {args.metric}={value:.4f}")
+                        trial.stop()
+                        trial.status = 'pruned'
+                        break
+                if trial.status == 'running' and trial.proc.poll() is not None:
+                    trial.poll(args.metric)  # 종료 직전 기록된 에포크
+                    trial.status = 'completed' if trial.proc.returncode == 0 else 'failed'
+                    if trial.status == 'failed':
+                        print(f"[ERROR] trial {trial.id:03d} 실패 (종료 코드 {trial.proc.returncode}), "
+                              f"로그: {os.path.join(trial.dir, 'train.log')}")
+                if trial.status != 'running':
+                    running.remove(trial)
+                    slots.append(trial.slot)
+                    print(f"[INFO] trial {trial.id:03d} {trial.status}: {len(trial.history)} 에포크, "
+                          f"best {args.metric}={trial.best:.4f}")
+    finally:
+        # 예외/중단(Ctrl+C, 작업 취소)으로 빠져나와도 학습 하위 프로세스가 GPU를 붙잡고 남지 않도록 종료
+        for trial in running:
+            if trial.status == 'running':
+                print(f"[경고] trial {trial.id:03d} 종료 (sweep 중단)")
+                trial.stop()
+                trial.status = 'stopped'
+    elapsed = time.perf_counter() - start
+
+    full_epochs = len(trials) * args.epochs
+    run_epochs = sum(len(t.history) for t in trials)
+    summary = {
+        'metric': args.metric,
+        'rungs': rungs,
+        'reduction_factor': scheduler.eta,
+        'seconds': elapsed,
+        'epochs_run': run_epochs,
+        'epochs_saved': full_epochs - run_epochs,
+        'trials': [t.summary() for t in trials],
+    }
+    print(f"[INFO] sweep 완료 ({elapsed:.0f}s): 에포크 {run_epochs}/{full_epochs} 실행 "
+          f"({summary['epochs_saved']} 에포크 절약)")
+    return trials, summary
+
+def main():
+    args = parse_args()
+    if args.trial_config:
+        run_trial(args.trial_config)
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    # 모든 trial이 함께 쓰는 데이터셋을 train.py와 같은 경로로 한 번만 준비
+    profiler = Profiler('sweep')
+    dataset = prepare_dataset(args, os.path.join(args.output_dir, 'dataset'), profiler)
+    data_yaml = dataset['data_yaml_path']
+
+    mlflow.start_run()
+    metrics_logger.log_param("model_path", args.model_path)
+    metrics_logger.log_param("epochs", args.epochs)
+    metrics_logger.log_param("sweep_metric", args.metric)
+    log_dataset(dataset, args, metrics_logger.log_param, metrics_logger.log_metric)
+
+    trials, summary = run_sweep(args, data_yaml)
+    with open(os.path.join(args.output_dir, 'sweep.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    mlflow.log_artifact(os.path.join(args.output_dir, 'sweep.json'))
+    for trial in trials:
+        metrics_logger.log_metric(f"trial_{trial.id:03d}/best_{metric_key(args.metric)}", trial.best if trial.history else 0.0)
+    metrics_logger.log_metric("sweep_epochs_saved", summary['epochs_saved'])
+
+    finished = [t for t in trials if t.history and os.path.exists(os.path.join(t.dir, 'weights', 'best.pt'))]
+    if not finished:
+        print("[ERROR] best.pt가 있는 trial이 없습니다.")
+    else:
+        best = max(finished, key=lambda t: t.best)
+        print(f"[INFO] 최고 trial {best.id:03d}: {best.params}, {args.metric}={best.best:.4f}")
+        for key, value in best.params.items():
+            metrics_logger.log_param(f"best_{key}", value)
+        metrics_logger.log_param("best_trial", best.id)
+        metrics_logger.log_metric(f"best_{metric_key(args.metric)}", best.best)
+
+        # train.py와 같은 위치(final/best.pt)에 저장해서 평가/배포 단계가 그대로 사용
+        final_dir = os.path.join(args.output_dir, 'final')
+        os.makedirs(final_dir, exist_ok=True)
+        shutil.copy(os.path.join(best.dir, 'weights', 'best.pt'), os.path.join(final_dir, 'best.pt'))
+        shutil.copy(best.results_csv, os.path.join(final_dir, 'results.csv'))
+        mlflow.log_artifacts(final_dir, artifact_path="model")
+        if IS_AZURE_RUN:
+            azure_run.upload_file(name="best.pt", path_or_stream=os.path.join(final_dir, 'best.pt'))
+
+    profiler.log(metrics_logger.log_metric, profiler.save(args.output_dir))
+    mlflow.log_artifact(os.path.join(args.output_dir, PROFILE_NAME))
+
+    metrics_logger.close()
+    mlflow.end_run()
+    print(f"[완료] sweep 결과: {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import time
+
+import numpy as np
+
+from eval_engine import (SIZE_RANGES, box_iou, evaluate_detections, forward_raw, iter_batches, nms,
+                         preprocess_image, summarize, yolo_to_xyxy)
+
+TILE_SIZE = 640
+TILE_OVERLAP = 0.2
+TILE_MERGE_MODES = ('nms', 'wbf')
+MAX_TILE_BATCH = 32  # 한 번의 forward에 넣을 최대 타일 수
+
+def tile_origins(length, tile_size, overlap):
+    """길이 length를 overlap 비율만큼 겹치는 tile_size 구간으로 나눈 시작 좌표 (마지막 타일은 끝에 맞춤)"""
+    if length <= tile_size:
+        return [0]
+    stride = max(1, int(tile_size * (1 - overlap)))
+    origins = list(range(0, length - tile_size, stride))
+    return origins + [length - tile_size]
+
+def make_tiles(im, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, include_full=True):
+    """이미지를 겹치는 타일로 자르고 [(x0, y0, 타일)] 반환 (include_full이면 전체 이미지도 포함해서 큰 객체 보존)"""
+    h, w = im.shape[:2]
+    tiles = [(x0, y0, im[y0:y0 + tile_size, x0:x0 + tile_size])
+             for y0 in tile_origins(h, tile_size, overlap) for x0 in tile_origins(w, tile_size, overlap)]
+    if include_full and len(tiles) > 1:
+        tiles.append((0, 0, im))
+    return tiles
+
+def predict_tiled(model, images, imgsz=640, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, forward=forward_raw,
+                  min_conf=0.001, max_batch=MAX_TILE_BATCH):
+    """여러 이미지의 타일 전체를 묶어서 배치 추론하고 이미지별 NMS 전 후보 [K, 6] (원본 좌표) 반환"""
+    jobs = []  # (이미지 번호, x0, y0, 전처리 결과)
+    for i, im in enumerate(images):
+        for x0, y0, tile in make_tiles(im, tile_size, overlap):
+            jobs.append((i, x0, y0, preprocess_image(tile, imgsz)))
+
+    outputs = [[] for _ in images]
+    for start in range(0, len(jobs), max_batch):
+        chunk = jobs[start:start + max_batch]
+        raws = forward(model, np.stack([x for _, _, _, (x, _) in chunk]), [meta for _, _, _, (_, meta) in chunk],
+                       min_conf)
+        for (i, x0, y0, _), raw in zip(chunk, raws):
+            raw[:, [0, 2]] += x0
+            raw[:, [1, 3]] += y0
+            outputs[i].append(raw)
+    return [np.concatenate(parts) if parts else np.zeros((0, 6), np.float32) for parts in outputs]
+
+def merge_boxes(raw, conf_threshold, iou_threshold, mode='nms'):
+    """타일 경계에서 중복된 후보를 NMS 또는 WBF(가중 박스 평균)로 합쳐서 (cls, conf, xyxy) 반환"""
+    raw = raw[raw[:, 4] >= conf_threshold]
+    keep = nms(raw[:, :4], raw[:, 4], raw[:, 5], iou_threshold)
+    if mode != 'wbf' or len(keep) == 0:
+        raw = raw[keep]
+        return raw[:, 5].astype(np.int64), raw[:, 4].astype(np.float64), raw[:, :4].astype(np.float64)
+
+    # 각 후보를 같은 클래스에서 IoU가 가장 큰 대표 박스(NMS 생존 박스)에 배정한 뒤 신뢰도 가중 평균
+    iou = box_iou(raw[keep, :4], raw[:, :4]) * (raw[keep, 5][:, None] == raw[:, 5][None, :])
+    owner = iou.argmax(axis=0)
+    member = iou[owner, np.arange(len(raw))] > iou_threshold
+    member[keep] = True
+    owner[keep] = np.arange(len(keep))
+    owner, boxes = owner[member], raw[member]
+    weights = boxes[:, 4].astype(np.float64)
+    fused = np.zeros((len(keep), 4))
+    np.add.at(fused, owner, boxes[:, :4] * weights[:, None])
+    total = np.bincount(owner, weights=weights, minlength=len(keep))
+    # 신뢰도는 묶음 내 최대값(대표 박스) 유지: 타일 경계에서 잘린 낮은 점수 박스 때문에 점수가 깎이지 않도록
+    return raw[keep, 5].astype(np.int64), raw[keep, 4].astype(np.float64), fused / total[:, None]
+
+def evaluate_tiled(model, samples, conf_threshold=0.25, iou_threshold=0.45, imgsz=640, tile_size=TILE_SIZE,
+                   overlap=TILE_OVERLAP, merge='nms', batch_size=4, num_workers=8, forward=forward_raw):
+    """같은 테스트셋에서 전체 이미지 추론과 타일 추론의 정확도/이미지당 지연시간 비교"""
+    class_names = getattr(model, 'names', {}) or {}
+    modes = ('whole', 'tiled')
+    records = {m: {'all': [], **{size: [] for size in SIZE_RANGES}} for m in modes}
+    seconds = {m: 0.0 for m in modes}
+    n_images = n_tiles = 0
+    for batch in iter_batches(samples, samples.names, batch_size, num_workers):
+        batch = [item for item in batch if item[1] is not None]
+        if not batch:
+            continue
+        images = [im for _, im, _ in batch]
+
+        t0 = time.perf_counter()
+        prepared = [preprocess_image(im, imgsz) for im in images]
+        whole = [merge_boxes(raw, conf_threshold, iou_threshold, 'nms') for raw in
+                 forward(model, np.stack([x for x, _ in prepared]), [meta for _, meta in prepared], conf_threshold)]
+        t1 = time.perf_counter()
+        tiled = [merge_boxes(raw, conf_threshold, iou_threshold, merge) for raw in
+                 predict_tiled(model, images, imgsz, tile_size, overlap, forward, conf_threshold)]
+        t2 = time.perf_counter()
+        seconds['whole'] += t1 - t0
+        seconds['tiled'] += t2 - t1
+
+        for (name, im, labels), *preds in zip(batch, whole, tiled):
+            h, w = im.shape[:2]
+            gt_cls, gt_boxes = yolo_to_xyxy(labels, w, h)
+            for m, pred in zip(modes, preds):
+                for key, record in evaluate_detections(pred, gt_cls, gt_boxes).items():
+                    records[m][key].append(record)
+            n_tiles += len(make_tiles(im, tile_size, overlap))
+        n_images += len(batch)
+
+    comparison = {'settings': {'imgsz': imgsz, 'tile_size': tile_size, 'overlap': overlap, 'merge': merge,
+                               'tiles_per_image': n_tiles / n_images if n_images else 0.0}}
+    for m in modes:
+        overall, per_class = summarize(records[m]['all'], class_names)
+        comparison[m] = {
+            **overall,
+            'per_class': per_class,
+            'per_size': {size: summarize(records[m][size], class_names)[0] for size in SIZE_RANGES},
+            'ms_per_image': seconds[m] * 1000 / n_images if n_images else 0.0,
+        }
+        print(f"[INFO] {m:<5}: mAP50 {overall['mAP50']:.4f}, mAP50-95 {overall['mAP50-95']:.4f}, "
+              f"small mAP50 {comparison[m]['per_size']['small']['mAP50']:.4f}, "
+              f"{comparison[m]['ms_per_image']:.1f}ms/img")
+    comparison['num_images'] = n_images
+    return comparison
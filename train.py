@@ -1,4 +1,6 @@
 import argparse
+import hashlib
+import json
 import yaml
 import shutil
 import pandas as pd
@@ -8,6 +10,19 @@ import mlflow
 import os
 from sklearn.model_selection import train_test_split
 import glob
+from label_stats import get_file_label_stats, print_label_stats, log_label_stats
+from pack_dataset import PackedDataset, write_split_lists, packed_label_stats, packed_trainer
+from letterbox_cache import LETTERBOX_MODES, build_letterbox_dataset
+from metrics_logger import AsyncMetricsLogger, ResultsCsvStreamer
+from profiler import PROFILE_NAME, Profiler
+from step_cache import StepCache, default_cache_dir, step_fingerprint, tree_digest
+from dedup import dedup_dataset
+from coco2yolo import CLASS_NAMES as COCO_CLASS_NAMES
+
+SPLIT_MODES = ('copy', 'list', 'symlink')
+SPLIT_METHODS = ('hash', 'random')
+CLASS_NAMES = dict(enumerate(COCO_CLASS_NAMES))  # coco2yolo가 기록하는 class id 순서
+SPLIT_MARKER = 'split.json'  # 출력 폴더의 분할 결과 지문
 
 # Azure ML Run context
 try:
@@ -18,15 +33,34 @@ except:
     azure_run = None
     IS_AZURE_RUN = False
 
+# param/metric은 백그라운드 스레드에서 묶어서 전송 (MLflow + Azure run)
+metrics_logger = AsyncMetricsLogger(azure_run if IS_AZURE_RUN else None)
+
 def log_param(key, value):
-    mlflow.log_param(key, value)
-    if IS_AZURE_RUN:
-        azure_run.log(key, value)
+    metrics_logger.log_param(key, value)
 
 def log_metric(key, value):
-    mlflow.log_metric(key, value)
-    if IS_AZURE_RUN:
-        azure_run.log(key, value)
+    metrics_logger.log_metric(key, value)
+
+def add_dataset_args(parser, split_mode="copy"):
+    """데이터 준비(prepare_dataset) 옵션 (train.py, sweep.py 공용)"""
+    parser.add_argument("--split-mode", type=str, default=split_mode, choices=SPLIT_MODES,
+                        help="copy: 분할별로 파일 복사, list: 이미지 경로 목록(.txt)만 생성, symlink: 심볼릭 링크 트리 생성")
+    parser.add_argument("--split-method", type=str, default="hash", choices=SPLIT_METHODS,
+                        help="hash: 파일명 해시로 고정 분할 (이미지가 추가돼도 기존 분할 유지), random: train_test_split")
+    parser.add_argument("--cache-dir", type=str,
+                        default=default_cache_dir(),
+                        help="실행 간 재사용하는 캐시 폴더 (라벨 통계, 분할 목록 등)")
+    parser.add_argument("--no-step-cache", action="store_true",
+                        help="입력 지문이 같아도 분할을 항상 다시 계산")
+    parser.add_argument("--packed-dir", type=str, default=None,
+                        help="pack_dataset.py로 만든 패킹 데이터셋 폴더 (지정하면 개별 파일 대신 mmap 샤드에서 읽음)")
+    parser.add_argument("--letterbox-cache", action="store_true",
+                        help="이미지를 --imgsz로 미리 변환해서 --cache-dir에 저장하고 재사용 (에포크마다 원본 디코딩/리사이즈 생략)")
+    parser.add_argument("--letterbox-mode", type=str, default="letterbox", choices=LETTERBOX_MODES,
+                        help="letterbox: 정사각형 패딩, resize: 비율 유지 리사이즈만")
+    parser.add_argument("--dedup-threshold", type=int, default=0,
+                        help="지각 해시 해밍 거리가 이 값 이하인 거의 같은 이미지를 분할 전에 제외 (0: 사용 안 함, 권장 4~8)")
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -38,148 +72,313 @@ def parse_args():
     parser.add_argument("--batch", type=int, default=32)
     parser.add_argument("--lr0", type=float, default=0.001)
     parser.add_argument("--momentum", type=float, default=0.937)
+    add_dataset_args(parser)
     return parser.parse_args()
 
-def split_and_prepare_yolo_dataset(data_folder, output_dir, val_ratio=0.1, test_ratio=0.1):
-    images_dir = os.path.join(data_folder, 'images')
-    labels_dir = os.path.join(data_folder, 'labels')
+def hash_split(stem, val_ratio=0.1, test_ratio=0.1):
+    """파일명(stem) 해시로 분할 결정 (다른 파일이 추가/삭제돼도 결과가 바뀌지 않음)"""
+    u = int.from_bytes(hashlib.sha1(stem.encode('utf-8')).digest()[:8], 'big') / 2 ** 64
+    if u < 1 - val_ratio - test_ratio:
+        return 'train'
+    if u < 1 - test_ratio:
+        return 'valid'
+    return 'test'
+
+def _is_current(src, entry, mode):
+    """분할 폴더에 이미 있는 파일(entry)이 src와 같은지 확인"""
+    if entry is None:
+        return False
+    if mode == 'symlink':
+        return entry.is_symlink() and os.readlink(entry.path) == os.path.abspath(src)
+    st = entry.stat(follow_symlinks=False)
+    src_st = os.stat(src)
+    return st.st_size == src_st.st_size and abs(st.st_mtime - src_st.st_mtime) < 1
+
+def _place_file(src, dst, mode):
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if mode == 'symlink':
+        os.symlink(os.path.abspath(src), dst)
+    else:
+        # mtime을 유지해야 다음 실행에서 변경 여부를 비교할 수 있음
+        shutil.copy2(src, dst)
 
-    image_files = sorted(glob.glob(os.path.join(images_dir, '*.jpg')) + glob.glob(os.path.join(images_dir, '*.png')))
-    label_files = [os.path.join(labels_dir, os.path.splitext(os.path.basename(f))[0] + '.txt') for f in image_files]
+def _sync_split_dir(files, split_dir, mode):
+    """분할 폴더를 files와 같게 맞춤 (새 파일만 생성, 빠진 파일은 제거) 후 (생성, 유지, 제거) 개수 반환"""
+    existing = {entry.name: entry for entry in os.scandir(split_dir)}
+    wanted = {os.path.basename(f) for f in files}
+    removed = 0
+    for name, entry in existing.items():
+        if name not in wanted:
+            os.remove(entry.path)
+            removed += 1
+    placed = 0
+    for f in files:
+        name = os.path.basename(f)
+        if not _is_current(f, existing.get(name), mode):
+            _place_file(f, os.path.join(split_dir, name), mode)
+            placed += 1
+    return placed, len(files) - placed, removed
 
+def plan_splits(image_files, label_files, val_ratio=0.1, test_ratio=0.1, method='hash'):
+    """이미지/라벨 경로 목록을 {'train'|'valid'|'test': (이미지 목록, 라벨 목록)}으로 분할"""
     n = len(image_files)
-    print(f"[INFO] Found {n} images in {images_dir}")
-    
-    # 라벨 파일 내용 확인
-    print("[DEBUG] Checking data folder structure:")
-    print(f"[DEBUG] Images dir: {images_dir} (exists: {os.path.exists(images_dir)})")
-    print(f"[DEBUG] Labels dir: {labels_dir} (exists: {os.path.exists(labels_dir)})")
-    print(f"[DEBUG] Images in directory: {len(image_files)}")
-    print(f"[DEBUG] Labels in directory: {len(label_files)}")
-    
-    # 라벨 파일 샘플 확인
-    valid_labels = 0
-    class_counts = {}
-    for i, label_file in enumerate(label_files[:5]):  # 처음 5개만 확인
-        if os.path.exists(label_file):
-            valid_labels += 1
-            try:
-                with open(label_file, 'r') as f:
-                    content = f.read().strip()
-                    if content:
-                        lines = content.split('\n')
-                        print(f"[DEBUG] Label file {i+1}: {os.path.basename(label_file)}")
-                        print(f"[DEBUG] Content: {content}")
-                        for line in lines:
-                            if line.strip():
-                                parts = line.strip().split()
-                                if len(parts) >= 5:
-                                    class_id = int(parts[0])
-                                    class_counts[class_id] = class_counts.get(class_id, 0) + 1
-            except Exception as e:
-                print(f"[ERROR] Error reading {label_file}: {e}")
-    
-    print(f"[DEBUG] Valid label files: {valid_labels}/{len(label_files[:5])}")
-    print(f"[DEBUG] Class distribution in sample: {class_counts}")
-    
     if n < 3:
         # 데이터가 3장 미만이면 모두 train에 할당
         print(f"[WARNING] Only {n} images found. All images will be used for training.")
-        splits = {
+        return {
             'train': (image_files, label_files),
             'valid': ([], []),
             'test': ([], [])
         }
-    else:
-        # split
-        valtest_ratio = val_ratio + test_ratio
-        train_imgs, valtest_imgs, train_lbls, valtest_lbls = train_test_split(
-            image_files, label_files, test_size=valtest_ratio, random_state=42
+    if method == 'hash':
+        splits = {'train': ([], []), 'valid': ([], []), 'test': ([], [])}
+        for img, lbl in zip(image_files, label_files):
+            imgs, lbls = splits[hash_split(os.path.splitext(os.path.basename(img))[0], val_ratio, test_ratio)]
+            imgs.append(img)
+            lbls.append(lbl)
+        return splits
+
+    # split
+    valtest_ratio = val_ratio + test_ratio
+    train_imgs, valtest_imgs, train_lbls, valtest_lbls = train_test_split(
+        image_files, label_files, test_size=valtest_ratio, random_state=42
+    )
+    if test_ratio > 0 and len(valtest_imgs) > 1:
+        val_size = val_ratio / valtest_ratio
+        val_imgs, test_imgs, val_lbls, test_lbls = train_test_split(
+            valtest_imgs, valtest_lbls, test_size=(1 - val_size), random_state=42
         )
-        if test_ratio > 0 and len(valtest_imgs) > 1:
-            val_size = val_ratio / valtest_ratio
-            val_imgs, test_imgs, val_lbls, test_lbls = train_test_split(
-                valtest_imgs, valtest_lbls, test_size=(1 - val_size), random_state=42
-            )
-        else:
-            val_imgs, test_imgs, val_lbls, test_lbls = valtest_imgs, [], valtest_lbls, []
-        splits = {
-            'train': (train_imgs, train_lbls),
-            'valid': (val_imgs, val_lbls),
-            'test': (test_imgs, test_lbls)
-        }
+    else:
+        val_imgs, test_imgs, val_lbls, test_lbls = valtest_imgs, [], valtest_lbls, []
+    return {
+        'train': (train_imgs, train_lbls),
+        'valid': (val_imgs, val_lbls),
+        'test': (test_imgs, test_lbls)
+    }
+
+def _split_outputs(output_dir, mode):
+    if mode == 'list':
+        return {split: os.path.join(output_dir, f'{split}.txt') for split in ('train', 'valid', 'test')}
+    return {split: os.path.join(output_dir, split, 'images') for split in ('train', 'valid', 'test')}
+
+def _load_split_marker(output_dir):
+    try:
+        with open(os.path.join(output_dir, SPLIT_MARKER), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _outputs_match(outputs, split_names, images_dir, mode):
+    """기존 분할 출력이 split_names({분할: 이미지 이름 목록})와 같고 가리키는 파일이 모두 있는지 확인"""
+    try:
+        if mode == 'list':
+            for split, names in split_names.items():
+                with open(outputs[split], 'r') as f:
+                    listed = [line.strip() for line in f if line.strip()]
+                if listed != [os.path.abspath(os.path.join(images_dir, name)) for name in names]:
+                    return False
+                if not all(os.path.exists(path) for path in listed):
+                    return False
+            return True
+        for split, names in split_names.items():
+            split_dir = outputs[split]
+            if set(os.listdir(split_dir)) != set(names):
+                return False
+            # symlink 모드는 링크 대상이 지워졌을 수 있으므로 따라가서 확인
+            if not all(os.path.exists(os.path.join(split_dir, name)) for name in names):
+                return False
+        return True
+    except OSError:
+        return False
+
+def _write_splits(splits, labels_dir, output_dir, mode):
+    """분할 결과를 mode에 맞게 출력 폴더에 기록하고 분할별 경로 반환"""
+    if mode == 'list':
+        # 원본 images/labels를 그대로 두고 분할별 이미지 경로 목록만 기록
+        # (YOLO는 경로의 /images/를 /labels/로 바꿔서 라벨을 찾음)
+        os.makedirs(output_dir, exist_ok=True)
+        existing_labels = set(os.listdir(labels_dir)) if os.path.isdir(labels_dir) else set()
+        list_paths = {}
+        for split, (imgs, lbls) in splits.items():
+            list_paths[split] = os.path.join(output_dir, f'{split}.txt')
+            print(f"[INFO] Writing {len(imgs)} image paths to {split}.txt")
+            with open(list_paths[split], 'w') as f:
+                f.writelines(os.path.abspath(img) + '\n' for img in imgs)
+            for lbl in lbls:
+                if os.path.basename(lbl) not in existing_labels:
+                    print(f"[경고] 라벨 파일 없음: {lbl}")
+        return list_paths
 
     for split, (imgs, lbls) in splits.items():
         split_img_dir = os.path.join(output_dir, split, 'images')
         split_lbl_dir = os.path.join(output_dir, split, 'labels')
         os.makedirs(split_img_dir, exist_ok=True)
         os.makedirs(split_lbl_dir, exist_ok=True)
-        print(f"[INFO] Copying {len(imgs)} images to {split}/images")
-        for img, lbl in zip(imgs, lbls):
-            shutil.copy(img, os.path.join(split_img_dir, os.path.basename(img)))
-            if os.path.exists(lbl):
-                shutil.copy(lbl, os.path.join(split_lbl_dir, os.path.basename(lbl)))
-            else:
-                print(f"[경고] 라벨 파일 없음: {lbl}")
+        existing_lbls = [lbl for lbl in lbls if os.path.exists(lbl)]
+        for lbl in set(lbls) - set(existing_lbls):
+            print(f"[경고] 라벨 파일 없음: {lbl}")
+        placed, kept, removed = _sync_split_dir(imgs, split_img_dir, mode)
+        _sync_split_dir(existing_lbls, split_lbl_dir, mode)
+        action = 'Linked' if mode == 'symlink' else 'Copied'
+        print(f"[INFO] {action} {placed} images to {split}/images ({kept} unchanged, {removed} removed)")
 
-    return {
-        'train': os.path.join(output_dir, 'train', 'images'),
-        'valid': os.path.join(output_dir, 'valid', 'images'),
-        'test': os.path.join(output_dir, 'test', 'images')
-    }
+    return _split_outputs(output_dir, mode)
 
-def main():
-    args = parse_args()
-    print(f"[INFO] Using model: {args.model_path}")
-    print(f"[INFO] Using dataset: {args.data_folder}")
-    print(f"[INFO] Output dir: {args.output_dir}")
+def split_image_names(split_path):
+    """분할 출력(목록 파일 또는 images 폴더)에 들어 있는 이미지 파일 이름"""
+    if os.path.isfile(split_path):
+        with open(split_path, 'r') as f:
+            return [os.path.basename(line.strip()) for line in f if line.strip()]
+    return sorted(os.listdir(split_path))
 
-    # === [1] 데이터 분할 및 폴더 생성 ===
-    split_dirs = split_and_prepare_yolo_dataset(args.data_folder, args.output_dir, val_ratio=0.1, test_ratio=0.1)
+def split_and_prepare_yolo_dataset(data_folder, output_dir, val_ratio=0.1, test_ratio=0.1, mode='copy', method='hash',
+                                   cache_dir=None, extra_inputs=None, exclude=None):
+    images_dir = os.path.join(data_folder, 'images')
+    labels_dir = os.path.join(data_folder, 'labels')
+    # exclude: 분할 전에 뺄 이미지 stem (중복 제거 결과 등)
+    exclude = set(exclude or ())
+    if exclude:
+        extra_inputs = {**(extra_inputs or {}),
+                        'exclude': hashlib.sha1('\n'.join(sorted(exclude)).encode('utf-8')).hexdigest()}
+
+    # 입력 지문(이미지 목록, 분할 비율/방식)이 같으면 이전 분할 결과를 재사용
+    splits = key = None
+    if cache_dir:
+        cache = StepCache(cache_dir, 'split')
+        key = step_fingerprint('split', images=tree_digest(images_dir), labels=tree_digest(labels_dir),
+                               val_ratio=val_ratio, test_ratio=test_ratio, method=method, **(extra_inputs or {}))
+        cached = cache.lookup(key)
+        marker = _load_split_marker(output_dir)
+        outputs = _split_outputs(output_dir, mode)
+        # 지문이 같아도 출력 폴더가 바뀌었을 수 있으므로 캐시된 분할 목록과 실제 출력을 비교한 뒤 생략
+        if (cached is not None
+                and marker == {'fingerprint': key, 'mode': mode, 'data_folder': os.path.abspath(data_folder)}
+                and _outputs_match(outputs, cached['splits'], images_dir, mode)):
+            print(f"[INFO] 분할 결과가 최신입니다 ({key[:16]}), 분할 생략")
+            return outputs
+        if cached is not None:
+            print(f"[INFO] 단계 캐시 적중: {key[:16]} (분할 목록 재사용)")
+            splits = {split: ([os.path.join(images_dir, name) for name in names],
+                              [os.path.join(labels_dir, os.path.splitext(name)[0] + '.txt') for name in names])
+                      for split, names in cached['splits'].items()}
+
+    if splits is None:
+        image_files = sorted(glob.glob(os.path.join(images_dir, '*.jpg')) + glob.glob(os.path.join(images_dir, '*.png')))
+        if exclude:
+            image_files = [f for f in image_files if os.path.splitext(os.path.basename(f))[0] not in exclude]
+        label_files = [os.path.join(labels_dir, os.path.splitext(os.path.basename(f))[0] + '.txt') for f in image_files]
+
+        n = len(image_files)
+        print(f"[INFO] Found {n} images in {images_dir}")
+        
+        # 라벨 파일 내용 확인
+        print("[DEBUG] Checking data folder structure:")
+        print(f"[DEBUG] Images dir: {images_dir} (exists: {os.path.exists(images_dir)})")
+        print(f"[DEBUG] Labels dir: {labels_dir} (exists: {os.path.exists(labels_dir)})")
+        print(f"[DEBUG] Images in directory: {len(image_files)}")
+        print(f"[DEBUG] Labels in directory: {len(label_files)}")
+
+        splits = plan_splits(image_files, label_files, val_ratio, test_ratio, method)
+        if key is not None:
+            cache.store(key, {'splits': {split: [os.path.basename(img) for img in imgs]
+                                         for split, (imgs, _) in splits.items()}})
+
+    outputs = _write_splits(splits, labels_dir, output_dir, mode)
+    if key is not None:
+        with open(os.path.join(output_dir, SPLIT_MARKER), 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': key, 'mode': mode, 'data_folder': os.path.abspath(data_folder)}, f)
+    return outputs
 
-    # === [2] data.yaml 생성 ===
+def prepare_dataset(args, output_dir, profiler):
+    """letterbox/중복 제거/분할/data.yaml/라벨 통계까지 학습 데이터 준비 (train.py, sweep.py 공용)"""
+    pack = PackedDataset(args.packed_dir) if args.packed_dir else None
+    data_folder = args.data_folder
+    if pack is None and args.letterbox_cache:
+        with profiler.phase('letterbox'):
+            data_folder = build_letterbox_dataset(args.data_folder, os.path.join(output_dir, 'letterboxed'),
+                                                  args.imgsz, args.cache_dir, mode=args.letterbox_mode)
+    # 거의 같은 이미지(연속 프레임) 제외: 원본 폴더 기준으로 찾아서 분할에서 빼기
+    dedup_report = None
+    if args.dedup_threshold > 0:
+        if pack is not None:
+            print("[경고] 패킹 데이터셋은 중복 제거를 지원하지 않습니다 (--dedup-threshold 무시)")
+        else:
+            with profiler.phase('dedup') as phase:
+                dedup_report = dedup_dataset(args.data_folder, args.dedup_threshold, args.cache_dir)
+                phase.add(files=dedup_report['total_images'])
+            os.makedirs(output_dir, exist_ok=True)
+            with open(os.path.join(output_dir, 'dedup.json'), 'w', encoding='utf-8') as f:
+                json.dump(dedup_report, f, indent=2, ensure_ascii=False)
+    excluded = {os.path.splitext(name)[0] for name in dedup_report['duplicates']} if dedup_report else None
+
+    with profiler.phase('split'):
+        if pack is not None:
+            # 패킹 데이터셋은 샘플 이름 목록만 분할 (파일 복사/링크 없음)
+            print(f"[INFO] Using packed dataset: {args.packed_dir} ({len(pack)} samples)")
+            split_dirs = write_split_lists(pack, output_dir, lambda stem: hash_split(stem, 0.1, 0.1))
+        else:
+            # letterbox 데이터셋은 imgsz/방식에 따라 내용이 달라지므로 지문에 포함
+            letterbox_inputs = {'imgsz': args.imgsz, 'letterbox_mode': args.letterbox_mode} if args.letterbox_cache else None
+            split_dirs = split_and_prepare_yolo_dataset(data_folder, output_dir, val_ratio=0.1, test_ratio=0.1,
+                                                        mode=args.split_mode, method=args.split_method,
+                                                        cache_dir=None if args.no_step_cache else args.cache_dir,
+                                                        extra_inputs=letterbox_inputs, exclude=excluded)
+
+    # data.yaml 생성
     data_yaml = {
-        'path': args.output_dir,
-        'train': 'train/images',
-        'val': 'valid/images',
-        'test': 'test/images',
-        'names': {0: 'helmet', 1: 'head'} 
+        'path': output_dir,
+        'train': os.path.relpath(split_dirs['train'], output_dir),
+        'val': os.path.relpath(split_dirs['valid'], output_dir),
+        'test': os.path.relpath(split_dirs['test'], output_dir),
+        'names': CLASS_NAMES
     }
-    data_yaml_path = os.path.join(args.output_dir, 'data.yaml')
+    data_yaml_path = os.path.join(output_dir, 'data.yaml')
     with open(data_yaml_path, 'w') as f:
         yaml.dump(data_yaml, f)
     
     print(f"[DEBUG] Created data.yaml with classes: {data_yaml['names']}")
     
-    # 실제 라벨 파일에서 클래스 분포 확인
-    print("[DEBUG] Analyzing actual label files...")
-    train_labels_dir = os.path.join(args.output_dir, 'train', 'labels')
-    if os.path.exists(train_labels_dir):
-        class_counts = {}
-        total_labels = 0
-        for label_file in os.listdir(train_labels_dir):
-            if label_file.endswith('.txt'):
-                label_path = os.path.join(train_labels_dir, label_file)
-                try:
-                    with open(label_path, 'r') as f:
-                        for line in f:
-                            line = line.strip()
-                            if line:
-                                parts = line.split()
-                                if len(parts) >= 5:
-                                    class_id = int(parts[0])
-                                    class_counts[class_id] = class_counts.get(class_id, 0) + 1
-                                    total_labels += 1
-                except Exception as e:
-                    print(f"[ERROR] Error reading {label_path}: {e}")
-        
-        print(f"[DEBUG] Total labels found: {total_labels}")
-        print(f"[DEBUG] Class distribution in train labels: {class_counts}")
-        
-        # 클래스명 매핑 확인
-        for class_id, count in class_counts.items():
-            class_name = data_yaml['names'].get(class_id, f"unknown_{class_id}")
-            print(f"[DEBUG] Class {class_id} ({class_name}): {count} instances")
+    # 라벨 통계 (학습 분할의 라벨만 한 번 스캔, 파일 목록 지문 기준 캐시)
+    with profiler.phase('label_stats') as phase:
+        train_names = split_image_names(split_dirs['train'])
+        if pack is not None:
+            label_stats = packed_label_stats(pack, train_names)
+        else:
+            labels_dir = os.path.join(data_folder, 'labels')
+            label_stats = get_file_label_stats([os.path.join(labels_dir, os.path.splitext(name)[0] + '.txt')
+                                                for name in train_names], cache_dir=args.cache_dir)
+        phase.add(files=label_stats['num_files'])
+    print_label_stats(label_stats, data_yaml['names'])
+
+    return {
+        'data_yaml_path': data_yaml_path,
+        'class_names': data_yaml['names'],
+        'pack': pack,
+        'dedup_report': dedup_report,
+        'dedup_path': os.path.join(output_dir, 'dedup.json') if dedup_report else None,
+        'label_stats': label_stats,
+    }
+
+def log_dataset(dataset, args, log_param, log_metric):
+    """prepare_dataset 결과(라벨 통계, 중복 제거 리포트)를 활성 MLflow run에 로깅"""
+    log_label_stats(dataset['label_stats'], log_metric, dataset['class_names'])
+    if dataset['dedup_report']:
+        log_param("dedup_threshold", args.dedup_threshold)
+        for key in ('total_images', 'pruned_images', 'pruned_ratio', 'estimated_epoch_time_saving'):
+            log_metric(f"dedup_{key}", dataset['dedup_report'][key])
+        mlflow.log_artifact(dataset['dedup_path'])
+
+def main():
+    args = parse_args()
+    print(f"[INFO] Using model: {args.model_path}")
+    print(f"[INFO] Using dataset: {args.data_folder}")
+    print(f"[INFO] Output dir: {args.output_dir}")
+    profiler = Profiler('train')
+
+    # === [1] 데이터 분할 및 폴더 생성, [2] data.yaml 생성 ===
+    dataset = prepare_dataset(args, args.output_dir, profiler)
+    data_yaml_path, pack = dataset['data_yaml_path'], dataset['pack']
 
     # === [3] MLflow 시작 ===
     mlflow.start_run()
@@ -189,6 +388,7 @@ def main():
     log_param("batch", args.batch)
     log_param("lr0", args.lr0)
     log_param("momentum", args.momentum)
+    log_dataset(dataset, args, log_param, log_metric)
 
     # === [4] YOLO 학습 ===
     from ultralytics import YOLO
@@ -196,30 +396,38 @@ def main():
     project_dir = Path(args.output_dir)
     exp_dir = project_dir / f"exp_{timestamp}"
 
-    model = YOLO(args.model_path)
-    results = model.train(
-        data=data_yaml_path,
-        epochs=args.epochs,
-        imgsz=args.imgsz,
-        batch=args.batch,
-        lr0=args.lr0,
-        momentum=args.momentum,
-        project=str(project_dir),
-        name=f"exp_{timestamp}",
-        exist_ok=True,
-        patience=50,  # Early stopping patience
-        save_period=1,  # 매 에포크마다 저장
-        verbose=True,  # 상세한 로그 출력
-        plots=True,  # 학습 그래프 생성
-        save=True,  # 모델 저장
-        device=0  # GPU 사용
-    )
+    with profiler.phase('train') as phase:
+        model = YOLO(args.model_path)
+        # 에포크가 끝날 때마다 results.csv의 새 행을 step 단위 metric으로 전송
+        epoch_streamer = ResultsCsvStreamer(metrics_logger)
+        model.add_callback("on_fit_epoch_end", epoch_streamer.on_fit_epoch_end)
+        results = model.train(
+            trainer=packed_trainer(args.packed_dir) if pack is not None else None,
+            data=data_yaml_path,
+            epochs=args.epochs,
+            imgsz=args.imgsz,
+            batch=args.batch,
+            lr0=args.lr0,
+            momentum=args.momentum,
+            project=str(project_dir),
+            name=f"exp_{timestamp}",
+            exist_ok=True,
+            patience=50,  # Early stopping patience
+            save_period=1,  # 매 에포크마다 저장
+            verbose=True,  # 상세한 로그 출력
+            plots=True,  # 학습 그래프 생성
+            save=True,  # 모델 저장
+            device=0  # GPU 사용
+        )
+        phase.add(epochs=len(epoch_streamer.logged_epochs))
 
     # === [5] Metric 로깅 ===
     results_csv = exp_dir / "results.csv"
     weights_dir = exp_dir / "weights"
+    epoch_streamer.poll(results_csv)  # 콜백이 놓친 마지막 에포크까지 로깅
     if results_csv.exists():
         df = pd.read_csv(results_csv)
+        df.columns = [c.strip() for c in df.columns]
         latest = df.iloc[-1]
         for k, v in {
             "precision": latest.get("metrics/precision(B)", 0.0),
@@ -228,22 +436,39 @@ def main():
             "mAP50-95": latest.get("metrics/mAP50-95(B)", 0.0)
         }.items():
             log_metric(k, v)
+        # 에포크 시간 (최신 ultralytics는 누적 학습 시간 'time' 열을 기록)
+        if 'time' in df.columns and len(df) > 0:
+            epoch_seconds = float(df['time'].iloc[-1]) / len(df)
+            log_metric("epoch_seconds", epoch_seconds)
+            dedup_report = dataset['dedup_report']
+            if dedup_report and dedup_report['kept_images']:
+                # 제외한 이미지까지 학습했다면 에포크마다 더 걸렸을 시간 (이미지 수에 비례한다고 가정)
+                saved = epoch_seconds * dedup_report['pruned_images'] / dedup_report['kept_images']
+                log_metric("dedup_saved_seconds_per_epoch", saved)
+                print(f"[INFO] 에포크 {epoch_seconds:.1f}s, 중복 제거로 에포크당 약 {saved:.1f}s 절감")
 
     # === [6] 모델 및 결과 저장 ===
     final_dir = project_dir / "final"
     final_dir.mkdir(exist_ok=True)
 
-    if (weights_dir / "best.pt").exists():
-        shutil.copy(weights_dir / "best.pt", final_dir / "best.pt")
-    if results_csv.exists():
-        shutil.copy(results_csv, final_dir / "results.csv")
+    with profiler.phase('upload_artifacts') as phase:
+        if (weights_dir / "best.pt").exists():
+            shutil.copy(weights_dir / "best.pt", final_dir / "best.pt")
+        if results_csv.exists():
+            shutil.copy(results_csv, final_dir / "results.csv")
+
+        mlflow.log_artifacts(str(final_dir), artifact_path="model")
 
-    mlflow.log_artifacts(str(final_dir), artifact_path="model")
+        if IS_AZURE_RUN:
+            if (final_dir / "best.pt").exists():
+                azure_run.upload_file(name="best.pt", path_or_stream=str(final_dir / "best.pt"))
+        phase.add(files=len(list(final_dir.iterdir())))
 
-    if IS_AZURE_RUN:
-        if (final_dir / "best.pt").exists():
-            azure_run.upload_file(name="best.pt", path_or_stream=str(final_dir / "best.pt"))
+    # === [7] 단계별 프로파일 저장 ===
+    profiler.log(log_metric, profiler.save(args.output_dir))
+    mlflow.log_artifact(os.path.join(args.output_dir, PROFILE_NAME))
 
+    metrics_logger.close()
     mlflow.end_run()
 
 if __name__ == "__main__":